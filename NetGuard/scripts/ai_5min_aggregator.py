@@ -11,24 +11,25 @@ import json
 import sqlite3
 import logging
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
-import requests
+from functools import partial
+from ai_hedging import hedged_call, request_timeout, ProviderStats
+from ai_providers import complete_json, configure as configure_ai_client
+from json_stream import AGGREGATOR_ANALYSIS_FIELDS
+from prompt_builder import PromptBuilder
+from change_detector import ChangeDetector
+from time_window import TimeWindow, DEFAULT_WINDOW_MINUTES, index_window_tables
+from snapshots import build_sections, publish_snapshot
 
 # Configuration
 DB_PATH = "/home/jarvis/NetGuard/network.db"
 CONFIG_PATH = "/home/jarvis/NetGuard/config/ai_config.json"
 LOG_FILE = "/home/jarvis/NetGuard/logs/system/ai-5min-aggregator.log"
 AI_RESULTS_DB = "/home/jarvis/NetGuard/network.db"
-
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(LOG_FILE),
-        logging.StreamHandler()
-    ]
-)
+SOURCE_TIMEOUT = 10  # seconds per aggregation source
+AGGREGATION_WORKERS = 6
 
 def load_config():
     """Load AI configuration"""
@@ -39,411 +40,410 @@ def load_config():
         logging.error(f"Error loading config: {e}")
         return None
 
-def get_latest_table(conn, prefix):
-    """Get the most recent table for a given prefix (excluding templates)"""
-    cursor = conn.cursor()
-    cursor.execute(f"""
-        SELECT name FROM sqlite_master 
-        WHERE type='table' 
-        AND name LIKE '{prefix}_%' 
-        AND name NOT LIKE '%_template'
-        ORDER BY name DESC LIMIT 1
-    """)
-    result = cursor.fetchone()
-    return result[0] if result else None
+def read_connection(timeout=SOURCE_TIMEOUT):
+    """Read-only connection for one aggregation source"""
+    return sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True, timeout=timeout)
 
-def aggregate_data_last_5min():
-    """Aggregate data from all tools from the last 5 minutes"""
+def prepare_database(window_minutes=DEFAULT_WINDOW_MINUTES):
+    """One-off writes before the read-only cycles start
+    
+    WAL mode (persistent) so aggregation reads don't block collector writes,
+    and created_at indexes on tables created before collectors added them
+    """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        
-        data = {
-            'timestamp': datetime.now().isoformat(),
-            'collection_period': '5 minutes',
-            'tools': {}
-        }
-        
-        # 1. P0F - OS Fingerprinting
-        table = get_latest_table(conn, 'p0f')
-        unique_devices = set()
-        os_distribution = {}
-        if table:
-            cursor = conn.cursor()
-            cursor.execute(f"SELECT * FROM {table} ORDER BY created_at DESC LIMIT 50")
-            rows = cursor.fetchall()
-            
-            for row in rows:
-                row_dict = dict(row)
-                src_ip = row_dict.get('src_ip')
-                dest_ip = row_dict.get('dest_ip')
-                os_name = row_dict.get('os_name')
-                
-                # Collect unique IPs
-                if src_ip:
-                    unique_devices.add(src_ip)
-                if dest_ip:
-                    unique_devices.add(dest_ip)
-                
-                # Count OS distribution
-                if os_name and os_name != '':
-                    os_distribution[os_name] = os_distribution.get(os_name, 0) + 1
-            
-            data['tools']['p0f'] = {
-                'total_fingerprints': len(rows),
-                'os_detected': [dict(row) for row in rows[:10]],
-                'unique_ips': len(unique_devices),
-                'os_distribution': os_distribution
-            }
-        
-        # 2. TSHARK - Packet Capture
-        table = get_latest_table(conn, 'tshark')
-        if table:
-            cursor = conn.cursor()
-            cursor.execute(f"SELECT * FROM {table} ORDER BY timestamp DESC LIMIT 100")
-            rows = cursor.fetchall()
-            protocols = {}
-            for row in rows:
-                row_dict = dict(row)
-                proto = row_dict.get('protocol', 'Unknown')
-                protocols[proto] = protocols.get(proto, 0) + 1
-                
-                # Add unique IPs to device list
-                src_ip = row_dict.get('src_ip')
-                dest_ip = row_dict.get('dest_ip')
-                if src_ip and not src_ip.startswith('127.') and src_ip != '::1':
-                    unique_devices.add(src_ip)
-                if dest_ip and not dest_ip.startswith('127.') and dest_ip != '::1':
-                    unique_devices.add(dest_ip)
-            
-            data['tools']['tshark'] = {
-                'total_packets': len(rows),
-                'protocol_distribution': protocols,
-                'sample_packets': [dict(row) for row in rows[:5]]
-            }
-        
-        # 3. NGREP - Content Inspection
-        table = get_latest_table(conn, 'ngrep')
-        if table:
-            cursor = conn.cursor()
-            cursor.execute(f"SELECT * FROM {table} ORDER BY created_at DESC LIMIT 100")
-            rows = cursor.fetchall()
-            data['tools']['ngrep'] = {
-                'total_matches': len(rows),
-                'tcp_connections': [dict(row) for row in rows[:10]]
-            }
-        
-        # 4. HTTPRY - HTTP Logging
-        table = get_latest_table(conn, 'httpry')
-        if table:
-            cursor = conn.cursor()
-            cursor.execute(f"SELECT * FROM {table} ORDER BY created_at DESC LIMIT 100")
-            rows = cursor.fetchall()
-            methods = {}
-            hosts = {}
-            for row in rows:
-                method = dict(row).get('method', 'Unknown')
-                host = dict(row).get('host', 'Unknown')
-                methods[method] = methods.get(method, 0) + 1
-                hosts[host] = hosts.get(host, 0) + 1
-            data['tools']['httpry'] = {
-                'total_requests': len(rows),
-                'http_methods': methods,
-                'top_hosts': dict(sorted(hosts.items(), key=lambda x: x[1], reverse=True)[:10]),
-                'sample_requests': [dict(row) for row in rows[:5]]
-            }
-        
-        # 5. TCPDUMP - Professional Packet Capture
-        table = get_latest_table(conn, 'tcpdump')
-        if table:
-            cursor = conn.cursor()
-            cursor.execute(f"SELECT * FROM {table} ORDER BY timestamp DESC LIMIT 200")
-            rows = cursor.fetchall()
-            
-            # Collect unique devices from tcpdump
-            for row in rows:
-                row_dict = dict(row)
-                src_ip = row_dict.get('src_ip')
-                dest_ip = row_dict.get('dest_ip')
-                if src_ip and not src_ip.startswith('127.') and src_ip != '::1':
-                    unique_devices.add(src_ip)
-                if dest_ip and not dest_ip.startswith('127.') and dest_ip != '::1':
-                    unique_devices.add(dest_ip)
-            
-            data['tools']['tcpdump'] = {
-                'total_packets': len(rows),
-                'sample_packets': [dict(row) for row in rows[:10]]
-            }
-        
-        # 6. ARGUS - Flow Analysis
-        table = get_latest_table(conn, 'argus')
-        if table:
-            cursor = conn.cursor()
-            cursor.execute(f"SELECT * FROM {table} ORDER BY created_at DESC LIMIT 100")
-            rows = cursor.fetchall()
-            data['tools']['argus'] = {
-                'total_flows': len(rows),
-                'flows': [dict(row) for row in rows[:10]]
-            }
-        
-        # 7. NETSNIFF - Network Sniffing
-        table = get_latest_table(conn, 'netsniff')
-        if table:
-            cursor = conn.cursor()
-            cursor.execute(f"SELECT * FROM {table} ORDER BY created_at DESC LIMIT 100")
-            rows = cursor.fetchall()
-            data['tools']['netsniff'] = {
-                'total_packets': len(rows),
-                'sample_packets': [dict(row) for row in rows[:10]]
-            }
-        
-        # 8. IFTOP - Bandwidth Monitoring
-        table = get_latest_table(conn, 'iftop')
-        if table:
-            cursor = conn.cursor()
-            cursor.execute(f"SELECT * FROM {table} ORDER BY created_at DESC LIMIT 50")
-            rows = cursor.fetchall()
-            data['tools']['iftop'] = {
-                'total_connections': len(rows),
-                'top_connections': [dict(row) for row in rows[:10]]
-            }
-        
-        # 9. NETHOGS - Process Bandwidth
-        table = get_latest_table(conn, 'nethogs')
-        if table:
-            cursor = conn.cursor()
-            cursor.execute(f"SELECT * FROM {table} ORDER BY created_at DESC LIMIT 100")
-            rows = cursor.fetchall()
-            data['tools']['nethogs'] = {
-                'total_processes': len(rows),
-                'top_bandwidth_users': [dict(row) for row in rows[:10]]
-            }
-        
-        # 10. SURICATA - IDS/IPS
-        # Get alerts (filter out false positives like "Ethertype unknown")
-        table = get_latest_table(conn, 'suricata_alerts')
-        if table:
-            cursor = conn.cursor()
-            try:
-                # First check what columns exist in the table
-                cursor.execute(f"PRAGMA table_info({table})")
-                columns = [row[1] for row in cursor.fetchall()]
-                
-                # Build query based on available columns
-                if 'signature' in columns:
-                    # Exclude common false positives: Ethertype unknown, IPv4/IPv6 checksum errors, etc.
-                    cursor.execute(f"""
-                        SELECT * FROM {table} 
-                        WHERE signature NOT LIKE '%Ethertype unknown%'
-                        AND signature NOT LIKE '%IPv4 checksum%'
-                        AND signature NOT LIKE '%IPv6 checksum%'
-                        ORDER BY timestamp DESC 
-                        LIMIT 50
-                    """)
-                else:
-                    # If no signature column, just get recent alerts
-                    cursor.execute(f"""
-                        SELECT * FROM {table} 
-                        ORDER BY timestamp DESC 
-                        LIMIT 50
-                    """)
-                
-                alerts = cursor.fetchall()
-                data['tools']['suricata'] = {
-                    'total_alerts': len(alerts),
-                    'alerts': [dict(row) for row in alerts[:10]]
-                }
-            except Exception as e:
-                logging.error(f"Error querying Suricata alerts table {table}: {e}")
-                data['tools']['suricata'] = {'total_alerts': 0, 'alerts': []}
-        else:
-            data['tools']['suricata'] = {'total_alerts': 0, 'alerts': []}
-        
-        # Get flows
-        table = get_latest_table(conn, 'suricata_flow')
-        if table:
-            try:
-                cursor = conn.cursor()
-                cursor.execute(f"SELECT * FROM {table} ORDER BY timestamp DESC LIMIT 50")
-                flows = cursor.fetchall()
-                data['tools']['suricata']['total_flows'] = len(flows)
-                data['tools']['suricata']['flows'] = [dict(row) for row in flows[:5]]
-            except Exception as e:
-                logging.error(f"Error querying Suricata flows table {table}: {e}")
-                data['tools']['suricata']['total_flows'] = 0
-                data['tools']['suricata']['flows'] = []
-        else:
-            data['tools']['suricata']['total_flows'] = 0
-            data['tools']['suricata']['flows'] = []
-        
-        # Get HTTP events
-        table = get_latest_table(conn, 'suricata_http')
-        if table:
-            try:
-                cursor = conn.cursor()
-                cursor.execute(f"SELECT * FROM {table} ORDER BY timestamp DESC LIMIT 20")
-                http_events = cursor.fetchall()
-                data['tools']['suricata']['http_events'] = [dict(row) for row in http_events[:5]]
-            except Exception as e:
-                logging.error(f"Error querying Suricata HTTP table {table}: {e}")
-                data['tools']['suricata']['http_events'] = []
-        else:
-            data['tools']['suricata']['http_events'] = []
-        
-        # Get DNS events
-        table = get_latest_table(conn, 'suricata_dns')
-        if table:
-            try:
-                cursor = conn.cursor()
-                cursor.execute(f"SELECT * FROM {table} ORDER BY timestamp DESC LIMIT 20")
-                dns_events = cursor.fetchall()
-                data['tools']['suricata']['dns_events'] = [dict(row) for row in dns_events[:5]]
-            except Exception as e:
-                logging.error(f"Error querying Suricata DNS table {table}: {e}")
-                data['tools']['suricata']['dns_events'] = []
-        else:
-            data['tools']['suricata']['dns_events'] = []
-        
-        # Get TLS events
-        table = get_latest_table(conn, 'suricata_tls')
-        if table:
-            try:
-                cursor = conn.cursor()
-                cursor.execute(f"SELECT * FROM {table} ORDER BY timestamp DESC LIMIT 20")
-                tls_events = cursor.fetchall()
-                data['tools']['suricata']['tls_events'] = [dict(row) for row in tls_events[:5]]
-            except Exception as e:
-                logging.error(f"Error querying Suricata TLS table {table}: {e}")
-                data['tools']['suricata']['tls_events'] = []
-        else:
-            data['tools']['suricata']['tls_events'] = []
-        
-        # Get REAL device data from device tracker
-        cursor.execute("""
-            SELECT COUNT(*) as total,
-                   COUNT(CASE WHEN device_type='IoT' THEN 1 END) as iot,
-                   COUNT(CASE WHEN device_type='Mobile' THEN 1 END) as mobile,
-                   COUNT(CASE WHEN device_type='Computer' THEN 1 END) as computer,
-                   COUNT(CASE WHEN device_type='Network' THEN 1 END) as network
-            FROM devices
-        """)
-        device_stats = cursor.fetchone()
-        
-        cursor.execute("""
-            SELECT ip_address, hostname, device_type, device_category, vendor
-            FROM devices
-            ORDER BY last_seen DESC
-            LIMIT 20
-        """)
-        tracked_devices = [dict(row) for row in cursor.fetchall()]
-        
-        # Add network summary with ACTUAL tracked device count
-        data['network_summary'] = {
-            'total_tracked_devices': device_stats['total'] if device_stats else 0,
-            'iot_devices': device_stats['iot'] if device_stats else 0,
-            'mobile_devices': device_stats['mobile'] if device_stats else 0,
-            'computers': device_stats['computer'] if device_stats else 0,
-            'network_devices': device_stats['network'] if device_stats else 0,
-            'tracked_devices': tracked_devices,
-            'os_distribution': os_distribution
-        }
-        
-        # Get IoT device information from device tracker
-        data['iot_devices'] = {
-            'total_iot_devices': 0,
-            'device_categories': {},
-            'devices': []
-        }
-        
-        try:
-            cursor.execute("""
-                SELECT ip_address, mac_address, hostname, vendor, 
-                       device_category, security_score, last_seen
-                FROM devices 
-                WHERE device_type = 'IoT' 
-                AND last_seen > datetime('now', '-1 hour')
-                ORDER BY last_seen DESC
-                LIMIT 20
-            """)
-            
-            iot_devices = cursor.fetchall()
-            
-            if iot_devices:
-                device_categories = {}
-                devices_list = []
-                
-                for device in iot_devices:
-                    dev_dict = dict(device)
-                    devices_list.append(dev_dict)
-                    
-                    category = dev_dict.get('device_category', 'Unknown')
-                    device_categories[category] = device_categories.get(category, 0) + 1
-                
-                data['iot_devices'] = {
-                    'total_iot_devices': len(iot_devices),
-                    'device_categories': device_categories,
-                    'devices': devices_list
-                }
-        except Exception as e:
-            logging.error(f"Error getting IoT devices: {e}")
-        
-        # Get IoT security vulnerabilities
-        data['iot_security'] = {
-            'total_vulnerabilities': 0,
-            'by_severity': {},
-            'vulnerabilities': []
-        }
-        
+        conn = sqlite3.connect(DB_PATH, timeout=30)
+        mode = conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+        logging.info(f"✓ Database journal mode: {mode}")
+        index_window_tables(conn, WINDOWED_TABLE_PREFIXES, window_minutes)
+        conn.close()
+    except sqlite3.Error as e:
+        logging.warning(f"Could not prepare database: {e}")
+
+def fetch_dicts(conn, query):
+    """Rows as dicts, with column names resolved once per query"""
+    cursor = conn.execute(query)
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def window_totals(conn, window, prefix, total_key, sample_key, samples):
+    """Exact row count in the window plus the newest rows; None when the tool has no tables"""
+    source = window.source(conn, prefix, ['rowid'])
+    if source is None:
+        return None
+    return {
+        total_key: window.count(conn, source),
+        sample_key: window.recent(conn, prefix, samples)
+    }
+
+def distribution(conn, window, source, column, limit=None):
+    """{value: rows} for one column over the window, largest first"""
+    rows = window.fetch(conn, f"""
+        SELECT COALESCE({column}, 'Unknown') AS value, COUNT(*) AS n FROM {{source}}
+        GROUP BY value ORDER BY n DESC {f'LIMIT {limit}' if limit else ''}
+    """, source)
+    return {row['value']: row['n'] for row in rows}
+
+# Per-source collectors: each gets its own connection and the shared time
+# window, and returns its part of the snapshot computed in SQL
+
+def collect_p0f(conn, window):
+    """1. P0F - OS Fingerprinting"""
+    source = window.source(conn, 'p0f', ['src_ip', 'dest_ip', 'os_name'])
+    if source is None:
+        return None
+    unique_ips = window.fetch(conn, """
+        SELECT COUNT(*) AS n FROM (
+            SELECT src_ip FROM {source} WHERE src_ip != ''
+            UNION SELECT dest_ip FROM {source} WHERE dest_ip != ''
+        )
+    """, source)[0]['n']
+    os_distribution = window.fetch(conn, """
+        SELECT os_name, COUNT(*) AS n FROM {source}
+        WHERE os_name != '' GROUP BY os_name ORDER BY n DESC
+    """, source)
+    return {
+        'total_fingerprints': window.count(conn, source),
+        'os_detected': window.recent(conn, 'p0f', 10),
+        'unique_ips': unique_ips,
+        'os_distribution': {row['os_name']: row['n'] for row in os_distribution}
+    }
+
+def collect_tshark(conn, window):
+    """2. TSHARK - Packet Capture"""
+    source = window.source(conn, 'tshark', ['protocol'])
+    if source is None:
+        return None
+    return {
+        'total_packets': window.count(conn, source),
+        'protocol_distribution': distribution(conn, window, source, 'protocol'),
+        'sample_packets': window.recent(conn, 'tshark', 5)
+    }
+
+def collect_ngrep(conn, window):
+    """3. NGREP - Content Inspection"""
+    return window_totals(conn, window, 'ngrep', 'total_matches', 'tcp_connections', 10)
+
+def collect_httpry(conn, window):
+    """4. HTTPRY - HTTP Logging"""
+    source = window.source(conn, 'httpry', ['method', 'host'])
+    if source is None:
+        return None
+    return {
+        'total_requests': window.count(conn, source),
+        'http_methods': distribution(conn, window, source, 'method'),
+        'top_hosts': distribution(conn, window, source, 'host', limit=10),
+        'sample_requests': window.recent(conn, 'httpry', 5)
+    }
+
+def collect_tcpdump(conn, window):
+    """5. TCPDUMP - Professional Packet Capture"""
+    return window_totals(conn, window, 'tcpdump', 'total_packets', 'sample_packets', 10)
+
+def collect_argus(conn, window):
+    """6. ARGUS - Flow Analysis"""
+    return window_totals(conn, window, 'argus', 'total_flows', 'flows', 10)
+
+def collect_netsniff(conn, window):
+    """7. NETSNIFF - Network Sniffing"""
+    return window_totals(conn, window, 'netsniff', 'total_packets', 'sample_packets', 10)
+
+def collect_iftop(conn, window):
+    """8. IFTOP - Bandwidth Monitoring"""
+    return window_totals(conn, window, 'iftop', 'total_connections', 'top_connections', 10)
+
+def collect_nethogs(conn, window):
+    """9. NETHOGS - Process Bandwidth"""
+    return window_totals(conn, window, 'nethogs', 'total_processes', 'top_bandwidth_users', 10)
+
+# Common false positives: Ethertype unknown, IPv4/IPv6 checksum errors
+SURICATA_ALERT_FILTER = """COALESCE(alert_signature, '') NOT LIKE '%Ethertype unknown%'
+    AND COALESCE(alert_signature, '') NOT LIKE '%IPv4 checksum%'
+    AND COALESCE(alert_signature, '') NOT LIKE '%IPv6 checksum%'"""
+
+def collect_suricata_alerts(conn, window):
+    """10. SURICATA - IDS/IPS alerts (filter out false positives like "Ethertype unknown")"""
+    source = window.source(conn, 'suricata_alerts', ['rowid'], where=SURICATA_ALERT_FILTER)
+    if source is None:
+        return None
+    return {
+        'total_alerts': window.count(conn, source),
+        'alerts': window.recent(conn, 'suricata_alerts', 10, where=SURICATA_ALERT_FILTER)
+    }
+
+def collect_suricata_flows(conn, window):
+    return window_totals(conn, window, 'suricata_flow', 'total_flows', 'flows', 5)
+
+def collect_suricata_events(prefix, key):
+    """HTTP / DNS / TLS event samples"""
+    def collect(conn, window):
+        events = window.recent(conn, prefix, 5)
+        return {key: events} if events else None
+    return collect
+
+def collect_devices(conn, window):
+    """REAL device data from device tracker"""
+    device_stats = conn.execute("""
+        SELECT COUNT(*) as total,
+               COUNT(CASE WHEN device_type='IoT' THEN 1 END) as iot,
+               COUNT(CASE WHEN device_type='Mobile' THEN 1 END) as mobile,
+               COUNT(CASE WHEN device_type='Computer' THEN 1 END) as computer,
+               COUNT(CASE WHEN device_type='Network' THEN 1 END) as network
+        FROM devices
+    """).fetchone()
+    tracked_devices = fetch_dicts(conn, """
+        SELECT ip_address, hostname, device_type, device_category, vendor
+        FROM devices
+        ORDER BY last_seen DESC
+        LIMIT 20
+    """)
+    # Network summary with ACTUAL tracked device count
+    return {
+        'total_tracked_devices': device_stats[0] if device_stats else 0,
+        'iot_devices': device_stats[1] if device_stats else 0,
+        'mobile_devices': device_stats[2] if device_stats else 0,
+        'computers': device_stats[3] if device_stats else 0,
+        'network_devices': device_stats[4] if device_stats else 0,
+        'tracked_devices': tracked_devices
+    }
+
+def collect_iot_devices(conn, window):
+    """IoT device information from device tracker"""
+    devices_list = fetch_dicts(conn, """
+        SELECT ip_address, mac_address, hostname, vendor, 
+               device_category, security_score, last_seen
+        FROM devices 
+        WHERE device_type = 'IoT' 
+        AND last_seen > datetime('now', '-1 hour')
+        ORDER BY last_seen DESC
+        LIMIT 20
+    """)
+    device_categories = {}
+    for device in devices_list:
+        category = device.get('device_category', 'Unknown')
+        device_categories[category] = device_categories.get(category, 0) + 1
+    return {
+        'total_iot_devices': len(devices_list),
+        'device_categories': device_categories,
+        'devices': devices_list
+    }
+
+def collect_iot_security(conn, window):
+    """IoT security vulnerabilities"""
+    vuln_list = fetch_dicts(conn, """
+        SELECT device_ip, device_type, vulnerability_type, 
+               severity, description, recommendation, detected_at
+        FROM iot_vulnerabilities
+        WHERE resolved = 0
+        ORDER BY 
+            CASE severity
+                WHEN 'CRITICAL' THEN 1
+                WHEN 'HIGH' THEN 2
+                WHEN 'MEDIUM' THEN 3
+                WHEN 'LOW' THEN 4
+                ELSE 5
+            END,
+            detected_at DESC
+        LIMIT 10
+    """)
+    by_severity = {}
+    for vuln in vuln_list:
+        severity = vuln.get('severity', 'UNKNOWN')
+        by_severity[severity] = by_severity.get(severity, 0) + 1
+    return {
+        'total_vulnerabilities': len(vuln_list),
+        'by_severity': by_severity,
+        'vulnerabilities': vuln_list
+    }
+
+# (source name, collector, where its result goes: ('tools', tool) merges into that tool)
+AGGREGATION_SOURCES = [
+    ('p0f', collect_p0f, ('tools', 'p0f')),
+    ('tshark', collect_tshark, ('tools', 'tshark')),
+    ('ngrep', collect_ngrep, ('tools', 'ngrep')),
+    ('httpry', collect_httpry, ('tools', 'httpry')),
+    ('tcpdump', collect_tcpdump, ('tools', 'tcpdump')),
+    ('argus', collect_argus, ('tools', 'argus')),
+    ('netsniff', collect_netsniff, ('tools', 'netsniff')),
+    ('iftop', collect_iftop, ('tools', 'iftop')),
+    ('nethogs', collect_nethogs, ('tools', 'nethogs')),
+    ('suricata_alerts', collect_suricata_alerts, ('tools', 'suricata')),
+    ('suricata_flow', collect_suricata_flows, ('tools', 'suricata')),
+    ('suricata_http', collect_suricata_events('suricata_http', 'http_events'), ('tools', 'suricata')),
+    ('suricata_dns', collect_suricata_events('suricata_dns', 'dns_events'), ('tools', 'suricata')),
+    ('suricata_tls', collect_suricata_events('suricata_tls', 'tls_events'), ('tools', 'suricata')),
+    ('devices', collect_devices, ('network_summary',)),
+    ('iot_devices', collect_iot_devices, ('iot_devices',)),
+    ('iot_security', collect_iot_security, ('iot_security',)),
+]
+
+# Collector table prefixes read through the time window
+WINDOWED_TABLE_PREFIXES = [name for name, _, target in AGGREGATION_SOURCES if target[0] == 'tools']
+
+def run_source(collect, window, timeout):
+    """Run one collector on its own connection; its query is interrupted after timeout seconds"""
+    started = time.monotonic()
+    conn = read_connection(timeout)
+    timer = threading.Timer(timeout, conn.interrupt)
+    timer.start()
+    try:
+        return collect(conn, window), time.monotonic() - started
+    finally:
+        timer.cancel()
+        conn.close()
+
+def aggregate_data_last_5min(workers=AGGREGATION_WORKERS, source_timeout=SOURCE_TIMEOUT,
+                             window_minutes=DEFAULT_WINDOW_MINUTES, window=None):
+    """Aggregate data from all tools over the last window_minutes (exact counts, newest samples)
+    
+    Sources run concurrently, each on its own read-only connection; a source
+    that fails or times out is left out (or at its empty default) and the
+    rest of the snapshot is still returned
+    """
+    window = window or TimeWindow(window_minutes)
+    window_minutes = window.minutes
+    data = {
+        'timestamp': window.end.isoformat(),
+        'collection_period': f'{window_minutes} minutes',
+        'window': {'start': window.start.isoformat(), 'end': window.end.isoformat()},
+        'tools': {},
+        # Defaults used when a source is missing or fails
+        'network_summary': {'total_tracked_devices': 0, 'iot_devices': 0, 'mobile_devices': 0,
+                            'computers': 0, 'network_devices': 0, 'tracked_devices': []},
+        'iot_devices': {'total_iot_devices': 0, 'device_categories': {}, 'devices': []},
+        'iot_security': {'total_vulnerabilities': 0, 'by_severity': {}, 'vulnerabilities': []}
+    }
+    suricata = {'total_alerts': 0, 'alerts': [], 'total_flows': 0, 'flows': [],
+                'http_events': [], 'dns_events': [], 'tls_events': []}
+    
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='aggregate')
+    futures = {executor.submit(run_source, collect, window, source_timeout): (name, target)
+               for name, collect, target in AGGREGATION_SOURCES}
+    # Backstop for sources stuck outside SQLite or still queued behind slow ones; their threads are abandoned
+    done, not_done = wait(futures, timeout=source_timeout * 2)
+    executor.shutdown(wait=False, cancel_futures=True)
+    
+    timings = []
+    failed = [futures[future][0] for future in not_done]
+    for future in done:
+        name, target = futures[future]
         try:
-            cursor.execute("""
-                SELECT device_ip, device_type, vulnerability_type, 
-                       severity, description, recommendation, detected_at
-                FROM iot_vulnerabilities
-                WHERE resolved = 0
-                ORDER BY 
-                    CASE severity
-                        WHEN 'CRITICAL' THEN 1
-                        WHEN 'HIGH' THEN 2
-                        WHEN 'MEDIUM' THEN 3
-                        WHEN 'LOW' THEN 4
-                        ELSE 5
-                    END,
-                    detected_at DESC
-                LIMIT 10
-            """)
-            
-            vulnerabilities = cursor.fetchall()
-            
-            if vulnerabilities:
-                by_severity = {}
-                vuln_list = []
-                
-                for vuln in vulnerabilities:
-                    vuln_dict = dict(vuln)
-                    vuln_list.append(vuln_dict)
-                    
-                    severity = vuln_dict.get('severity', 'UNKNOWN')
-                    by_severity[severity] = by_severity.get(severity, 0) + 1
-                
-                data['iot_security'] = {
-                    'total_vulnerabilities': len(vulnerabilities),
-                    'by_severity': by_severity,
-                    'vulnerabilities': vuln_list
-                }
+            result, elapsed = future.result()
         except Exception as e:
-            logging.error(f"Error getting IoT vulnerabilities: {e}")
-        
-        conn.close()
-        return data
-        
-    except Exception as e:
-        logging.error(f"Error aggregating data: {e}")
+            logging.error(f"Error aggregating {name}: {e}")
+            failed.append(name)
+            continue
+        timings.append((name, elapsed))
+        if result is None:
+            continue
+        if target == ('tools', 'suricata'):
+            suricata.update(result)
+        elif target[0] == 'tools':
+            data['tools'][target[1]] = result
+        else:
+            data[target[0]].update(result)
+    
+    data['tools']['suricata'] = suricata
+    data['network_summary']['os_distribution'] = data['tools'].get('p0f', {}).get('os_distribution', {})
+    
+    timings.sort(key=lambda t: t[1], reverse=True)
+    logging.info("Aggregation timings: " + ', '.join(f"{name} {elapsed * 1000:.0f}ms" for name, elapsed in timings))
+    if failed:
+        logging.warning(f"Partial snapshot, sources failed or timed out: {', '.join(sorted(failed))}")
+    if len(failed) == len(AGGREGATION_SOURCES):
         return None
+    return data
 
-def build_ai_prompt(data):
-    """Build comprehensive AI analysis prompt"""
+def build_ai_prompt(data, token_budget=None):
+    """Build comprehensive AI analysis prompt
+    
+    Sections are serialized compactly and filled by priority (1 = most
+    important) until the token budget is reached; see prompt_builder.py
+    """
+    tools = data['tools']
+    summary = data['network_summary']
+    builder = PromptBuilder(token_budget)
+    
+    builder.section("NETWORK SUMMARY", 1, facts=[
+        ("Total Tracked Devices", summary['total_tracked_devices']),
+        ("IoT Devices", summary['iot_devices']),
+        ("Mobile Devices", summary['mobile_devices']),
+        ("Computers", summary['computers']),
+        ("Network Equipment", summary['network_devices']),
+        ("Operating Systems Detected", summary['os_distribution']),
+    ], samples=[("Device Details", summary['tracked_devices'])])
+    
+    p0f = tools.get('p0f', {})
+    builder.section("1. OS FINGERPRINTING (p0f)", 6, facts=[
+        ("Total Fingerprints", p0f.get('total_fingerprints', 0)),
+        ("Unique IP Addresses", p0f.get('unique_ips', 0)),
+        ("OS Distribution", p0f.get('os_distribution', {})),
+    ])
+    
+    tshark = tools.get('tshark', {})
+    builder.section("2. PACKET CAPTURE (tshark)", 3, facts=[
+        ("Total Packets", tshark.get('total_packets', 0)),
+        ("Protocol Distribution", tshark.get('protocol_distribution', {})),
+    ], samples=[("Sample Packets", tshark.get('sample_packets', [])[:3])])
+    
+    ngrep = tools.get('ngrep', {})
+    builder.section("3. CONTENT INSPECTION (ngrep)", 4, facts=[
+        ("Total TCP Matches", ngrep.get('total_matches', 0)),
+    ], samples=[("Sample Connections", ngrep.get('tcp_connections', [])[:5])])
     
-    prompt = f"""You are a professional network security analyst. Analyze the following 5-minute network monitoring data from 10 different security tools and provide a comprehensive threat assessment.
+    httpry = tools.get('httpry', {})
+    builder.section("4. HTTP TRAFFIC (httpry)", 4, facts=[
+        ("Total HTTP Requests", httpry.get('total_requests', 0)),
+        ("HTTP Methods", httpry.get('http_methods', {})),
+        ("Top Hosts", httpry.get('top_hosts', {})),
+    ], samples=[("Sample Requests", httpry.get('sample_requests', [])[:3])])
+    
+    tcpdump = tools.get('tcpdump', {})
+    builder.section("5. DEEP PACKET ANALYSIS (tcpdump)", 3, facts=[
+        ("Total Packets", tcpdump.get('total_packets', 0)),
+    ], samples=[("Sample Packets with Full Details", tcpdump.get('sample_packets', [])[:5])])
+    
+    argus = tools.get('argus', {})
+    builder.section("6. FLOW ANALYSIS (argus)", 5, facts=[
+        ("Total Network Flows", argus.get('total_flows', 0)),
+    ], samples=[("Sample Flows", argus.get('flows', [])[:5])])
+    
+    netsniff = tools.get('netsniff', {})
+    builder.section("7. NETWORK SNIFFING (netsniff-ng)", 5, facts=[
+        ("Total Packets", netsniff.get('total_packets', 0)),
+    ], samples=[("Sample Packets", netsniff.get('sample_packets', [])[:5])])
+    
+    iftop = tools.get('iftop', {})
+    builder.section("8. BANDWIDTH MONITORING (iftop)", 6, facts=[
+        ("Active Connections", iftop.get('total_connections', 0)),
+    ], samples=[("Top Bandwidth Users", iftop.get('top_connections', [])[:5])])
+    
+    nethogs = tools.get('nethogs', {})
+    builder.section("9. PROCESS MONITORING (nethogs)", 6, facts=[
+        ("Active Processes", nethogs.get('total_processes', 0)),
+    ], samples=[("Top Bandwidth Consumers", nethogs.get('top_bandwidth_users', [])[:10])])
+    
+    suricata = tools.get('suricata', {})
+    builder.section("10. INTRUSION DETECTION (Suricata)", 1, facts=[
+        ("Total Alerts", suricata.get('total_alerts', 0)),
+        ("Network Flows", suricata.get('total_flows', 0)),
+    ], samples=[
+        ("Alert Details", suricata.get('alerts', [])[:5]),
+        ("HTTP Events", suricata.get('http_events', [])[:3]),
+        ("DNS Events", suricata.get('dns_events', [])[:3]),
+        ("TLS Events", suricata.get('tls_events', [])[:3]),
+    ])
+    
+    builder.section("11. IoT DEVICE SECURITY", 2, facts=[
+        ("Total IoT Devices", data['iot_devices']['total_iot_devices']),
+        ("Device Categories", data['iot_devices']['device_categories']),
+    ], samples=[("IoT Devices Details", data['iot_devices']['devices'])])
+    
+    builder.section("12. IoT SECURITY VULNERABILITIES", 1, facts=[
+        ("Total Active Vulnerabilities", data['iot_security']['total_vulnerabilities']),
+        ("By Severity", data['iot_security']['by_severity']),
+    ], samples=[("Vulnerability Details", data['iot_security']['vulnerabilities'])])
+    
+    header = f"""You are a professional network security analyst. Analyze the following 5-minute network monitoring data from 10 different security tools and provide a comprehensive threat assessment.
 
 **IMPORTANT NOTES:**
 - This is a HOME NETWORK with active security monitoring tools
@@ -452,77 +452,11 @@ def build_ai_prompt(data):
 - Local traffic to 192.168.x.x, 127.0.0.1, and ::1 is NORMAL
 - Do NOT flag our own monitoring tools as threats
 - Focus on EXTERNAL suspicious activity, not internal monitoring
+- Row samples are compact JSON; tables are {{"cols": [...], "rows": [[...]]}} and empty fields are omitted
 
-## DATA COLLECTED ({data['timestamp']})
-
-### NETWORK SUMMARY
-- Total Tracked Devices: {data['network_summary']['total_tracked_devices']} devices
-  - IoT Devices: {data['network_summary']['iot_devices']}
-  - Mobile Devices: {data['network_summary']['mobile_devices']}
-  - Computers: {data['network_summary']['computers']}
-  - Network Equipment: {data['network_summary']['network_devices']}
-- Device Details: {json.dumps(data['network_summary']['tracked_devices'], indent=2, default=str)}
-- Operating Systems Detected: {json.dumps(data['network_summary']['os_distribution'], indent=2)}
-
-### 1. OS FINGERPRINTING (p0f)
-- Total Fingerprints: {data['tools'].get('p0f', {}).get('total_fingerprints', 0)}
-- Unique IP Addresses: {data['tools'].get('p0f', {}).get('unique_ips', 0)}
-- OS Distribution: {json.dumps(data['tools'].get('p0f', {}).get('os_distribution', {}), indent=2)}
-
-### 2. PACKET CAPTURE (tshark)
-- Total Packets: {data['tools'].get('tshark', {}).get('total_packets', 0)}
-- Protocol Distribution: {json.dumps(data['tools'].get('tshark', {}).get('protocol_distribution', {}), indent=2)}
-- Sample Packets: {json.dumps(data['tools'].get('tshark', {}).get('sample_packets', [])[:3], indent=2, default=str)}
-
-### 3. CONTENT INSPECTION (ngrep)
-- Total TCP Matches: {data['tools'].get('ngrep', {}).get('total_matches', 0)}
-- Sample Connections: {json.dumps(data['tools'].get('ngrep', {}).get('tcp_connections', [])[:5], indent=2, default=str)}
-
-### 4. HTTP TRAFFIC (httpry)
-- Total HTTP Requests: {data['tools'].get('httpry', {}).get('total_requests', 0)}
-- HTTP Methods: {json.dumps(data['tools'].get('httpry', {}).get('http_methods', {}), indent=2)}
-- Top Hosts: {json.dumps(data['tools'].get('httpry', {}).get('top_hosts', {}), indent=2)}
-- Sample Requests: {json.dumps(data['tools'].get('httpry', {}).get('sample_requests', [])[:3], indent=2, default=str)}
-
-### 5. DEEP PACKET ANALYSIS (tcpdump)
-- Total Packets: {data['tools'].get('tcpdump', {}).get('total_packets', 0)}
-- Sample Packets with Full Details: {json.dumps(data['tools'].get('tcpdump', {}).get('sample_packets', [])[:5], indent=2, default=str)}
-
-### 6. FLOW ANALYSIS (argus)
-- Total Network Flows: {data['tools'].get('argus', {}).get('total_flows', 0)}
-- Sample Flows: {json.dumps(data['tools'].get('argus', {}).get('flows', [])[:5], indent=2, default=str)}
-
-### 7. NETWORK SNIFFING (netsniff-ng)
-- Total Packets: {data['tools'].get('netsniff', {}).get('total_packets', 0)}
-- Sample Packets: {json.dumps(data['tools'].get('netsniff', {}).get('sample_packets', [])[:5], indent=2, default=str)}
-
-### 8. BANDWIDTH MONITORING (iftop)
-- Active Connections: {data['tools'].get('iftop', {}).get('total_connections', 0)}
-- Top Bandwidth Users: {json.dumps(data['tools'].get('iftop', {}).get('top_connections', [])[:5], indent=2, default=str)}
-
-### 9. PROCESS MONITORING (nethogs)
-- Active Processes: {data['tools'].get('nethogs', {}).get('total_processes', 0)}
-- Top Bandwidth Consumers: {json.dumps(data['tools'].get('nethogs', {}).get('top_bandwidth_users', [])[:10], indent=2, default=str)}
-
-### 10. INTRUSION DETECTION (Suricata)
-- Total Alerts: {data['tools'].get('suricata', {}).get('total_alerts', 0)}
-- Alert Details: {json.dumps(data['tools'].get('suricata', {}).get('alerts', [])[:5], indent=2, default=str)}
-- Network Flows: {data['tools'].get('suricata', {}).get('total_flows', 0)}
-- HTTP Events: {json.dumps(data['tools'].get('suricata', {}).get('http_events', [])[:3], indent=2, default=str)}
-- DNS Events: {json.dumps(data['tools'].get('suricata', {}).get('dns_events', [])[:3], indent=2, default=str)}
-- TLS Events: {json.dumps(data['tools'].get('suricata', {}).get('tls_events', [])[:3], indent=2, default=str)}
-
-### 11. IoT DEVICE SECURITY
-- Total IoT Devices: {data['iot_devices']['total_iot_devices']}
-- Device Categories: {json.dumps(data['iot_devices']['device_categories'], indent=2)}
-- IoT Devices Details: {json.dumps(data['iot_devices']['devices'], indent=2, default=str)}
-
-### 12. IoT SECURITY VULNERABILITIES
-- Total Active Vulnerabilities: {data['iot_security']['total_vulnerabilities']}
-- By Severity: {json.dumps(data['iot_security']['by_severity'], indent=2)}
-- Vulnerability Details: {json.dumps(data['iot_security']['vulnerabilities'], indent=2, default=str)}
-
-## ANALYSIS REQUEST
+## DATA COLLECTED ({data['timestamp']})"""
+    
+    footer = f"""## ANALYSIS REQUEST
 
 Please provide a comprehensive JSON response with the following structure:
 
@@ -552,7 +486,7 @@ Please provide a comprehensive JSON response with the following structure:
     "iot_devices": {data['network_summary']['iot_devices']},
     "mobile_devices": {data['network_summary']['mobile_devices']},
     "computers": {data['network_summary']['computers']},
-    "operating_systems": {json.dumps(data['network_summary']['os_distribution'])},
+    "operating_systems": {json.dumps(summary['os_distribution'])},
     "suspicious_devices": ["ip: reason for suspicion"],
     "device_breakdown": ["brief summary of each device type"]
   }},
@@ -575,11 +509,13 @@ Please provide a comprehensive JSON response with the following structure:
   ]
 }}
 
-CRITICAL: You MUST respond with ONLY valid JSON. Do not include any text before or after the JSON. Do not include markdown code blocks. Start your response with { and end with }. No explanations, no additional text, just pure JSON."""
-
+CRITICAL: You MUST respond with ONLY valid JSON. Do not include any text before or after the JSON. Do not include markdown code blocks. Start your response with {{ and end with }}. No explanations, no additional text, just pure JSON."""
+    
+    prompt = builder.render(header, footer)
+    logging.info(f"Prompt: ~{builder.used_tokens} tokens (budget {builder.budget})")
     return prompt
 
-def call_groq_api(prompt, api_key, config=None):
+def call_groq_api(prompt, api_key, config=None, cancel=None, deadline=None):
     """Call Groq API with multiple model fallbacks"""
     if not config:
         # Default model list if no config provided
@@ -588,62 +524,21 @@ def call_groq_api(prompt, api_key, config=None):
         models = config.get('ai_models', {}).get('groq_models', ["llama-3.3-70b-versatile"])
     
     for model in models:
-        try:
-            logging.info(f"Trying Groq model: {model}")
-            url = "https://api.groq.com/openai/v1/chat/completions"
-            headers = {
-                'Authorization': f'Bearer {api_key}',
-                'Content-Type': 'application/json'
-            }
-            
-            payload = {
-                "model": model,
-                "messages": [{"role": "user", "content": prompt}],
-                "temperature": 0.3,
-                "max_tokens": 4096
-            }
-            
-            response = requests.post(url, headers=headers, json=payload, timeout=60)
-            
-            if response.status_code == 200:
-                result = response.json()
-                text = result['choices'][0]['message']['content']
-                
-                # Clean up the response text
-                text = text.strip()
-                
-                # Extract JSON from markdown code blocks if present
-                if '```json' in text:
-                    text = text.split('```json')[1].split('```')[0].strip()
-                elif '```' in text:
-                    text = text.split('```')[1].split('```')[0].strip()
-                
-                # Find JSON boundaries
-                start_idx = text.find('{')
-                end_idx = text.rfind('}')
-                if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
-                    text = text[start_idx:end_idx+1]
-                
-                try:
-                    analysis = json.loads(text)
-                    logging.info(f"✅ Successfully used Groq model: {model}")
-                    return analysis
-                except json.JSONDecodeError as e:
-                    logging.warning(f"JSON decode error for {model}: {e}")
-                    logging.warning(f"Response text: {text[:200]}...")
-                    continue
-            else:
-                logging.warning(f"Groq model {model} failed: {response.status_code} - {response.text}")
-                continue
-                
-        except Exception as e:
-            logging.warning(f"Error with Groq model {model}: {e}")
+        # Stop between models once another provider has won or time is up
+        if (cancel is not None and cancel.is_set()) or request_timeout(deadline) <= 0:
+            return None
+        logging.info(f"Trying Groq model: {model}")
+        analysis = complete_json('groq', model, prompt, api_key, AGGREGATOR_ANALYSIS_FIELDS,
+                                 cancel=cancel, deadline=deadline)
+        if analysis is None:
             continue
+        logging.info(f"✅ Successfully used Groq model: {model}")
+        return analysis
     
     logging.error("All Groq models failed")
     return None
 
-def call_openrouter_api(prompt, api_key, config=None):
+def call_openrouter_api(prompt, api_key, config=None, cancel=None, deadline=None):
     """Call OpenRouter API with multiple model fallbacks"""
     if not config:
         # Default model list if no config provided
@@ -652,48 +547,21 @@ def call_openrouter_api(prompt, api_key, config=None):
         models = config.get('ai_models', {}).get('openrouter_models', ["deepseek/deepseek-r1-distill-qwen-1.5b"])
     
     for model in models:
-        try:
-            logging.info(f"Trying OpenRouter model: {model}")
-            url = "https://openrouter.ai/api/v1/chat/completions"
-            headers = {
-                'Authorization': f'Bearer {api_key}',
-                'Content-Type': 'application/json',
-                'HTTP-Referer': 'https://netguard-pro.local',
-                'X-Title': 'NetGuard Pro AI Analysis'
-            }
-            
-            payload = {
-                "model": model,
-                "messages": [{"role": "user", "content": prompt}],
-                "temperature": 0.3,
-                "max_tokens": 4096
-            }
-            
-            response = requests.post(url, headers=headers, json=payload, timeout=60)
-            
-            if response.status_code == 200:
-                result = response.json()
-                text = result['choices'][0]['message']['content']
-                # Extract JSON from markdown code blocks if present
-                if '```json' in text:
-                    text = text.split('```json')[1].split('```')[0].strip()
-                elif '```' in text:
-                    text = text.split('```')[1].split('```')[0].strip()
-                
-                logging.info(f"✅ Successfully used OpenRouter model: {model}")
-                return json.loads(text)
-            else:
-                logging.warning(f"OpenRouter model {model} failed: {response.status_code} - {response.text}")
-                continue
-                
-        except Exception as e:
-            logging.warning(f"Error with OpenRouter model {model}: {e}")
+        # Stop between models once another provider has won or time is up
+        if (cancel is not None and cancel.is_set()) or request_timeout(deadline) <= 0:
+            return None
+        logging.info(f"Trying OpenRouter model: {model}")
+        analysis = complete_json('openrouter', model, prompt, api_key, AGGREGATOR_ANALYSIS_FIELDS,
+                                 cancel=cancel, deadline=deadline)
+        if analysis is None:
             continue
+        logging.info(f"✅ Successfully used OpenRouter model: {model}")
+        return analysis
     
     logging.error("All OpenRouter models failed")
     return None
 
-def call_gemini_api(prompt, api_key, config=None):
+def call_gemini_api(prompt, api_key, config=None, cancel=None, deadline=None):
     """Call Google Gemini API with multiple model fallbacks"""
     if not config:
         # Default model list if no config provided
@@ -702,64 +570,16 @@ def call_gemini_api(prompt, api_key, config=None):
         models = config.get('ai_models', {}).get('gemini_models', ["gemini-2.5-pro", "gemini-2.5-flash"])
     
     for model in models:
-        try:
-            logging.info(f"Trying Gemini model: {model}")
-            url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={api_key}"
-            headers = {'Content-Type': 'application/json'}
-            
-            payload = {
-                "contents": [{
-                    "parts": [{"text": prompt}]
-                }],
-                "generationConfig": {
-                    "temperature": 0.3,
-                    "topK": 40,
-                    "topP": 0.95,
-                    "maxOutputTokens": 4096,
-                }
-            }
-            
-            response = requests.post(
-                url,
-                headers=headers,
-                json=payload,
-                timeout=60
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                text = result['candidates'][0]['content']['parts'][0]['text']
-                
-                # Clean up the response text
-                text = text.strip()
-                
-                # Extract JSON from markdown code blocks if present
-                if '```json' in text:
-                    text = text.split('```json')[1].split('```')[0].strip()
-                elif '```' in text:
-                    text = text.split('```')[1].split('```')[0].strip()
-                
-                # Find JSON boundaries
-                start_idx = text.find('{')
-                end_idx = text.rfind('}')
-                if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
-                    text = text[start_idx:end_idx+1]
-                
-                try:
-                    analysis = json.loads(text)
-                    logging.info(f"✅ Successfully used Gemini model: {model}")
-                    return analysis
-                except json.JSONDecodeError as e:
-                    logging.warning(f"JSON decode error for {model}: {e}")
-                    logging.warning(f"Response text: {text[:200]}...")
-                    continue
-            else:
-                logging.warning(f"Gemini model {model} failed: {response.status_code} - {response.text}")
-                continue
-                
-        except Exception as e:
-            logging.warning(f"Error with Gemini model {model}: {e}")
+        # Stop between models once another provider has won or time is up
+        if (cancel is not None and cancel.is_set()) or request_timeout(deadline) <= 0:
+            return None
+        logging.info(f"Trying Gemini model: {model}")
+        analysis = complete_json('gemini', model, prompt, api_key, AGGREGATOR_ANALYSIS_FIELDS,
+                                 cancel=cancel, deadline=deadline)
+        if analysis is None:
             continue
+        logging.info(f"✅ Successfully used Gemini model: {model}")
+        return analysis
     
     logging.error("All Gemini models failed")
     return None
@@ -840,6 +660,25 @@ def main():
         return 1
     
     interval = config.get('analysis_interval_minutes', 5) * 60
+    configure_ai_client(config)
+    collection = config.get('data_collection', {})
+    workers = collection.get('aggregation_workers', AGGREGATION_WORKERS)
+    source_timeout = collection.get('source_timeout_seconds', SOURCE_TIMEOUT)
+    window_minutes = collection.get('time_window_minutes', DEFAULT_WINDOW_MINUTES)
+    prepare_database(window_minutes)
+    
+    # Priority order: ai_models.primary then ai_models.fallbacks (Gemini → Groq → OpenRouter)
+    calls = {
+        'gemini': (gemini_key, call_gemini_api),
+        'groq': (groq_key, call_groq_api),
+        'openrouter': (openrouter_key, call_openrouter_api),
+    }
+    ai_models = config.get('ai_models', {})
+    order = [ai_models.get('primary', 'gemini')] + ai_models.get('fallbacks', ['groq', 'openrouter'])
+    order += [name for name in calls if name not in order]
+    provider_calls = [(name,) + calls[name] for name in dict.fromkeys(order) if name in calls and calls[name][0]]
+    provider_stats = ProviderStats()
+    change_detector = ChangeDetector(config.get('change_detection'))
     
     logging.info(f"AI Analysis Interval: {interval} seconds ({interval//60} minutes)")
     logging.info(f"Starting continuous AI analysis...")
@@ -853,43 +692,51 @@ def main():
             logging.info(f"AI Analysis Cycle {cycle}")
             logging.info(f"{'='*60}")
             
-            # 1. Aggregate data
+            # 1. Aggregate data, once per interval for every AI consumer and the dashboard
             logging.info("Step 1: Aggregating data from all 10 tools...")
-            data = aggregate_data_last_5min()
+            window = TimeWindow(window_minutes)
+            data = aggregate_data_last_5min(workers, source_timeout, window=window)
             
             if not data:
                 logging.warning("No data collected, skipping this cycle")
                 time.sleep(interval)
                 continue
             
+            try:
+                publish_snapshot(window, dict(build_sections(window, config), aggregate=data),
+                                 config.get('snapshots'))
+            except Exception as e:
+                logging.error(f"Error publishing snapshot: {e}")
+            
             # Log data summary
             tool_count = sum(1 for tool in data['tools'].values() if tool)
             logging.info(f"✓ Collected data from {tool_count} tools")
             
+            # Quiet network: store the previous analysis again instead of calling the LLM
+            analyze, current, reason = change_detector.should_analyze(data)
+            if not analyze:
+                logging.info(f"Skipping AI call ({reason}); reusing cached analysis")
+                change_detector.reused()
+                if store_ai_results(dict(change_detector.analysis, reused_cached_analysis=True)):
+                    logging.info(f"✓ Analysis cycle {cycle} completed from cache")
+                logging.info(f"\nWaiting {interval} seconds until next analysis...")
+                time.sleep(interval)
+                continue
+            logging.info(f"Fresh analysis needed: {reason}")
+            
             # 2. Build AI prompt
             logging.info("Step 2: Building AI analysis prompt...")
-            prompt = build_ai_prompt(data)
-            
-            # 3. Call AI API with complete fallback chain: Gemini → Groq → OpenRouter
-            analysis = None
-            
-            # Try Gemini first (with multiple models)
-            if gemini_key:
-                logging.info("Step 3: Trying Gemini AI models...")
-                analysis = call_gemini_api(prompt, gemini_key, config)
-            
-            # If Gemini fails, try Groq (with multiple models)
-            if not analysis and groq_key:
-                logging.warning("Gemini failed, trying Groq AI models...")
-                analysis = call_groq_api(prompt, groq_key, config)
+            prompt = build_ai_prompt(data, config.get('prompt', {}).get('token_budget'))
             
-            # If Groq fails, try OpenRouter (with multiple models)
-            if not analysis and openrouter_key:
-                logging.warning("Groq failed, trying OpenRouter AI models...")
-                analysis = call_openrouter_api(prompt, openrouter_key, config)
+            # 3. Call AI providers in priority order, hedging slow ones with the next
+            logging.info("Step 3: Requesting AI analysis (hedged across providers)...")
+            providers = [(name, partial(call, prompt, key, config)) for name, key, call in provider_calls]
+            provider, analysis = hedged_call(providers, config.get('hedging'), provider_stats)
+            for line in provider_stats.summary():
+                logging.info(f"  {line}")
             
             if analysis:
-                logging.info(f"✓ AI Analysis completed")
+                logging.info(f"✓ AI Analysis completed by {provider}")
                 logging.info(f"  Threat Level: {analysis.get('threat_level')}")
                 logging.info(f"  Network Health: {analysis.get('network_health_score')}/100")
                 logging.info(f"  Threats Detected: {len(analysis.get('threats_detected', []))}")
@@ -897,6 +744,7 @@ def main():
                 # 4. Store results
                 logging.info("Step 4: Storing AI analysis results...")
                 analysis_id = store_ai_results(analysis)
+                change_detector.analyzed(current, analysis)
                 
                 if analysis_id:
                     logging.info(f"✓ Analysis cycle {cycle} completed successfully")
@@ -917,5 +765,14 @@ def main():
         return 1
 
 if __name__ == "__main__":
+    # Only when run as the service: importers (the benchmark) keep their own logging
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(LOG_FILE),
+            logging.StreamHandler()
+        ]
+    )
     sys.exit(main())
 
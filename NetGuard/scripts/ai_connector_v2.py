@@ -7,13 +7,17 @@ Uses JSON config file and comprehensive data from all tools
 import json
 import sqlite3
 import logging
-import re
 from datetime import datetime
-from comprehensive_data_aggregator import aggregate_all_data, export_for_ai, load_config
+from ai_providers import complete_json, configure as configure_ai_client
+from json_stream import CONNECTOR_ANALYSIS_FIELDS
+from comprehensive_data_aggregator import aggregate_all_data, load_config
+from snapshots import snapshot_section
 
 DB_PATH = "/home/jarvis/NetGuard/network.db"
 CONFIG_PATH = "/home/jarvis/NetGuard/config/ai_config.json"
 
+ANALYST_SYSTEM_PROMPT = "You are an expert network security analyst. Analyze network traffic and identify threats. Always respond with valid JSON only."
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s'
@@ -25,6 +29,7 @@ class MultiAIAnalyzer:
     
     def __init__(self, config):
         self.config = config
+        configure_ai_client(config)
         self.api_keys = config.get('api_keys', {})
         self.models = self._load_model_configs()
         
@@ -92,89 +97,18 @@ class MultiAIAnalyzer:
     
     def _call_gemini(self, data, config, api_key):
         """Call Google Gemini API"""
-        try:
-            import google.generativeai as genai
-        except ImportError:
-            logging.error("google-generativeai not installed")
-            return None
-        
-        try:
-            genai.configure(api_key=api_key)
-            model = genai.GenerativeModel(config['model'])
-            
-            prompt = self._build_comprehensive_prompt(data)
-            
-            response = model.generate_content(
-                prompt,
-                generation_config={
-                    'temperature': 0.3,
-                    'max_output_tokens': 4096,
-                }
-            )
-            
-            return self._parse_json_response(response.text)
-            
-        except Exception as e:
-            logging.error(f"Gemini error: {e}")
-            return None
+        return complete_json('gemini', config['model'], self._build_comprehensive_prompt(data), api_key,
+                             CONNECTOR_ANALYSIS_FIELDS)
     
     def _call_groq(self, data, config, api_key):
         """Call Groq API"""
-        try:
-            from groq import Groq
-        except ImportError:
-            logging.error("groq not installed")
-            return None
-        
-        try:
-            client = Groq(api_key=api_key)
-            
-            response = client.chat.completions.create(
-                model=config['model'],
-                messages=[
-                    {"role": "system", "content": "You are an expert network security analyst. Analyze network traffic and identify threats. Always respond with valid JSON only."},
-                    {"role": "user", "content": self._build_comprehensive_prompt(data)}
-                ],
-                temperature=0.3,
-                max_tokens=4096,
-                response_format={"type": "json_object"}
-            )
-            
-            return self._parse_json_response(response.choices[0].message.content)
-            
-        except Exception as e:
-            logging.error(f"Groq error: {e}")
-            return None
+        return complete_json('groq', config['model'], self._build_comprehensive_prompt(data), api_key,
+                             CONNECTOR_ANALYSIS_FIELDS, system=ANALYST_SYSTEM_PROMPT, json_mode=True)
     
     def _call_openrouter(self, data, config, api_key):
         """Call OpenRouter API"""
-        try:
-            from openai import OpenAI
-        except ImportError:
-            logging.error("openai not installed")
-            return None
-        
-        try:
-            client = OpenAI(
-                base_url="https://openrouter.ai/api/v1",
-                api_key=api_key
-            )
-            
-            response = client.chat.completions.create(
-                model=config['model'],
-                messages=[
-                    {"role": "system", "content": "You are an expert network security analyst. Analyze network traffic and identify threats. Always respond with valid JSON only."},
-                    {"role": "user", "content": self._build_comprehensive_prompt(data)}
-                ],
-                temperature=0.3,
-                max_tokens=4096
-            )
-            
-            return self._parse_json_response(response.choices[0].message.content)
-            
-        except Exception as e:
-            logging.error(f"OpenRouter error: {e}")
-            return None
+        return complete_json('openrouter', config['model'], self._build_comprehensive_prompt(data), api_key,
+                             CONNECTOR_ANALYSIS_FIELDS, system=ANALYST_SYSTEM_PROMPT)
     
     def _build_comprehensive_prompt(self, data):
         """Build comprehensive analysis prompt with all tool data"""
@@ -307,22 +241,7 @@ IMPORTANT: Return ONLY the JSON object. No markdown, no explanations.
 """
         
         return prompt
-    
-    def _parse_json_response(self, text):
-        """Parse JSON from AI response"""
-        text = text.strip()
-        
-        # Remove markdown code blocks
-        if text.startswith('```'):
-            text = re.sub(r'^```(?:json)?\s*\n', '', text)
-            text = re.sub(r'\n```\s*$', '', text)
-        
-        try:
-            return json.loads(text)
-        except json.JSONDecodeError as e:
-            logging.error(f"Failed to parse JSON: {e}")
-            logging.debug(f"Response: {text[:500]}...")
-            return None
+
 
 
 def store_ai_predictions(ai_response):
@@ -462,17 +381,17 @@ def analyze_network():
         logging.info(f"Edit {CONFIG_PATH} and set ai_enabled: true")
         return False
     
-    # Aggregate data from all tools
-    logging.info("Step 1: Aggregating data from all monitoring tools...")
-    aggregated_data = aggregate_all_data(config)
+    # Data from the shared aggregation snapshot; aggregate directly only if none is fresh
+    logging.info("Step 1: Loading the latest aggregation snapshot...")
+    data = snapshot_section('comprehensive', config.get('snapshots', {}).get('max_age_seconds'))
+    if data is None:
+        logging.info("No fresh snapshot, aggregating data from all monitoring tools...")
+        data = aggregate_all_data(config)
     
-    if aggregated_data['overall_statistics']['total_data_points'] == 0:
+    if data['overall_statistics']['total_data_points'] == 0:
         logging.warning("No data to analyze")
         return False
     
-    # Export for AI
-    export_file, data = export_for_ai(aggregated_data)
-    
     # Create AI analyzer
     analyzer = MultiAIAnalyzer(config)
     
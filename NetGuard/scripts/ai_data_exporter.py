@@ -7,154 +7,132 @@ Aggregates network data from all collectors and exports to AI service
 import sqlite3
 import json
 import logging
-from datetime import datetime, timedelta
-from collections import defaultdict
+from datetime import datetime
+from time_window import TimeWindow
+from device_baseline import load_baselines
 
 DB_PATH = "/home/jarvis/NetGuard/network.db"
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
 
+def get_time_window_data(minutes=5):
+    """The [now - N minutes, now) window the export functions read"""
+    return TimeWindow(minutes)
 
-def get_latest_table(prefix):
-    """Get the most recent table for a given prefix"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute(f"""
-        SELECT name FROM sqlite_master 
-        WHERE type='table' AND name LIKE '{prefix}_%' 
-        AND name NOT LIKE '%template%'
-        ORDER BY name DESC 
-        LIMIT 1
-    """)
-    
-    result = cursor.fetchone()
-    conn.close()
-    
-    return result[0] if result else None
 
+LOCAL_PREFIX = '192.168.'  # devices tracked per IP
+HIGH_PORT = 50000
+MAX_LISTED_PORTS = 20
 
-def get_time_window_data(minutes=5):
-    """Get data from the last N minutes"""
-    cutoff_time = (datetime.now() - timedelta(minutes=minutes)).isoformat()
-    return cutoff_time
 
+def split_distinct(value):
+    """group_concat(DISTINCT ...) output back to a list"""
+    return value.split(',') if value else []
 
-def aggregate_tcpdump_data(time_window_minutes=5):
-    """Aggregate tcpdump packet data for AI analysis"""
-    table = get_latest_table('tcpdump')
-    if not table:
-        return None
+
+def aggregate_tcpdump_data(time_window_minutes=5, window=None):
+    """Aggregate tcpdump packet data for AI analysis
     
+    Everything is grouped in SQL over the whole window, reading only the
+    columns needed; Python only merges the per-device rows
+    """
+    window = window or get_time_window_data(time_window_minutes)
     conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
     
     try:
-        # Get all packets from the table (most recent captures)
-        cursor.execute(f"""
-            SELECT * FROM {table} 
-            ORDER BY id DESC 
-            LIMIT 1000
-        """)
-        
-        packets = [dict(row) for row in cursor.fetchall()]
-        
-        if not packets:
+        source = window.source(conn, 'tcpdump', ['src_ip', 'dest_ip', 'protocol', 'frame_length', 'dest_port'])
+        if source is None:
             return None
         
-        # Aggregate network metrics
-        total_packets = len(packets)
-        total_bytes = sum(p.get('frame_length', 0) or 0 for p in packets)
+        # Network metrics
+        totals = window.fetch(conn, """
+            SELECT COUNT(*) AS packets, COALESCE(SUM(frame_length), 0) AS bytes,
+                   COUNT(DISTINCT NULLIF(src_ip, '')) AS src_ips,
+                   COUNT(DISTINCT NULLIF(dest_ip, '')) AS dst_ips
+            FROM {source}
+        """, source)[0]
+        total_packets = totals['packets']
+        if not total_packets:
+            return None
+        total_bytes = totals['bytes']
         
         # Protocol distribution
-        protocols = defaultdict(int)
-        for p in packets:
-            proto = p.get('protocol')
-            if proto:
-                protocols[proto] += 1
-        
         protocol_dist = {
-            proto: round((count / total_packets) * 100, 1) 
-            for proto, count in protocols.items()
+            row['protocol']: round((row['n'] / total_packets) * 100, 1)
+            for row in window.fetch(conn, """
+                SELECT protocol, COUNT(*) AS n FROM {source}
+                WHERE protocol != '' GROUP BY protocol
+            """, source)
         }
         
-        # Unique IPs
-        src_ips = set(p.get('src_ip') for p in packets if p.get('src_ip'))
-        dst_ips = set(p.get('dest_ip') for p in packets if p.get('dest_ip'))
+        # Device activity tracking: local senders and receivers
+        device_activity = {}
         
-        # Device activity tracking
-        device_activity = defaultdict(lambda: {
-            'packets_sent': 0,
-            'packets_received': 0,
-            'bytes_sent': 0,
-            'bytes_received': 0,
-            'connections': 0,
-            'protocols': set(),
-            'destinations': set(),
-            'ports_accessed': set()
-        })
+        def device(ip):
+            return device_activity.setdefault(ip, {
+                'ip': ip,
+                'packets_sent': 0,
+                'packets_received': 0,
+                'bytes_sent': 0,
+                'bytes_received': 0,
+                'unique_destinations': 0,
+                'protocols_used': [],
+                'ports_accessed': []
+            })
         
-        for p in packets:
-            src = p.get('src_ip')
-            dst = p.get('dest_ip')
-            proto = p.get('protocol')
-            length = p.get('frame_length', 0) or 0
-            dst_port = p.get('dest_port')
-            
-            if src and src.startswith('192.168.'):
-                device_activity[src]['packets_sent'] += 1
-                device_activity[src]['bytes_sent'] += length
-                if dst:
-                    device_activity[src]['destinations'].add(dst)
-                if proto:
-                    device_activity[src]['protocols'].add(proto)
-                if dst_port:
-                    device_activity[src]['ports_accessed'].add(dst_port)
-            
-            if dst and dst.startswith('192.168.'):
-                device_activity[dst]['packets_received'] += 1
-                device_activity[dst]['bytes_received'] += length
+        for row in window.fetch(conn, f"""
+            SELECT src_ip, COUNT(*) AS packets, COALESCE(SUM(frame_length), 0) AS bytes,
+                   COUNT(DISTINCT NULLIF(dest_ip, '')) AS destinations,
+                   group_concat(DISTINCT NULLIF(protocol, '')) AS protocols,
+                   group_concat(DISTINCT NULLIF(dest_port, 0)) AS ports
+            FROM {{source}}
+            WHERE src_ip LIKE '{LOCAL_PREFIX}%'
+            GROUP BY src_ip
+            ORDER BY packets DESC
+        """, source):
+            stats = device(row['src_ip'])
+            stats['packets_sent'] = row['packets']
+            stats['bytes_sent'] = row['bytes']
+            stats['unique_destinations'] = row['destinations']
+            stats['protocols_used'] = split_distinct(row['protocols'])
+            stats['ports_accessed'] = [int(port) for port in split_distinct(row['ports'])[:MAX_LISTED_PORTS]]
         
-        # Port activity analysis
-        high_ports = [p.get('dest_port') for p in packets 
-                      if p.get('dest_port') and p.get('dest_port') > 50000]
+        for row in window.fetch(conn, f"""
+            SELECT dest_ip, COUNT(*) AS packets, COALESCE(SUM(frame_length), 0) AS bytes
+            FROM {{source}}
+            WHERE dest_ip LIKE '{LOCAL_PREFIX}%'
+            GROUP BY dest_ip
+            ORDER BY packets DESC
+        """, source):
+            stats = device(row['dest_ip'])
+            stats['packets_received'] = row['packets']
+            stats['bytes_received'] = row['bytes']
         
-        sequential_ports = False
-        if len(high_ports) > 3:
-            sorted_ports = sorted(set(high_ports))
-            if len(sorted_ports) > 2:
-                sequential_ports = all(
-                    sorted_ports[i+1] - sorted_ports[i] <= 5 
-                    for i in range(len(sorted_ports)-1)
-                )
+        # Port activity analysis: high destination ports and the largest gap
+        # between consecutive distinct ones (sequential scans step by <= 5)
+        ports = window.fetch(conn, f"""
+            WITH high AS (SELECT dest_port FROM {{source}} WHERE dest_port > {HIGH_PORT}),
+                 distinct_ports AS (SELECT DISTINCT dest_port FROM high)
+            SELECT (SELECT COUNT(*) FROM high) AS total,
+                   (SELECT COUNT(*) FROM distinct_ports) AS distinct_count,
+                   (SELECT MAX(gap) FROM (
+                        SELECT dest_port - LAG(dest_port) OVER (ORDER BY dest_port) AS gap
+                        FROM distinct_ports)) AS max_gap,
+                   (SELECT group_concat(dest_port) FROM (
+                        SELECT dest_port FROM distinct_ports ORDER BY dest_port LIMIT {MAX_LISTED_PORTS})) AS listed
+        """, source)[0]
+        sequential_ports = ports['total'] > 3 and ports['distinct_count'] > 2 and ports['max_gap'] <= 5
         
         return {
             'total_packets': total_packets,
             'total_bytes': total_bytes,
-            'unique_src_ips': len(src_ips),
-            'unique_dst_ips': len(dst_ips),
+            'unique_src_ips': totals['src_ips'],
+            'unique_dst_ips': totals['dst_ips'],
             'protocol_distribution': protocol_dist,
-            'devices': [
-                {
-                    'ip': ip,
-                    'packets_sent': stats['packets_sent'],
-                    'packets_received': stats['packets_received'],
-                    'bytes_sent': stats['bytes_sent'],
-                    'bytes_received': stats['bytes_received'],
-                    'unique_destinations': len(stats['destinations']),
-                    'protocols_used': list(stats['protocols']),
-                    'ports_accessed': list(stats['ports_accessed'])[:20]  # Limit size
-                }
-                for ip, stats in device_activity.items()
-            ],
+            'devices': list(device_activity.values()),
             'port_activity': {
-                'high_ports_accessed': list(set(high_ports))[:20],
+                'high_ports_accessed': [int(port) for port in split_distinct(ports['listed'])],
                 'sequential_ports': sequential_ports,
-                'total_high_port_access': len(high_ports)
+                'total_high_port_access': ports['total']
             }
         }
         
@@ -165,33 +143,34 @@ def aggregate_tcpdump_data(time_window_minutes=5):
         conn.close()
 
 
-def aggregate_connection_data():
+def aggregate_connection_data(window=None):
     """Get detailed connection information"""
-    table = get_latest_table('tcpdump')
-    if not table:
-        return []
-    
+    window = window or get_time_window_data()
     conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
     
     try:
-        # Get connections with complete info
-        cursor.execute(f"""
+        source = window.source(conn, 'tcpdump', ['src_ip', 'dest_ip', 'src_port', 'dest_port', 'protocol',
+                                                 'frame_length', 'tcp_syn', 'tcp_ack', 'tcp_fin', 'tcp_rst'])
+        if source is None:
+            return []
+        
+        # Get connections with complete info (flags seen on any packet of the connection)
+        rows = window.fetch(conn, """
             SELECT 
                 src_ip, dest_ip, src_port, dest_port, protocol,
                 COUNT(*) as packets,
                 SUM(frame_length) as bytes,
-                tcp_syn, tcp_ack, tcp_fin, tcp_rst
-            FROM {table}
+                MAX(tcp_syn) as tcp_syn, MAX(tcp_ack) as tcp_ack,
+                MAX(tcp_fin) as tcp_fin, MAX(tcp_rst) as tcp_rst
+            FROM {source}
             WHERE src_ip IS NOT NULL AND dest_ip IS NOT NULL
             GROUP BY src_ip, dest_ip, src_port, dest_port, protocol
+            ORDER BY packets DESC
             LIMIT 100
-        """)
+        """, source)
         
         connections = []
-        for row in cursor.fetchall():
-            conn_data = dict(row)
+        for conn_data in rows:
             # Calculate flags
             tcp_flags = []
             if conn_data.get('tcp_syn'):
@@ -223,27 +202,14 @@ def aggregate_connection_data():
         conn.close()
 
 
-def get_dns_queries():
+def get_dns_queries(window=None):
     """Extract DNS query information"""
-    table = get_latest_table('tcpdump')
-    if not table:
-        return []
-    
+    window = window or get_time_window_data()
     conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
     
     try:
-        cursor.execute(f"""
-            SELECT src_ip, dns_query, timestamp
-            FROM {table}
-            WHERE dns_query IS NOT NULL AND dns_query != ''
-            ORDER BY id DESC
-            LIMIT 50
-        """)
-        
         queries = []
-        for row in cursor.fetchall():
+        for row in window.recent(conn, 'tcpdump', 50, where="dns_query IS NOT NULL AND dns_query != ''"):
             queries.append({
                 'query': row['dns_query'],
                 'source_ip': row['src_ip'],
@@ -259,28 +225,14 @@ def get_dns_queries():
         conn.close()
 
 
-def get_http_traffic():
+def get_http_traffic(window=None):
     """Extract HTTP traffic information"""
-    table = get_latest_table('tcpdump')
-    if not table:
-        return []
-    
+    window = window or get_time_window_data()
     conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
     
     try:
-        cursor.execute(f"""
-            SELECT src_ip, dest_ip, http_method, http_host, http_uri, 
-                   http_status_code, frame_length, timestamp
-            FROM {table}
-            WHERE http_method IS NOT NULL
-            ORDER BY id DESC
-            LIMIT 50
-        """)
-        
         traffic = []
-        for row in cursor.fetchall():
+        for row in window.recent(conn, 'tcpdump', 50, where="http_method IS NOT NULL"):
             traffic.append({
                 'source_ip': row['src_ip'],
                 'destination_ip': row['dest_ip'],
@@ -301,7 +253,20 @@ def get_http_traffic():
         conn.close()
 
 
-def export_to_ai_format(time_window_minutes=5):
+def add_baseline_deviations(devices, at):
+    """Attach each device's deviation from its streamed baseline (tcpdump collector's device_profiles)"""
+    try:
+        profiles = load_baselines(DB_PATH, [device['ip'] for device in devices])
+    except sqlite3.Error as e:
+        logging.warning(f"Device baselines unavailable: {e}")
+        return
+    for device in devices:
+        profile = profiles.get(device['ip'])
+        if profile:
+            device['baseline'] = profile.deviations(at)
+
+
+def export_to_ai_format(time_window_minutes=5, window=None):
     """
     Export aggregated network data in AI-ready JSON format
     
@@ -314,18 +279,21 @@ def export_to_ai_format(time_window_minutes=5):
     - Port activity
     """
     
+    # Aggregate all data over one shared window
+    window = window or get_time_window_data(time_window_minutes)
+    time_window_minutes = window.minutes
     logging.info(f"Exporting data for {time_window_minutes}-minute window...")
     
-    # Aggregate all data
-    network_data = aggregate_tcpdump_data(time_window_minutes)
+    network_data = aggregate_tcpdump_data(time_window_minutes, window)
     
     if not network_data:
         logging.warning("No network data available")
         return None
     
-    connections = aggregate_connection_data()
-    dns_queries = get_dns_queries()
-    http_traffic = get_http_traffic()
+    add_baseline_deviations(network_data['devices'], window.end)
+    connections = aggregate_connection_data(window)
+    dns_queries = get_dns_queries(window)
+    http_traffic = get_http_traffic(window)
     
     # Build comprehensive export
     export_data = {
@@ -386,6 +354,10 @@ def save_export_to_file(data, filename=None):
 
 
 if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
     logging.info("=" * 60)
     logging.info("NetGuard Pro - AI Data Export Test")
     logging.info("=" * 60)
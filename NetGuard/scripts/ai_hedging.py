@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+NetGuard Pro - Hedged AI Provider Calls
+Starts the top-priority provider, adds the next one in parallel after a hedge
+delay (or at once when one fails), and keeps the first valid JSON analysis
+within an overall deadline; per-provider latency/outcome histograms are kept
+"""
+
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_HEDGING = {
+    'hedge_delay_seconds': 10,
+    'deadline_seconds': 150,
+}
+
+LATENCY_BUCKETS = (1, 2, 5, 10, 20, 30, 60, 120)  # seconds, upper bounds; last bucket is +inf
+OUTCOMES = ('success', 'failed', 'cancelled')
+REQUEST_TIMEOUT = 60  # per model request, trimmed to the remaining deadline
+
+# Provider calls are blocking; a dedicated pool lets a cycle return without
+# joining losers still inside requests.post
+_executor = ThreadPoolExecutor(max_workers=6, thread_name_prefix='ai-provider')
+
+
+def request_timeout(deadline, limit=REQUEST_TIMEOUT):
+    """Seconds left for one request given a time.time() deadline (None = no deadline)"""
+    return limit if deadline is None else min(limit, deadline - time.time())
+
+
+class ProviderStats:
+    """Latency histogram per provider and outcome, for the life of the process"""
+
+    def __init__(self):
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def record(self, provider, outcome, latency):
+        bucket = next((i for i, bound in enumerate(LATENCY_BUCKETS) if latency <= bound), len(LATENCY_BUCKETS))
+        with self.lock:
+            histogram = self.histograms.setdefault(provider, {o: [0] * (len(LATENCY_BUCKETS) + 1) for o in OUTCOMES})
+            histogram[outcome][bucket] += 1
+
+    def summary(self):
+        """One line per provider: outcome counts and success latency buckets"""
+        labels = [f"<={bound}s" for bound in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]}s"]
+        lines = []
+        with self.lock:
+            for provider, histogram in sorted(self.histograms.items()):
+                counts = ', '.join(f"{o} {sum(histogram[o])}" for o in OUTCOMES)
+                latency = ' '.join(f"{label}:{n}" for label, n in zip(labels, histogram['success']) if n)
+                lines.append(f"{provider}: {counts} | success latency {latency or '-'}")
+        return lines
+
+
+async def _hedge(providers, hedge_delay, deadline_seconds, stats):
+    loop = asyncio.get_running_loop()
+    cancel = threading.Event()
+    deadline = time.time() + deadline_seconds
+    waiting = list(providers)
+    running = {}
+
+    def launch():
+        name, call = waiting.pop(0)
+        logging.info(f"Starting AI provider {name}")
+        future = loop.run_in_executor(_executor, call, cancel, deadline)
+        running[future] = (name, time.monotonic())
+
+    launch()
+    next_hedge = time.monotonic() + hedge_delay
+    try:
+        while running or waiting:
+            if not running or (waiting and time.monotonic() >= next_hedge):
+                launch()
+                next_hedge = time.monotonic() + hedge_delay
+            timeout = deadline - time.time()
+            if waiting:
+                timeout = min(timeout, next_hedge - time.monotonic())
+            if deadline - time.time() <= 0:
+                logging.error(f"AI analysis deadline ({deadline_seconds}s) reached")
+                return None, None
+            done, _ = await asyncio.wait(running, timeout=max(timeout, 0),
+                                         return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                name, started = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logging.warning(f"AI provider {name} raised: {e}")
+                    result = None
+                if isinstance(result, dict) and result:
+                    stats.record(name, 'success', time.monotonic() - started)
+                    return name, result
+                stats.record(name, 'failed', time.monotonic() - started)
+                logging.warning(f"AI provider {name} returned no valid analysis")
+                next_hedge = time.monotonic()  # don't wait out the delay after a failure
+        return None, None
+    finally:
+        # Losers stop before their next model attempt; their results are dropped
+        cancel.set()
+        for future, (name, started) in running.items():
+            future.cancel()
+            stats.record(name, 'cancelled', time.monotonic() - started)
+
+
+def hedged_call(providers, settings=None, stats=None):
+    """Run [(name, call(cancel, deadline))] in priority order; returns (name, analysis) or (None, None)"""
+    settings = dict(DEFAULT_HEDGING, **(settings or {}))
+    if not providers:
+        return None, None
+    return asyncio.run(_hedge(providers, settings['hedge_delay_seconds'], settings['deadline_seconds'],
+                              stats or ProviderStats()))
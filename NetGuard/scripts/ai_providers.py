@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+NetGuard Pro - AI Provider Client
+Shared by the AI aggregator and connectors: keep-alive session pools per
+provider, jittered exponential backoff on 429/5xx, and a per-model circuit
+breaker whose state lives in the database so every AI script skips a model
+another one just saw failing; JSON analyses are streamed and read only
+until the first valid object closes
+"""
+
+import json
+import time
+import random
+import sqlite3
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ai_hedging import request_timeout
+from json_stream import JsonObjectScanner
+
+DB_PATH = "/home/jarvis/NetGuard/network.db"
+
+BASE_URLS = {
+    'gemini': 'https://generativelanguage.googleapis.com',
+    'groq': 'https://api.groq.com/openai',
+    'openrouter': 'https://openrouter.ai/api',
+}
+ENDPOINT_PATHS = {
+    'gemini': '/v1beta/models/{model}:generateContent',
+    'groq': '/v1/chat/completions',
+    'openrouter': '/v1/chat/completions',
+}
+STREAM_ENDPOINT_PATHS = dict(ENDPOINT_PATHS, gemini='/v1beta/models/{model}:streamGenerateContent?alt=sse')
+
+DEFAULT_CLIENT_SETTINGS = {
+    'max_retries': 2,  # per request, for 429/5xx and connection errors
+    'backoff_base_seconds': 1,
+    'backoff_max_seconds': 20,
+    'breaker_failures': 3,  # consecutive failures that open a model's breaker
+    'breaker_cooldown_seconds': 300,
+    'pool_size': 4,
+    'health_cache_seconds': 10,  # how long a process trusts its copy of a model's breaker state
+    'base_urls': {},  # provider -> base URL override, e.g. a local mock server
+    'stream': True,  # stream JSON analyses (off for proxies that don't pass server-sent events)
+}
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+HARD_FAILURE_STATUS = {401, 403, 404}  # bad key or unknown model: open the breaker at once
+
+settings = dict(DEFAULT_CLIENT_SETTINGS)
+_sessions = {}
+_sessions_lock = threading.Lock()
+_health = None
+
+
+def configure(config):
+    """Apply the ai_client section of ai_config.json"""
+    settings.update((config or {}).get('ai_client', {}))
+
+
+def endpoint(provider, model, stream=False):
+    base = settings['base_urls'].get(provider) or BASE_URLS[provider]
+    paths = STREAM_ENDPOINT_PATHS if stream else ENDPOINT_PATHS
+    return base.rstrip('/') + paths[provider].format(model=model)
+
+
+def init_model_health_table(cursor):
+    """Create the per-model circuit breaker table if missing"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ai_model_health (
+            provider TEXT NOT NULL,
+            model TEXT NOT NULL,
+            consecutive_failures INTEGER DEFAULT 0,
+            open_until REAL DEFAULT 0,
+            last_error TEXT,
+            updated_at TEXT,
+            PRIMARY KEY (provider, model)
+        )
+    """)
+
+
+class ModelHealth:
+    """Circuit breaker per (provider, model)
+
+    Open breakers are skipped until their cool-down passes; the next call is
+    then a trial that closes the breaker on success or reopens it on failure.
+    State is read from and written to ai_model_health, and re-read at most
+    every health_cache_seconds per model; if the database is unavailable the
+    in-memory copy keeps working for this process
+    """
+
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = db_path
+        self.state = {}  # (provider, model) -> [consecutive_failures, open_until]
+        self.loaded = {}  # (provider, model) -> time.monotonic() of the last database read
+        self.lock = threading.Lock()
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            init_model_health_table(conn.cursor())
+            conn.commit()
+            conn.close()
+        except sqlite3.Error as e:
+            logging.warning(f"Model health table unavailable, breaker state is per-process: {e}")
+
+    def _load(self, key, max_age=0):
+        """State for key, read from the database unless the copy is newer than max_age seconds"""
+        now = time.monotonic()
+        if key in self.loaded and now - self.loaded[key] < max_age:
+            return self.state.get(key, [0, 0])
+        self.loaded[key] = now
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            row = conn.execute("""
+                SELECT consecutive_failures, open_until FROM ai_model_health
+                WHERE provider = ? AND model = ?
+            """, key).fetchone()
+            conn.close()
+            if row:
+                self.state[key] = list(row)
+        except sqlite3.Error:
+            pass
+        return self.state.get(key, [0, 0])
+
+    def available(self, provider, model):
+        with self.lock:
+            _, open_until = self._load((provider, model), settings['health_cache_seconds'])
+        return time.time() >= open_until
+
+    def record(self, provider, model, ok, error=None, hard=False):
+        key = (provider, model)
+        with self.lock:
+            failures, open_until = self._load(key)
+            if ok:
+                failures, open_until = 0, 0
+            else:
+                failures += 1
+                if hard or failures >= settings['breaker_failures']:
+                    open_until = time.time() + settings['breaker_cooldown_seconds']
+                    logging.warning(f"Circuit open for {provider}/{model} for "
+                                    f"{settings['breaker_cooldown_seconds']}s: {error}")
+            self.state[key] = [failures, open_until]
+            try:
+                conn = sqlite3.connect(self.db_path, timeout=10)
+                conn.execute("""
+                    INSERT INTO ai_model_health (provider, model, consecutive_failures, open_until, last_error, updated_at)
+                    VALUES (?, ?, ?, ?, ?, datetime('now'))
+                    ON CONFLICT(provider, model) DO UPDATE SET
+                        consecutive_failures = excluded.consecutive_failures,
+                        open_until = excluded.open_until,
+                        last_error = COALESCE(excluded.last_error, last_error),
+                        updated_at = excluded.updated_at
+                """, (provider, model, failures, open_until, str(error)[:500] if error else None))
+                conn.commit()
+                conn.close()
+            except sqlite3.Error as e:
+                logging.debug(f"Could not persist model health: {e}")
+
+
+def model_health():
+    global _health
+    if _health is None:
+        _health = ModelHealth()
+    return _health
+
+
+def get_session(provider):
+    """Keep-alive session for a provider, shared by every thread in the process"""
+    with _sessions_lock:
+        session = _sessions.get(provider)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings['pool_size'])
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _sessions[provider] = session
+        return session
+
+
+def build_request(provider, model, prompt, api_key, system=None, json_mode=False,
+                  temperature=0.3, max_tokens=4096, stream=False):
+    """(url, headers, payload) for one completion request"""
+    if provider == 'gemini':
+        payload = {
+            "contents": [{"parts": [{"text": prompt}]}],
+            "generationConfig": {
+                "temperature": temperature,
+                "topK": 40,
+                "topP": 0.95,
+                "maxOutputTokens": max_tokens,
+            }
+        }
+        if system:
+            payload["systemInstruction"] = {"parts": [{"text": system}]}
+        return (endpoint('gemini', model, stream),
+                {'Content-Type': 'application/json', 'x-goog-api-key': api_key}, payload)
+
+    headers = {'Authorization': f'Bearer {api_key}', 'Content-Type': 'application/json'}
+    if provider == 'openrouter':
+        headers.update({'HTTP-Referer': 'https://netguard-pro.local', 'X-Title': 'NetGuard Pro AI Analysis'})
+    messages = [{"role": "system", "content": system}] if system else []
+    payload = {
+        "model": model,
+        "messages": messages + [{"role": "user", "content": prompt}],
+        "temperature": temperature,
+        "max_tokens": max_tokens
+    }
+    if json_mode:
+        payload["response_format"] = {"type": "json_object"}
+    if stream:
+        payload["stream"] = True
+    return endpoint(provider, model, stream), headers, payload
+
+
+def response_text(provider, result):
+    if provider == 'gemini':
+        return result['candidates'][0]['content']['parts'][0]['text']
+    return result['choices'][0]['message']['content']
+
+
+def stream_text(provider, response):
+    """Text pieces of a server-sent-events completion as they arrive"""
+    for line in response.iter_lines(chunk_size=None):
+        line = line.decode('utf-8')
+        if not line.startswith('data:'):
+            continue  # event separators and ": keep-alive" comments
+        data = line[5:].strip()
+        if data == '[DONE]':
+            return
+        event = json.loads(data)
+        if 'error' in event:
+            raise ValueError(f"error event: {event['error']}")
+        if provider == 'gemini':
+            parts = (event.get('candidates') or [{}])[0].get('content', {}).get('parts', [])
+            yield ''.join(part.get('text', '') for part in parts)
+        else:
+            yield ((event.get('choices') or [{}])[0].get('delta') or {}).get('content') or ''
+
+
+def backoff_delay(attempt, response=None):
+    """Retry-After when the provider sends one, else jittered exponential backoff"""
+    retry_after = response.headers.get('Retry-After') if response is not None else None
+    if retry_after and retry_after.isdigit():
+        return min(int(retry_after), settings['backoff_max_seconds'])
+    delay = min(settings['backoff_max_seconds'], settings['backoff_base_seconds'] * 2 ** attempt)
+    return random.uniform(0, delay)
+
+
+class _Abandoned(Exception):
+    """Another provider won, or the deadline passed, while a response was being read"""
+
+
+def _request(provider, model, url, headers, payload, read, cancel=None, deadline=None, stream=False):
+    """read(response) of the first 200 response, with retries and breaker bookkeeping; None on failure"""
+    health = model_health()
+    if not health.available(provider, model):
+        logging.info(f"⏭️  Skipping {provider}/{model} (circuit open)")
+        return None
+
+    session = get_session(provider)
+    error = None
+    for attempt in range(settings['max_retries'] + 1):
+        timeout = request_timeout(deadline)
+        if (cancel is not None and cancel.is_set()) or timeout <= 0:
+            return None  # abandoned, not a model failure
+        response = None
+        try:
+            response = session.post(url, headers=headers, json=payload, timeout=timeout, stream=stream)
+            if response.status_code == 200:
+                result = read(response)
+                health.record(provider, model, True)
+                return result
+            error = f"HTTP {response.status_code} - {response.text[:200]}"
+            if response.status_code in HARD_FAILURE_STATUS:
+                health.record(provider, model, False, error, hard=True)
+                logging.warning(f"{provider} model {model} failed: {error}")
+                return None
+            if response.status_code not in RETRY_STATUS:
+                break
+        except _Abandoned:
+            return None
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            if isinstance(e, requests.Timeout) and request_timeout(deadline) <= 0:
+                return None  # cut short by the deadline, like a cancel: not a model failure
+            error = e
+        except (KeyError, IndexError, ValueError) as e:
+            error = f"malformed response: {e}"
+            break
+        finally:
+            if response is not None:
+                response.close()
+
+        if attempt < settings['max_retries']:
+            delay = backoff_delay(attempt, response)
+            if request_timeout(deadline) <= delay:
+                break
+            logging.info(f"Retrying {provider}/{model} in {delay:.1f}s ({error})")
+            if cancel is not None:
+                if cancel.wait(delay):
+                    return None
+            else:
+                time.sleep(delay)
+
+    health.record(provider, model, False, error)
+    logging.warning(f"{provider} model {model} failed: {error}")
+    return None
+
+
+def complete(provider, model, prompt, api_key, system=None, json_mode=False,
+             temperature=0.3, max_tokens=4096, cancel=None, deadline=None):
+    """Response text for one prompt, or None if the model is skipped or fails"""
+    url, headers, payload = build_request(provider, model, prompt, api_key, system, json_mode,
+                                          temperature, max_tokens)
+    return _request(provider, model, url, headers, payload,
+                    lambda response: response_text(provider, response.json()), cancel, deadline)
+
+
+def complete_json(provider, model, prompt, api_key, required=(), system=None, json_mode=False,
+                  temperature=0.3, max_tokens=4096, cancel=None, deadline=None):
+    """First JSON object with the required fields in the response, or None
+
+    The completion is streamed through a JsonObjectScanner and the
+    connection closed as soon as a valid object is complete, so reasoning
+    preambles are skipped as they arrive and trailing text is never waited
+    for. JSON-mode requests are read whole: Groq doesn't stream them
+    """
+    stream = settings['stream'] and not json_mode
+    url, headers, payload = build_request(provider, model, prompt, api_key, system, json_mode,
+                                          temperature, max_tokens, stream)
+
+    def read(response):
+        scanner = JsonObjectScanner(required)
+        if not stream:
+            scanner.feed(response_text(provider, response.json()))
+        else:
+            for piece in stream_text(provider, response):
+                if scanner.feed(piece) is not None:
+                    logging.info(f"{provider}/{model}: analysis complete after {scanner.length:,} chars, "
+                                 f"closing the stream")
+                    return scanner.result
+                if (cancel is not None and cancel.is_set()) or request_timeout(deadline) <= 0:
+                    raise _Abandoned()
+        analysis = scanner.finish()
+        if analysis is None:
+            logging.warning(f"No JSON analysis in {provider}/{model} response ({scanner.length:,} chars)")
+        return analysis
+
+    return _request(provider, model, url, headers, payload, read, cancel, deadline, stream)
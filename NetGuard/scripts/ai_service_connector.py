@@ -9,12 +9,16 @@ Fallbacks: Groq, OpenRouter (DeepSeek, Qwen, etc.)
 import json
 import sqlite3
 import logging
-import re
 from datetime import datetime
+from ai_providers import complete_json, configure as configure_ai_client
+from json_stream import CONNECTOR_ANALYSIS_FIELDS
 from ai_data_exporter import export_to_ai_format
+from snapshots import snapshot_section
 
 DB_PATH = "/home/jarvis/NetGuard/network.db"
 
+ANALYST_SYSTEM_PROMPT = "You are an expert network security analyst. Analyze network traffic and identify threats. Always respond with valid JSON only."
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s'
@@ -29,6 +33,7 @@ class MultiAIAnalyzer:
     
     def __init__(self, config):
         self.config = config
+        configure_ai_client(config)
         self.models = self._load_model_configs()
         
     def _load_model_configs(self):
@@ -162,103 +167,18 @@ class MultiAIAnalyzer:
     
     def _call_gemini(self, data, config, api_key):
         """Call Google Gemini API"""
-        try:
-            import google.generativeai as genai
-        except ImportError:
-            logging.error("google-generativeai not installed. Run: pip install google-generativeai")
-            return None
-        
-        try:
-            genai.configure(api_key=api_key)
-            model = genai.GenerativeModel(config['model'])
-            
-            prompt = self._build_prompt(data)
-            
-            response = model.generate_content(
-                prompt,
-                generation_config={
-                    'temperature': 0.3,
-                    'max_output_tokens': 4096,
-                }
-            )
-            
-            return self._parse_json_response(response.text)
-            
-        except Exception as e:
-            logging.error(f"Gemini error: {e}")
-            return None
+        return complete_json('gemini', config['model'], self._build_prompt(data), api_key,
+                             CONNECTOR_ANALYSIS_FIELDS)
     
     def _call_groq(self, data, config, api_key):
         """Call Groq API (Llama, Kimi, etc.)"""
-        try:
-            from groq import Groq
-        except ImportError:
-            logging.error("groq not installed. Run: pip install groq")
-            return None
-        
-        try:
-            client = Groq(api_key=api_key)
-            
-            response = client.chat.completions.create(
-                model=config['model'],
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an expert network security analyst. Analyze network traffic and identify threats. Always respond with valid JSON only."
-                    },
-                    {
-                        "role": "user",
-                        "content": self._build_prompt(data)
-                    }
-                ],
-                temperature=0.3,
-                max_tokens=4096,
-                response_format={"type": "json_object"}
-            )
-            
-            json_text = response.choices[0].message.content
-            return self._parse_json_response(json_text)
-            
-        except Exception as e:
-            logging.error(f"Groq error: {e}")
-            return None
+        return complete_json('groq', config['model'], self._build_prompt(data), api_key,
+                             CONNECTOR_ANALYSIS_FIELDS, system=ANALYST_SYSTEM_PROMPT, json_mode=True)
     
     def _call_openrouter(self, data, config, api_key):
         """Call OpenRouter API (DeepSeek, Qwen, etc.)"""
-        try:
-            from openai import OpenAI
-        except ImportError:
-            logging.error("openai not installed. Run: pip install openai")
-            return None
-        
-        try:
-            client = OpenAI(
-                base_url="https://openrouter.ai/api/v1",
-                api_key=api_key
-            )
-            
-            response = client.chat.completions.create(
-                model=config['model'],
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an expert network security analyst. Analyze network traffic and identify threats. Always respond with valid JSON only."
-                    },
-                    {
-                        "role": "user",
-                        "content": self._build_prompt(data)
-                    }
-                ],
-                temperature=0.3,
-                max_tokens=4096
-            )
-            
-            json_text = response.choices[0].message.content
-            return self._parse_json_response(json_text)
-            
-        except Exception as e:
-            logging.error(f"OpenRouter error: {e}")
-            return None
+        return complete_json('openrouter', config['model'], self._build_prompt(data), api_key,
+                             CONNECTOR_ANALYSIS_FIELDS, system=ANALYST_SYSTEM_PROMPT)
     
     def _build_prompt(self, network_data):
         """Build analysis prompt for AI"""
@@ -296,6 +216,8 @@ class MultiAIAnalyzer:
    - Unusual protocols
    - Off-hours activity
    - Suspicious port usage
+   - Deviations from each device's learned baseline (devices[].baseline: z-scores of
+     today's bytes and this hour's connections, unusual_hour)
 
 3. **URL/Domain Analysis:**
    - Phishing domains
@@ -398,26 +320,7 @@ IMPORTANT: Return ONLY the JSON object. No markdown formatting, no explanations,
 """
         
         return prompt
-    
-    def _parse_json_response(self, text):
-        """Parse JSON from AI response (handles markdown code blocks)"""
-        
-        # Remove markdown code blocks if present
-        text = text.strip()
-        
-        # Remove ```json and ``` markers
-        if text.startswith('```'):
-            text = re.sub(r'^```(?:json)?\s*\n', '', text)
-            text = re.sub(r'\n```\s*$', '', text)
-        
-        # Try to parse JSON
-        try:
-            result = json.loads(text)
-            return result
-        except json.JSONDecodeError as e:
-            logging.error(f"Failed to parse JSON response: {e}")
-            logging.debug(f"Response text: {text[:500]}...")
-            return None
+
 
 
 def get_ai_config():
@@ -530,10 +433,14 @@ def store_ai_predictions(ai_response):
         for anomaly in ai_response.get('device_anomalies', []):
             device_ip = anomaly.get('device_ip')
             if device_ip:
+                # Upsert: REPLACE would delete the row and the streaming baseline with it
                 cursor.execute("""
-                    INSERT OR REPLACE INTO device_profiles (
+                    INSERT INTO device_profiles (
                         device_ip, device_name, last_updated
                     ) VALUES (?, ?, ?)
+                    ON CONFLICT(device_ip) DO UPDATE SET
+                        device_name = excluded.device_name,
+                        last_updated = excluded.last_updated
                 """, (
                     device_ip,
                     anomaly.get('device_name', 'Unknown'),
@@ -589,9 +496,12 @@ def analyze_network():
         logging.info("Enable with: UPDATE ai_config SET value='1' WHERE key='ai_enabled';")
         return False
     
-    # Export network data
-    logging.info("Step 1: Exporting network data...")
-    network_data = export_to_ai_format(time_window_minutes=5)
+    # Network data from the shared aggregation snapshot; export directly only if none is fresh
+    logging.info("Step 1: Loading the latest aggregation snapshot...")
+    network_data = snapshot_section('export')
+    if network_data is None:
+        logging.info("No fresh snapshot, exporting network data...")
+        network_data = export_to_ai_format(time_window_minutes=5)
     
     if not network_data:
         logging.warning("No data to analyze")
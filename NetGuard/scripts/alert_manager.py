@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+NetGuard Pro - Alert Manager
+In-memory index of active alerts keyed by (type, source, dest) that coalesces
+recurrences and persists new alerts and recurrence deltas in one transaction
+per flush interval
+"""
+
+import json
+import uuid
+import sqlite3
+import logging
+import time
+from datetime import datetime
+
+from storm_control import StormControl
+from notifier import enqueue_notifications
+
+FLUSH_INTERVAL = 5  # seconds between batched writes
+DEDUP_WINDOW = 3600  # recurrences within an hour of creation fold into one alert
+# What a recurrence must share with the active alert besides its type
+DEDUP_FLOW = 'flow'  # source and destination
+DEDUP_SOURCE = 'source'  # source only: per-source aggregates whose destinations vary
+# Summary alerts are keyed by scope (a source or a subnet label, which isn't a
+# source_ip), so it is kept as a threat indicator for load() to restore
+SCOPE_INDICATOR = 'suppressed scope: '
+
+
+def new_alert_id(alert_type):
+    """Readable, collision-free alert ID"""
+    return f"ALERT-{datetime.now().strftime('%Y%m%d%H%M%S')}-{alert_type[:4].upper()}-{uuid.uuid4().hex[:8]}"
+
+
+def summary_scope(threat_indicators):
+    """Scope a summary alert was keyed by ('' for unknown sources), or None if not recorded"""
+    try:
+        indicators = json.loads(threat_indicators) if threat_indicators else []
+    except ValueError:
+        return None
+    for indicator in indicators if isinstance(indicators, list) else []:
+        if isinstance(indicator, str) and indicator.startswith(SCOPE_INDICATOR):
+            return indicator[len(SCOPE_INDICATOR):]
+    return None
+
+
+class ActiveAlert:
+    """Index entry for one active alert"""
+
+    __slots__ = ('alert_id', 'created', 'row', 'recurrences', 'suppressed', 'title')
+
+    def __init__(self, alert_id, created, row=None):
+        self.alert_id = alert_id
+        self.created = created
+        self.row = row  # insert values while not yet persisted
+        self.recurrences = 0  # recurrences not yet persisted
+        self.suppressed = 0  # summary alerts: detections rolled up so far
+        self.title = None  # summary alerts: retitle pending for the persisted row
+
+
+class AlertManager:
+    """Deduplicates alerts in memory and batches their persistence"""
+
+    def __init__(self, db_path, flush_interval=FLUSH_INTERVAL, dedup_window=DEDUP_WINDOW,
+                 storm_control=None, notify_sinks=None):
+        self.db_path = db_path
+        self.notify_sinks = notify_sinks or []
+        self.flush_interval = flush_interval
+        self.dedup_window = dedup_window
+        self.storm = StormControl(storm_control)
+        self.pending_counters = []
+        self.active = {}
+        self.last_flush = time.time()
+        self.load()
+
+    def load(self):
+        """Index active alerts still inside the dedup window"""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            rows = conn.execute("""
+                SELECT alert_id, alert_type, source_ip, dest_ip, CAST(strftime('%s', created_at) AS REAL),
+                       threat_indicators, recurrence_count
+                FROM security_alerts
+                WHERE status = 'active' AND created_at > datetime('now', ?)
+            """, (f'-{self.dedup_window} seconds',)).fetchall()
+            conn.close()
+        except sqlite3.Error as e:
+            logging.error(f"Error loading active alerts: {e}")
+            return
+        for alert_id, alert_type, source_ip, dest_ip, created, indicators, recurrence_count in rows:
+            scope = summary_scope(indicators) if alert_type.endswith('_suppressed') else None
+            if scope is None:
+                self.active[(alert_type, source_ip, dest_ip)] = ActiveAlert(alert_id, created or time.time())
+            else:
+                entry = self.active[(alert_type, scope or None, None)] = ActiveAlert(alert_id, created or time.time())
+                entry.suppressed = recurrence_count or 0
+
+    def submit(self, severity, alert_type, title, description, source_ip=None, dest_ip=None,
+               affected_devices=None, threat_indicators=None, remediation_steps=None,
+               auto_remediation_cmd=None, dedup_scope=DEDUP_FLOW):
+        """Record a detection; returns (alert_id, is_new), alert_id None if suppressed"""
+        now = time.time()
+        if dedup_scope == DEDUP_SOURCE:
+            dest_ip = None  # stored as keyed, so load() rebuilds the same key
+        key = (alert_type, source_ip, dest_ip)
+        entry = self.active.get(key)
+
+        if entry and now - entry.created < self.dedup_window:
+            entry.recurrences += 1
+            is_new = False
+        elif not self.storm.admit(alert_type, source_ip, severity):
+            return None, False
+        else:
+            if entry and (entry.row or entry.recurrences):
+                self.flush()  # persist the expired alert's pending counts first
+            entry = self.active[key] = ActiveAlert(new_alert_id(alert_type), now, (
+                severity, alert_type, title, description, source_ip, dest_ip,
+                json.dumps(affected_devices) if affected_devices else None,
+                json.dumps(threat_indicators) if threat_indicators else None,
+                json.dumps(remediation_steps) if remediation_steps else None,
+                1 if auto_remediation_cmd else 0,
+                auto_remediation_cmd
+            ))
+            is_new = True
+
+        self.flush_if_due()
+        return entry.alert_id, is_new
+
+    def flush_if_due(self):
+        if time.time() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def forget(self, alert_id):
+        """Drop an alert from the index (resolved, false positive)"""
+        for key, entry in list(self.active.items()):
+            if entry.alert_id == alert_id:
+                del self.active[key]
+
+    def roll_up(self):
+        """Fold suppressed counts into summary alerts and the pending counter rows"""
+        now = time.time()
+        for (alert_type, scope, is_subnet), (count, severity, first, last) in self.storm.drain().items():
+            self.pending_counters.append((alert_type, scope or '', count, first, last))
+            summary_type = f"{alert_type}_suppressed"
+            key = (summary_type, scope, None)
+            entry = self.active.get(key)
+            title = f"more {alert_type} alerts from {scope or 'unknown source'} suppressed"
+            source_ip = None if is_subnet else scope
+
+            if entry and now - entry.created < self.dedup_window:
+                entry.suppressed += count
+                entry.recurrences += count
+                if entry.row:
+                    entry.row = entry.row[:2] + (f"{entry.suppressed} {title}",) + entry.row[3:]
+                else:
+                    entry.title = f"{entry.suppressed} {title}"
+            else:
+                entry = self.active[key] = ActiveAlert(new_alert_id(summary_type), now, (
+                    severity, summary_type, f"{count} {title}",
+                    f"Alert storm control rate-limited new {alert_type} alerts; "
+                    f"further detections are counted here instead",
+                    source_ip, None, None, json.dumps([f"{SCOPE_INDICATOR}{scope or ''}"]), None, 0, None
+                ))
+                entry.suppressed = count
+                entry.recurrences = count - 1  # the insert itself counts once
+
+    def flush(self):
+        """Persist new alerts and recurrence deltas in one transaction"""
+        self.last_flush = time.time()
+        self.roll_up()
+        counters = self.pending_counters
+        new = [entry for entry in self.active.values() if entry.row]
+        recurring = [entry for entry in self.active.values() if entry.recurrences and not entry.row]
+
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+
+            cursor.executemany("""
+                INSERT INTO security_alerts (
+                    alert_id, severity, alert_type, title, description,
+                    source_ip, dest_ip, affected_devices, threat_indicators,
+                    remediation_steps, auto_remediation_available,
+                    auto_remediation_command, recurrence_count
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, [(e.alert_id,) + e.row + (1 + e.recurrences,) for e in new])
+            cursor.executemany("""
+                INSERT INTO alert_history (alert_id, action, action_by, notes)
+                VALUES (?, 'created', 'system', ?)
+            """, [(e.alert_id, f"Alert created: {e.row[2]}") for e in new])
+            if self.notify_sinks:
+                # Queued in the same transaction; delivery happens in the dispatcher
+                enqueue_notifications(cursor, self.notify_sinks, [{
+                    'alert_id': e.alert_id, 'severity': e.row[0], 'alert_type': e.row[1],
+                    'title': e.row[2], 'description': e.row[3],
+                    'source_ip': e.row[4], 'dest_ip': e.row[5],
+                    'created_at': datetime.fromtimestamp(e.created).isoformat(),
+                } for e in new])
+
+            cursor.executemany("""
+                UPDATE security_alerts
+                SET recurrence_count = recurrence_count + ?,
+                    title = COALESCE(?, title),
+                    last_seen = CURRENT_TIMESTAMP,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE alert_id = ?
+            """, [(e.recurrences, e.title, e.alert_id) for e in recurring])
+            cursor.executemany("""
+                INSERT INTO alert_suppression
+                (alert_type, source_ip, suppressed_count, first_suppressed, last_suppressed)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(alert_type, source_ip) DO UPDATE SET
+                    suppressed_count = suppressed_count + excluded.suppressed_count,
+                    last_suppressed = excluded.last_suppressed
+            """, counters)
+
+            # Resolutions from the dashboard happen in other processes
+            closed = set()
+            ids = [entry.alert_id for entry in self.active.values()]
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                cursor.execute(f"""
+                    SELECT alert_id FROM security_alerts
+                    WHERE alert_id IN ({','.join('?' * len(chunk))}) AND status != 'active'
+                """, chunk)
+                closed.update(row[0] for row in cursor.fetchall())
+
+            conn.commit()
+            conn.close()
+        except sqlite3.Error as e:
+            # Pending rows, deltas and counters stay in memory for the next flush
+            logging.error(f"Error flushing alerts: {e}")
+            return 0
+
+        self.pending_counters = []
+        for entry in new:
+            entry.row = None
+            entry.recurrences = 0
+        for entry in recurring:
+            entry.recurrences = 0
+            entry.title = None
+
+        now = time.time()
+        self.active = {key: entry for key, entry in self.active.items()
+                       if entry.alert_id not in closed and now - entry.created < self.dedup_window}
+
+        if new or recurring:
+            logging.info(f"✓ Flushed {len(new)} new alerts, {len(recurring)} recurrence updates")
+        return len(new) + len(recurring)
@@ -11,6 +11,7 @@ import logging
 import time
 import re
 from datetime import datetime
+from time_window import window_index
 
 # Configuration
 INTERFACE = "eno1"  # Changed to Ethernet for better flow analysis
@@ -57,6 +58,7 @@ def create_table(conn, table_name):
     );
     """
     cursor.execute(sql)
+    window_index(cursor, table_name)
     conn.commit()
 
 def capture_and_analyze():
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+NetGuard Pro - Per-Batch Traffic Summaries
+Counters and suspicious-activity findings computed once when a capture table
+is ingested, so the analysis page reads small summary rows instead of
+re-scanning every packet table on each request
+"""
+
+import sqlite3
+import logging
+from datetime import datetime
+
+# (dimension, per-batch query returning (key, count)); limits match what the
+# page showed per table before
+COUNTER_QUERIES = [
+    ('protocol', "SELECT protocol, COUNT(*) FROM {table} WHERE protocol IS NOT NULL AND protocol != '' GROUP BY protocol"),
+    ('src_ip', "SELECT src_ip, COUNT(*) AS cnt FROM {table} WHERE src_ip IS NOT NULL AND src_ip != '' GROUP BY src_ip ORDER BY cnt DESC LIMIT 10"),
+    ('dest_ip', "SELECT dest_ip, COUNT(*) AS cnt FROM {table} WHERE dest_ip IS NOT NULL AND dest_ip != '' GROUP BY dest_ip ORDER BY cnt DESC LIMIT 10"),
+    ('dest_port', "SELECT dest_port, COUNT(*) AS cnt FROM {table} WHERE dest_port IS NOT NULL GROUP BY dest_port ORDER BY cnt DESC LIMIT 15"),
+    ('http_host', "SELECT http_host, COUNT(*) AS cnt FROM {table} WHERE http_host IS NOT NULL AND http_host != '' GROUP BY http_host ORDER BY cnt DESC LIMIT 10"),
+    ('dns_query', "SELECT dns_query, COUNT(*) AS cnt FROM {table} WHERE dns_query IS NOT NULL AND dns_query != '' GROUP BY dns_query ORDER BY cnt DESC LIMIT 10"),
+    ('tls_server', "SELECT tls_server_name, COUNT(*) AS cnt FROM {table} WHERE tls_server_name IS NOT NULL AND tls_server_name != '' GROUP BY tls_server_name ORDER BY cnt DESC LIMIT 10"),
+    ('country', "SELECT dest_country, COUNT(*) FROM {table} WHERE dest_country IS NOT NULL GROUP BY dest_country"),
+]
+
+
+def init_summary_tables(cursor):
+    """Create the batch registry, finding and counter tables if missing"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS packet_batches (
+            batch_table TEXT PRIMARY KEY,
+            interval_start TEXT,
+            interval_end TEXT,
+            packets INTEGER DEFAULT 0,
+            summarized_at TEXT
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS packet_batch_findings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            batch_table TEXT NOT NULL,
+            interval_start TEXT,
+            finding_type TEXT NOT NULL,
+            detail TEXT,
+            severity TEXT,
+            value INTEGER
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_packet_batch_findings_interval ON packet_batch_findings(interval_start)")
+    # Running totals per dimension; `key` is untyped so ports stay integers
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS packet_counter_totals (
+            dimension TEXT NOT NULL,
+            key NOT NULL,
+            count INTEGER DEFAULT 0,
+            PRIMARY KEY (dimension, key)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_packet_counter_totals_rank ON packet_counter_totals(dimension, count DESC)")
+
+
+def batch_findings(cursor, table):
+    """Suspicious-activity detectors over one batch table: [(type, detail, severity, value)]"""
+    findings = []
+
+    # Multiple external sources connecting to the same high port here = backdoor
+    cursor.execute(f"SELECT dest_port, COUNT(DISTINCT src_ip) AS unique_sources, COUNT(*) AS total FROM {table} WHERE dest_port > 50000 AND src_ip NOT LIKE '192.168.%' GROUP BY dest_port HAVING unique_sources > 3")
+    for port, sources, total in cursor.fetchall():
+        findings.append(('Potential Backdoor Detected',
+                         f'Port {port}: {sources} different external IPs connecting ({total} total connections)',
+                         'high', sources))
+
+    # Outbound SYN to many different ports
+    cursor.execute(f"SELECT src_ip, COUNT(DISTINCT dest_port) AS unique_ports, COUNT(*) AS total FROM {table} WHERE tcp_syn = 1 AND tcp_ack = 0 AND dest_ip NOT LIKE '192.168.%' GROUP BY src_ip HAVING unique_ports > 20")
+    for src_ip, ports, total in cursor.fetchall():
+        findings.append(('Port Scan Detected',
+                         f'Source {src_ip} scanning {ports} different ports ({total} SYN attempts)',
+                         'high', ports))
+
+    # Connection resets (potential attacks or blocked connections)
+    cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE tcp_rst = 1")
+    rst_count = cursor.fetchone()[0]
+    if rst_count > 100:
+        findings.append(('High RST Packet Count', f'{rst_count} connection resets detected', 'medium', rst_count))
+
+    # Suspicious countries (customize based on your threat model)
+    cursor.execute(f"SELECT dest_country, COUNT(*) AS cnt FROM {table} WHERE dest_country IS NOT NULL AND dest_country NOT IN ('US', 'Local') GROUP BY dest_country HAVING cnt > 20")
+    for country, count in cursor.fetchall():
+        findings.append(('Foreign Traffic Pattern', f'High volume to {country}: {count} connections', 'medium', count))
+
+    # Low TTL values (potential IP spoofing)
+    cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE ip_ttl < 32 AND ip_ttl > 0")
+    low_ttl = cursor.fetchone()[0]
+    if low_ttl > 10:
+        findings.append(('IP Spoofing Suspected', f'{low_ttl} packets with abnormally low TTL (<32)', 'high', low_ttl))
+
+    return findings
+
+
+def batch_counters(cursor, table):
+    """[(dimension, key, count)] for one batch table"""
+    counters = []
+    for dimension, query in COUNTER_QUERIES:
+        cursor.execute(query.format(table=table))
+        counters.extend((dimension, key, count) for key, count in cursor.fetchall())
+
+    cursor.execute(f"""
+        SELECT SUM(length <= 100), SUM(length > 100 AND length <= 500), SUM(length > 500),
+               SUM(tcp_syn), SUM(tcp_ack), SUM(tcp_fin), SUM(tcp_rst)
+        FROM {table}
+    """)
+    row = cursor.fetchone()
+    for key, count in zip(('small', 'medium', 'large'), row[:3]):
+        counters.append(('packet_size', key, count or 0))
+    for key, count in zip(('SYN', 'ACK', 'FIN', 'RST'), row[3:]):
+        counters.append(('tcp_flag', key, count or 0))
+    return counters
+
+
+def summarize_batch(conn, table):
+    """Record one ingested batch table's counters and findings (once per table)"""
+    cursor = conn.cursor()
+    init_summary_tables(cursor)
+    cursor.execute("SELECT 1 FROM packet_batches WHERE batch_table = ?", (table,))
+    if cursor.fetchone():
+        return False
+
+    cursor.execute(f"SELECT MIN(timestamp), MAX(timestamp), COUNT(*) FROM {table}")
+    interval_start, interval_end, packets = cursor.fetchone()
+    findings = batch_findings(cursor, table)
+    counters = batch_counters(cursor, table)
+
+    cursor.execute("""
+        INSERT INTO packet_batches (batch_table, interval_start, interval_end, packets, summarized_at)
+        VALUES (?, ?, ?, ?, ?)
+    """, (table, interval_start, interval_end, packets, datetime.now().isoformat()))
+    cursor.executemany("""
+        INSERT INTO packet_batch_findings (batch_table, interval_start, finding_type, detail, severity, value)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, [(table, interval_start) + finding for finding in findings])
+    cursor.executemany("""
+        INSERT INTO packet_counter_totals (dimension, key, count) VALUES (?, ?, ?)
+        ON CONFLICT(dimension, key) DO UPDATE SET count = count + excluded.count
+    """, [counter for counter in counters if counter[2]])
+    conn.commit()
+    return True
+
+
+def summarize_missing(conn, prefix):
+    """Backfill summaries for batch tables ingested before summaries existed"""
+    cursor = conn.cursor()
+    init_summary_tables(cursor)
+    cursor.execute("""
+        SELECT name FROM sqlite_master
+        WHERE type='table' AND name LIKE ? AND name NOT LIKE '%_template'
+        AND name NOT IN (SELECT batch_table FROM packet_batches)
+        ORDER BY name
+    """, (prefix + '%',))
+    tables = [row[0] for row in cursor.fetchall()]
+    for table in tables:
+        try:
+            summarize_batch(conn, table)
+        except sqlite3.Error as e:
+            logging.error(f"Error summarizing {table}: {e}")
+    if tables:
+        logging.info(f"✓ Summarized {len(tables)} earlier {prefix.rstrip('_')} batches")
+    return len(tables)
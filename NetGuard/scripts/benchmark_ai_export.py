@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+NetGuard Pro - AI Export Aggregation Benchmark
+Fills a scratch database with synthetic tcpdump packets inside the current
+window and times ai_data_exporter.aggregate_tcpdump_data (grouped SQL)
+against the previous approach: SELECT * rows as dicts reduced in Python
+"""
+
+import os
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import ai_data_exporter
+from tcpdump_collector import create_table_if_not_exists
+
+PROTOCOLS = ['TCP', 'UDP', 'DNS', 'TLS', 'HTTP', 'ICMP', 'ARP']
+
+
+def build_database(path, rows, devices=200, seed=7):
+    """One tcpdump table with `rows` packets spread over the last 4 minutes"""
+    rng = random.Random(seed)
+    table = f"tcpdump_{(datetime.now() - timedelta(minutes=4)).strftime('%Y%m%d_%H%M%S')}"
+    now = datetime.utcnow()
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    create_table_if_not_exists(conn, table)
+    local = [f"192.168.1.{i % 254 + 1}" if i < 254 else f"192.168.2.{i % 254 + 1}" for i in range(devices)]
+    remote = [f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+              for _ in range(devices * 5)]
+
+    def packets():
+        for i in range(rows):
+            outbound = rng.random() < 0.6
+            src, dst = (rng.choice(local), rng.choice(remote)) if outbound else (rng.choice(remote), rng.choice(local))
+            created = (now - timedelta(seconds=rng.uniform(1, 230))).strftime('%Y-%m-%d %H:%M:%S')
+            yield (created, created, rng.randint(60, 1514), src, dst, rng.choice(PROTOCOLS),
+                   rng.randint(1024, 65535), rng.choice((53, 80, 443, 8080, rng.randint(1, 65535))))
+
+    conn.executemany(f"""
+        INSERT INTO {table} (timestamp, created_at, frame_length, src_ip, dest_ip, protocol, src_port, dest_port)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, packets())
+    conn.commit()
+    conn.close()
+    return table
+
+
+def python_reducer(path, window):
+    """The previous aggregation: every row as a dict, reduced with defaultdicts"""
+    conn = sqlite3.connect(path)
+    packets = window.recent(conn, 'tcpdump', 10 ** 12)
+    conn.close()
+
+    protocols = defaultdict(int)
+    for p in packets:
+        if p.get('protocol'):
+            protocols[p['protocol']] += 1
+    src_ips = set(p.get('src_ip') for p in packets if p.get('src_ip'))
+    dst_ips = set(p.get('dest_ip') for p in packets if p.get('dest_ip'))
+    device_activity = defaultdict(lambda: {'packets_sent': 0, 'packets_received': 0, 'bytes_sent': 0,
+                                           'bytes_received': 0, 'destinations': set()})
+    for p in packets:
+        src, dst, length = p.get('src_ip'), p.get('dest_ip'), p.get('frame_length', 0) or 0
+        if src and src.startswith('192.168.'):
+            device_activity[src]['packets_sent'] += 1
+            device_activity[src]['bytes_sent'] += length
+            if dst:
+                device_activity[src]['destinations'].add(dst)
+        if dst and dst.startswith('192.168.'):
+            device_activity[dst]['packets_received'] += 1
+            device_activity[dst]['bytes_received'] += length
+    high_ports = [p.get('dest_port') for p in packets if p.get('dest_port') and p.get('dest_port') > 50000]
+    return {
+        'total_packets': len(packets),
+        'total_bytes': sum(p.get('frame_length', 0) or 0 for p in packets),
+        'unique_src_ips': len(src_ips),
+        'unique_dst_ips': len(dst_ips),
+        'protocols': dict(protocols),
+        'devices': {ip: (s['packets_sent'], s['packets_received'], s['bytes_sent'], s['bytes_received'],
+                         len(s['destinations'])) for ip, s in device_activity.items()},
+        'total_high_port_access': len(high_ports),
+    }
+
+
+def timed(label, func, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"  {label:<28} {best:8.2f}s (best of {repeat})")
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--skip-python', action='store_true', help="time only the SQL aggregation")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='netguard-bench-')
+    path = os.path.join(workdir, 'network.db')
+    print(f"Building {args.rows:,} packets in {path} ...")
+    started = time.perf_counter()
+    build_database(path, args.rows)
+    print(f"  built in {time.perf_counter() - started:.1f}s")
+
+    ai_data_exporter.DB_PATH = path
+    window = ai_data_exporter.get_time_window_data(5)
+    print("Aggregating the 5-minute window:")
+    sql, sql_time = timed('grouped SQL', lambda: ai_data_exporter.aggregate_tcpdump_data(window=window),
+                          args.repeat)
+    print(f"  {sql['total_packets']:,} packets, {len(sql['devices'])} devices, "
+          f"{sql['port_activity']['total_high_port_access']:,} high-port packets")
+
+    if not args.skip_python:
+        reference, python_time = timed('rows + Python reducer', lambda: python_reducer(path, window), 1)
+        devices = {d['ip']: (d['packets_sent'], d['packets_received'], d['bytes_sent'], d['bytes_received'],
+                             d['unique_destinations']) for d in sql['devices']}
+        protocols = {p: round(n / reference['total_packets'] * 100, 1) for p, n in reference['protocols'].items()}
+        assert (sql['total_packets'], sql['total_bytes'], sql['unique_src_ips'], sql['unique_dst_ips']) == (
+            reference['total_packets'], reference['total_bytes'],
+            reference['unique_src_ips'], reference['unique_dst_ips']), "totals differ"
+        assert sql['protocol_distribution'] == protocols, "protocol distribution differs"
+        assert devices == reference['devices'], "device activity differs"
+        assert sql['port_activity']['total_high_port_access'] == reference['total_high_port_access'], \
+            "high port count differs"
+        print(f"  results match; SQL is {python_time / sql_time:.1f}x faster")
+
+    os.remove(path)
+    for suffix in ('-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    os.rmdir(workdir)
+
+
+if __name__ == "__main__":
+    main()
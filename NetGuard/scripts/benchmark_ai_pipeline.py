@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+NetGuard Pro - AI Pipeline Benchmark
+Runs the aggregator's hedged provider calls against the local mock LLM server
+under named scenarios (slow primary, 429s/5xx, malformed output, long
+reasoning output, outage) and reports analysis-cycle latency, which provider
+won and how failures were handled
+"""
+
+import os
+import time
+import logging
+import argparse
+import tempfile
+from functools import partial
+
+import ai_providers
+import ai_5min_aggregator as aggregator
+from ai_hedging import hedged_call, ProviderStats
+from mock_llm_server import MockProviderServer
+
+
+def latency(median, sigma=0.3):
+    return {'distribution': 'lognormal', 'median_seconds': median, 'sigma': sigma}
+
+
+SCENARIOS = {
+    'healthy': {'default': {'latency': latency(0.5)}},
+    'slow_primary': {'default': {'latency': latency(0.5)},
+                     'gemini': {'latency': {'distribution': 'uniform', 'min_seconds': 3, 'max_seconds': 6}}},
+    'flaky': {'default': {'latency': latency(0.5), 'error_rate': 0.2, 'rate_limit_rate': 0.2}},
+    'bad_output': {'default': {'latency': latency(0.5), 'malformed_rate': 0.2, 'unparseable_rate': 0.2,
+                               'preamble_chars': 2000}},
+    'reasoning': {'default': {'latency': latency(3), 'preamble_chars': 4000, 'trailing_chars': 3000}},
+    'outage': {'default': {'latency': latency(0.5)}, 'gemini': {'error_rate': 1.0, 'latency': latency(0.2)}},
+}
+
+AI_MODELS = {
+    'primary': 'gemini',
+    'fallbacks': ['groq', 'openrouter'],
+    'gemini_models': ['gemini-2.5-flash', 'gemini-2.0-flash'],
+    'groq_models': ['llama-3.3-70b-versatile'],
+    'openrouter_models': ['deepseek/deepseek-r1-distill-qwen-1.5b'],
+}
+
+CALLS = [('gemini', aggregator.call_gemini_api), ('groq', aggregator.call_groq_api),
+         ('openrouter', aggregator.call_openrouter_api)]
+
+
+class FailureCounter(logging.Handler):
+    """Counts the pipeline's own warnings for parse failures and failed requests"""
+
+    PATTERNS = {'no_json_analysis': 'No JSON analysis', 'malformed_responses': 'malformed response',
+                'early_stops': 'closing the stream', 'breaker_opened': 'Circuit open',
+                'breaker_skips': 'circuit open', 'retries': 'Retrying'}
+
+    def __init__(self):
+        super().__init__(logging.INFO)
+        self.counts = dict.fromkeys(self.PATTERNS, 0)
+
+    def emit(self, record):
+        message = record.getMessage()
+        for name, pattern in self.PATTERNS.items():
+            if pattern in message:
+                self.counts[name] += 1
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0
+
+
+def run_scenario(name, profiles, args, health_db):
+    server = MockProviderServer(profiles, seed=args.seed).start()
+    ai_providers.settings['base_urls'] = server.base_urls()
+    ai_providers._health = ai_providers.ModelHealth(db_path=health_db)  # fresh breakers per scenario
+    config = {'ai_models': AI_MODELS}
+    hedging = {'hedge_delay_seconds': args.hedge_delay, 'deadline_seconds': args.deadline}
+    prompt = "Analyze this network snapshot.\n" + "x" * args.prompt_chars
+
+    counter = FailureCounter()
+    logging.getLogger().addHandler(counter)
+    stats = ProviderStats()
+    cycles, wins, failed = [], {}, 0
+    try:
+        for _ in range(args.cycles):
+            providers = [(provider, partial(call, prompt, 'mock-key', config)) for provider, call in CALLS]
+            started = time.perf_counter()
+            provider, analysis = hedged_call(providers, hedging, stats)
+            cycles.append(time.perf_counter() - started)
+            if analysis:
+                wins[provider] = wins.get(provider, 0) + 1
+            else:
+                failed += 1
+    finally:
+        logging.getLogger().removeHandler(counter)
+        server.stop()
+
+    print(f"\n[{name}] {args.cycles} cycles, {'streamed' if ai_providers.settings['stream'] else 'whole'} responses")
+    print(f"  cycle latency   p50 {percentile(cycles, 0.5):.2f}s  p95 {percentile(cycles, 0.95):.2f}s  "
+          f"max {max(cycles):.2f}s")
+    print(f"  analyses by     {', '.join(f'{p} {n}' for p, n in sorted(wins.items())) or '-'}; failed cycles {failed}")
+    for provider, outcomes in server.stats.items():
+        served = ', '.join(f"{outcome} {n}" for outcome, n in outcomes.items() if n)
+        if served:
+            print(f"  served {provider:<9} {served}")
+    print(f"  handled         {', '.join(f'{k} {v}' for k, v in counter.counts.items())}")
+    for line in stats.summary():
+        print(f"  {line}")
+    return cycles, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('scenarios', nargs='*', metavar='scenario',
+                        help=f"any of {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument('--cycles', type=int, default=20)
+    parser.add_argument('--hedge-delay', type=float, default=2, help="seconds before hedging to the next provider")
+    parser.add_argument('--deadline', type=float, default=30, help="seconds per analysis cycle")
+    parser.add_argument('--prompt-chars', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--no-stream', action='store_true', help="read responses whole, as before streaming")
+    parser.add_argument('--verbose', action='store_true', help="show the pipeline's own log lines")
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    # The failure counter needs the INFO lines even when they aren't shown
+    console = logging.StreamHandler()
+    console.setLevel(logging.INFO if args.verbose else logging.CRITICAL)
+    console.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    logging.basicConfig(level=logging.INFO, handlers=[console])
+    ai_providers.settings.update(max_retries=1, backoff_base_seconds=0.5, stream=not args.no_stream)
+
+    workdir = tempfile.mkdtemp(prefix='netguard-bench-')
+    health_db = os.path.join(workdir, 'health.db')
+    try:
+        for name in args.scenarios or SCENARIOS:
+            run_scenario(name, SCENARIOS[name], args, health_db)
+            os.remove(health_db)
+    finally:
+        if os.path.exists(health_db):
+            os.remove(health_db)
+        os.rmdir(workdir)
+
+
+if __name__ == "__main__":
+    main()
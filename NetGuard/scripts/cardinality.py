@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+NetGuard Pro - Cardinality Sketches
+HyperLogLog distinct counters (sparse until they grow, small-range corrected)
+and time-bucketed sketches whose window count is the union of their buckets
+"""
+
+import math
+import hashlib
+
+DEFAULT_PRECISION = 10  # 2^10 registers, ~3.3% standard error, 1KB dense
+WINDOW_BUCKETS = 12
+
+
+def _hash64(value):
+    """Stable 64-bit hash (same across processes, unlike hash())"""
+    return int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), 'big')
+
+
+def _alpha(m):
+    if m == 16:
+        return 0.673
+    if m == 32:
+        return 0.697
+    if m == 64:
+        return 0.709
+    return 0.7213 / (1 + 1.079 / m)
+
+
+_INVERSE_POWERS = [2.0 ** -rank for rank in range(65)]
+
+
+def _estimate(harmonic, zeros, m):
+    """HLL estimate from sum(2^-register) with linear counting for small ranges"""
+    estimate = _alpha(m) * m * m / harmonic
+    if estimate <= 2.5 * m and zeros:
+        estimate = m * math.log(m / zeros)
+    return estimate
+
+
+class HyperLogLog:
+    """Distinct-count sketch; registers kept in a dict until dense is smaller"""
+
+    __slots__ = ('p', 'm', 'registers')
+
+    def __init__(self, p=DEFAULT_PRECISION):
+        self.p = p
+        self.m = 1 << p
+        self.registers = {}  # sparse: {index: rank}, replaced by a bytearray when dense
+
+    @property
+    def is_sparse(self):
+        return isinstance(self.registers, dict)
+
+    def add(self, value):
+        """Add a value; returns True if the sketch changed"""
+        x = _hash64(value)
+        index = x >> (64 - self.p)
+        rest = x & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+
+        registers = self.registers
+        if self.is_sparse:
+            if registers.get(index, 0) >= rank:
+                return False
+            registers[index] = rank
+            # A dict entry costs ~32x a byte register
+            if len(registers) > self.m // 32:
+                self._densify()
+            return True
+        if registers[index] >= rank:
+            return False
+        registers[index] = rank
+        return True
+
+    def _densify(self):
+        dense = bytearray(self.m)
+        for index, rank in self.registers.items():
+            dense[index] = rank
+        self.registers = dense
+
+    def merge(self, other):
+        """Fold another sketch of the same precision into this one"""
+        if other.is_sparse:
+            for index, rank in other.registers.items():
+                if self.is_sparse:
+                    if self.registers.get(index, 0) < rank:
+                        self.registers[index] = rank
+                elif self.registers[index] < rank:
+                    self.registers[index] = rank
+            if self.is_sparse and len(self.registers) > self.m // 32:
+                self._densify()
+            return
+        if self.is_sparse:
+            self._densify()
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self):
+        if self.is_sparse:
+            zeros = self.m - len(self.registers)
+            harmonic = zeros + sum(map(_INVERSE_POWERS.__getitem__, self.registers.values()))
+        else:
+            zeros = self.registers.count(0)
+            harmonic = sum(map(_INVERSE_POWERS.__getitem__, self.registers))
+        return _estimate(harmonic, zeros, self.m)
+
+
+def union_count(sketches):
+    """Estimated distinct count of the union of sketches"""
+    sketches = list(sketches)
+    if not sketches:
+        return 0.0
+    union = HyperLogLog(sketches[0].p)
+    for sketch in sketches:
+        union.merge(sketch)
+    return union.count()
+
+
+class BucketedSketch:
+    """HLL per time bucket over the last `timeframe` seconds
+
+    The union over the window is kept incrementally and only rebuilt from the
+    buckets when the newest bucket rolls over, so each event costs O(1)
+    """
+
+    __slots__ = ('bucket_width', 'p', 'sketches', 'stamps', 'union', 'union_bucket', 'fired_at')
+
+    def __init__(self, timeframe, buckets=WINDOW_BUCKETS, p=DEFAULT_PRECISION):
+        self.bucket_width = timeframe / buckets
+        self.p = p
+        self.sketches = [None] * buckets
+        self.stamps = [-1] * buckets
+        self.union = None
+        self.union_bucket = None
+        self.fired_at = None
+
+    def add(self, ts, value):
+        """Add a value at time ts; returns True if the bucket's sketch changed"""
+        bucket = int(ts // self.bucket_width)
+        slot = bucket % len(self.sketches)
+        if self.stamps[slot] != bucket:
+            if self.stamps[slot] > bucket:
+                return False  # older than the window, slot already reused
+            self.sketches[slot] = HyperLogLog(self.p)
+            self.stamps[slot] = bucket
+        if not self.sketches[slot].add(value):
+            return False
+        if self.union is not None:
+            if bucket > self.union_bucket:
+                self.union = None  # window moved on, rebuild on next total()
+            else:
+                self.union.add(value)
+        return True
+
+    def window(self, now):
+        newest = int(now // self.bucket_width)
+        oldest = newest - len(self.sketches)
+        return [sketch for sketch, stamp in zip(self.sketches, self.stamps)
+                if sketch is not None and oldest < stamp <= newest]
+
+    def total(self, now):
+        """Estimated distinct values over the window ending at `now`"""
+        newest = int(now // self.bucket_width)
+        if self.union is None or self.union_bucket != newest:
+            self.union = HyperLogLog(self.p)
+            for sketch in self.window(now):
+                self.union.merge(sketch)
+            self.union_bucket = newest
+        return self.union.count()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+NetGuard Pro - AI Analysis Change Detection
+Fingerprints the meaningful features of an aggregated 5-minute snapshot (alerts,
+devices, vulnerabilities, domains, counts bucketed by magnitude) so quiet
+cycles can reuse the previous analysis instead of calling the LLM again
+"""
+
+import math
+import time
+
+DEFAULT_CHANGE_DETECTION = {
+    'enabled': True,
+    'threshold': 5,  # change score needed for a fresh analysis
+    'max_skipped_cycles': 5,  # re-analyze at least every (n + 1) cycles regardless
+}
+
+# Score per new item of each kind, and per count that moved to another magnitude bucket
+WEIGHTS = {
+    'alerts': 5,
+    'vulnerabilities': 5,
+    'devices': 3,
+    'domains': 1,
+    'counts': 1,
+}
+
+
+def magnitude(n):
+    """0, 1, 2-3, 4-7, ... -> 0, 1, 2, 3, ...; small jitter in busy counts doesn't register"""
+    return int(math.log2(n)) + 1 if n and n > 0 else 0
+
+
+def fingerprint(data):
+    """Normalized features of one aggregated snapshot; timestamps and raw samples are ignored"""
+    tools = data.get('tools', {})
+    suricata = tools.get('suricata', {})
+    summary = data.get('network_summary', {})
+
+    alerts = {(alert.get('signature') or alert.get('alert_signature') or alert.get('signature_id'),
+               alert.get('src_ip'), alert.get('dest_ip'))
+              for alert in suricata.get('alerts', [])}
+    devices = {device.get('ip_address') for device in summary.get('tracked_devices', [])}
+    devices |= {device.get('ip_address') for device in data.get('iot_devices', {}).get('devices', [])}
+    vulnerabilities = {(vuln.get('device_ip'), vuln.get('vulnerability_type'))
+                       for vuln in data.get('iot_security', {}).get('vulnerabilities', [])}
+
+    domains = set(tools.get('httpry', {}).get('top_hosts', {}))
+    for event in suricata.get('dns_events', []):
+        domains.add(event.get('rrname') or event.get('query'))
+    for event in suricata.get('tls_events', []):
+        domains.add(event.get('sni') or event.get('server_name'))
+
+    counts = {f"{tool}.{key}": magnitude(value)
+              for tool, stats in tools.items() if isinstance(stats, dict)
+              for key, value in stats.items()
+              if key.startswith('total_') and isinstance(value, (int, float))}
+    counts.update({f"network.{key}": magnitude(value) for key, value in summary.items()
+                   if isinstance(value, (int, float))})
+    for proto, n in tools.get('tshark', {}).get('protocol_distribution', {}).items():
+        counts[f"protocol.{proto}"] = magnitude(n)
+
+    return {
+        'alerts': alerts - {(None, None, None)},
+        'devices': devices - {None},
+        'vulnerabilities': vulnerabilities - {(None, None)},
+        'domains': domains - {None, '', 'Unknown'},
+        'counts': counts,
+    }
+
+
+def change_score(previous, current):
+    """(score, reasons) for what is new or moved since the previous fingerprint"""
+    score = 0
+    reasons = []
+    for kind in ('alerts', 'vulnerabilities', 'devices', 'domains'):
+        new = current[kind] - previous[kind]
+        if new:
+            score += WEIGHTS[kind] * len(new)
+            reasons.append(f"{len(new)} new {kind}")
+    moved = [key for key in current['counts'].keys() | previous['counts'].keys()
+             if current['counts'].get(key, 0) != previous['counts'].get(key, 0)]
+    if moved:
+        score += WEIGHTS['counts'] * len(moved)
+        reasons.append(f"{len(moved)} counts changed magnitude")
+    return score, reasons
+
+
+class ChangeDetector:
+    """Decides per cycle whether the snapshot differs enough to re-analyze"""
+
+    def __init__(self, settings=None):
+        self.settings = dict(DEFAULT_CHANGE_DETECTION, **(settings or {}))
+        self.previous = None  # fingerprint behind the cached analysis
+        self.analysis = None
+        self.skipped = 0
+        self.analyzed_at = None
+
+    def should_analyze(self, data):
+        """(analyze?, current fingerprint, reason)"""
+        current = fingerprint(data)
+        if not self.settings['enabled'] or self.previous is None or self.analysis is None:
+            return True, current, 'no cached analysis'
+        if self.skipped >= self.settings['max_skipped_cycles']:
+            return True, current, f"{self.skipped} cycles reused, refreshing"
+        score, reasons = change_score(self.previous, current)
+        if score >= self.settings['threshold']:
+            return True, current, f"change score {score}: {', '.join(reasons)}"
+        return False, current, f"change score {score} below {self.settings['threshold']}" + (
+            f" ({', '.join(reasons)})" if reasons else '')
+
+    def analyzed(self, current, analysis):
+        self.previous = current
+        self.analysis = analysis
+        self.skipped = 0
+        self.analyzed_at = time.time()
+
+    def reused(self):
+        # The baseline stays the analyzed snapshot, so small changes add up
+        # across quiet cycles until they cross the threshold
+        self.skipped += 1
@@ -8,19 +8,14 @@ Tools: Suricata, tcpdump, tshark, argus, ngrep, netsniff, httpry, iftop, nethogs
 import sqlite3
 import json
 import logging
-from datetime import datetime, timedelta
-from collections import defaultdict
+from datetime import datetime
 from pathlib import Path
+from time_window import TimeWindow
 
 DB_PATH = "/home/jarvis/NetGuard/network.db"
 CONFIG_PATH = "/home/jarvis/NetGuard/config/ai_config.json"
 EXPORT_DIR = "/home/jarvis/NetGuard/exports"
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
-
 
 def load_config():
     """Load configuration from JSON file"""
@@ -32,47 +27,14 @@ def load_config():
         return None
 
 
-def get_latest_table(prefix):
-    """Get the most recent table for a given prefix"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute(f"""
-        SELECT name FROM sqlite_master 
-        WHERE type='table' AND name LIKE '{prefix}_%' 
-        AND name NOT LIKE '%template%'
-        ORDER BY name DESC 
-        LIMIT 1
-    """)
-    
-    result = cursor.fetchone()
-    conn.close()
-    
-    return result[0] if result else None
-
-
-def get_suricata_alerts(time_window_minutes=5):
+def get_suricata_alerts(window):
     """Get Suricata IDS alerts"""
-    table = get_latest_table('suricata_alerts')
-    if not table:
-        logging.warning("No Suricata alerts table found")
-        return []
-    
     conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
     
     try:
         # Get recent alerts
-        cursor.execute(f"""
-            SELECT * FROM {table} 
-            ORDER BY timestamp DESC 
-            LIMIT 100
-        """)
-        
         alerts = []
-        for row in cursor.fetchall():
-            row_dict = dict(row)
+        for row_dict in window.recent(conn, 'suricata_alerts', 100):
             alert = {
                 'timestamp': row_dict.get('timestamp'),
                 'alert': row_dict.get('alert'),
@@ -87,7 +49,7 @@ def get_suricata_alerts(time_window_minutes=5):
             }
             alerts.append(alert)
         
-        logging.info(f"✓ Collected {len(alerts)} Suricata alerts from {table}")
+        logging.info(f"✓ Collected {len(alerts)} Suricata alerts from the last {window.minutes} minutes")
         return alerts
         
     except Exception as e:
@@ -97,50 +59,35 @@ def get_suricata_alerts(time_window_minutes=5):
         conn.close()
 
 
-def get_tcpdump_data(max_packets=1000):
-    """Get tcpdump packet captures"""
-    table = get_latest_table('tcpdump')
-    if not table:
-        logging.warning("No tcpdump table found")
-        return {'packets': [], 'summary': {}}
-    
+def get_tcpdump_data(window, max_packets=1000):
+    """Get tcpdump packet captures (summary over the whole window, newest packets as samples)"""
     conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
     
     try:
-        cursor.execute(f"""
-            SELECT * FROM {table} 
-            ORDER BY id DESC 
-            LIMIT {max_packets}
-        """)
-        
-        packets = [dict(row) for row in cursor.fetchall()]
+        source = window.source(conn, 'tcpdump', ['src_ip', 'dest_ip', 'protocol', 'frame_length'])
+        if source is None:
+            logging.warning("No tcpdump table found")
+            return {'packets': [], 'summary': {}}
         
         # Aggregate summary
-        total_bytes = sum(p.get('frame_length', 0) or 0 for p in packets)
-        protocols = defaultdict(int)
-        src_ips = set()
-        dst_ips = set()
-        
-        for p in packets:
-            if p.get('protocol'):
-                protocols[p['protocol']] += 1
-            if p.get('src_ip'):
-                src_ips.add(p['src_ip'])
-            if p.get('dest_ip'):
-                dst_ips.add(p['dest_ip'])
-        
-        summary = {
-            'total_packets': len(packets),
-            'total_bytes': total_bytes,
-            'unique_src_ips': len(src_ips),
-            'unique_dst_ips': len(dst_ips),
-            'protocols': dict(protocols)
+        summary = window.fetch(conn, """
+            SELECT COUNT(*) AS total_packets,
+                   COALESCE(SUM(frame_length), 0) AS total_bytes,
+                   COUNT(DISTINCT NULLIF(src_ip, '')) AS unique_src_ips,
+                   COUNT(DISTINCT NULLIF(dest_ip, '')) AS unique_dst_ips
+            FROM {source}
+        """, source)[0]
+        summary['protocols'] = {
+            row['protocol']: row['n']
+            for row in window.fetch(conn, """
+                SELECT protocol, COUNT(*) AS n FROM {source}
+                WHERE protocol != '' GROUP BY protocol
+            """, source)
         }
         
-        logging.info(f"✓ Collected {len(packets)} tcpdump packets from {table}")
-        return {'packets': packets[:100], 'summary': summary}  # Limit to 100 for AI
+        packets = window.recent(conn, 'tcpdump', min(max_packets, 100))  # Limit to 100 for AI
+        logging.info(f"✓ Collected {summary['total_packets']} tcpdump packets from the last {window.minutes} minutes")
+        return {'packets': packets, 'summary': summary}
         
     except Exception as e:
         logging.error(f"Error collecting tcpdump data: {e}")
@@ -149,43 +96,14 @@ def get_tcpdump_data(max_packets=1000):
         conn.close()
 
 
-def get_tshark_data(time_window_minutes=5):
+def get_tshark_data(window):
     """Get tshark analysis data"""
-    # Get most recent tshark table
     conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
     
     try:
-        # Find recent tshark tables (format: YYYYMMDD_HHMMSS)
-        cursor.execute("""
-            SELECT name FROM sqlite_master 
-            WHERE type='table' AND name GLOB '[0-9]*_[0-9]*'
-            AND name NOT LIKE 'tcpdump_%'
-            AND name NOT LIKE 'suricata_%'
-            AND name NOT LIKE 'argus_%'
-            ORDER BY name DESC 
-            LIMIT 5
-        """)
-        
-        tables = [row[0] for row in cursor.fetchall()]
-        
-        if not tables:
-            logging.warning("No tshark tables found")
-            return []
-        
-        conn.row_factory = sqlite3.Row
-        all_packets = []
-        
-        for table in tables[:3]:  # Check last 3 tables
-            try:
-                cursor.execute(f"SELECT * FROM {table} LIMIT 50")
-                packets = [dict(row) for row in cursor.fetchall()]
-                all_packets.extend(packets)
-            except:
-                continue
-        
-        logging.info(f"✓ Collected {len(all_packets)} tshark packets from {len(tables)} tables")
-        return all_packets[:100]  # Limit to 100
+        packets = window.recent(conn, 'tshark', 100)  # Limit to 100
+        logging.info(f"✓ Collected {len(packets)} tshark packets from the last {window.minutes} minutes")
+        return packets
         
     except Exception as e:
         logging.error(f"Error collecting tshark data: {e}")
@@ -194,27 +112,13 @@ def get_tshark_data(time_window_minutes=5):
         conn.close()
 
 
-def get_httpry_data():
+def get_httpry_data(window):
     """Get HTTP transaction logs"""
-    table = get_latest_table('httpry')
-    if not table:
-        logging.warning("No httpry table found")
-        return []
-    
     conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
     
     try:
-        cursor.execute(f"""
-            SELECT * FROM {table} 
-            ORDER BY timestamp DESC 
-            LIMIT 50
-        """)
-        
         requests = []
-        for row in cursor.fetchall():
-            row_dict = dict(row)
+        for row_dict in window.recent(conn, 'httpry', 50):
             req = {
                 'timestamp': row_dict.get('timestamp'),
                 'src_ip': row_dict.get('src_ip'),
@@ -227,7 +131,7 @@ def get_httpry_data():
             }
             requests.append(req)
         
-        logging.info(f"✓ Collected {len(requests)} HTTP requests from {table}")
+        logging.info(f"✓ Collected {len(requests)} HTTP requests from the last {window.minutes} minutes")
         return requests
         
     except Exception as e:
@@ -237,27 +141,13 @@ def get_httpry_data():
         conn.close()
 
 
-def get_argus_flows():
+def get_argus_flows(window):
     """Get network flow data from argus"""
-    table = get_latest_table('argus')
-    if not table:
-        logging.warning("No argus table found")
-        return []
-    
     conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
     
     try:
-        cursor.execute(f"""
-            SELECT * FROM {table} 
-            ORDER BY start_time DESC 
-            LIMIT 100
-        """)
-        
         flows = []
-        for row in cursor.fetchall():
-            row_dict = dict(row)
+        for row_dict in window.recent(conn, 'argus', 100):
             flow = {
                 'start_time': row_dict.get('start_time'),
                 'duration': row_dict.get('duration'),
@@ -272,7 +162,7 @@ def get_argus_flows():
             }
             flows.append(flow)
         
-        logging.info(f"✓ Collected {len(flows)} network flows from {table}")
+        logging.info(f"✓ Collected {len(flows)} network flows from the last {window.minutes} minutes")
         return flows
         
     except Exception as e:
@@ -282,7 +172,7 @@ def get_argus_flows():
         conn.close()
 
 
-def aggregate_all_data(config):
+def aggregate_all_data(config, window=None):
     """Aggregate data from all monitoring tools"""
     
     logging.info("=" * 60)
@@ -291,6 +181,8 @@ def aggregate_all_data(config):
     
     time_window = config.get('data_collection', {}).get('time_window_minutes', 5)
     max_packets = config.get('data_collection', {}).get('max_packets_to_analyze', 1000)
+    window = window or TimeWindow(time_window)
+    time_window = window.minutes
     
     # Collect from all tools
     data = {
@@ -302,19 +194,19 @@ def aggregate_all_data(config):
         },
         
         # Suricata IDS Alerts (CRITICAL - Security threats)
-        'suricata_alerts': get_suricata_alerts(time_window),
+        'suricata_alerts': get_suricata_alerts(window),
         
         # tcpdump - Full packet captures
-        'tcpdump': get_tcpdump_data(max_packets),
+        'tcpdump': get_tcpdump_data(window, max_packets),
         
         # tshark - Detailed packet analysis
-        'tshark_packets': get_tshark_data(time_window),
+        'tshark_packets': get_tshark_data(window),
         
         # httpry - HTTP traffic
-        'http_traffic': get_httpry_data(),
+        'http_traffic': get_httpry_data(window),
         
         # argus - Network flows
-        'network_flows': get_argus_flows(),
+        'network_flows': get_argus_flows(window),
     }
     
     # Calculate overall statistics
@@ -359,7 +251,7 @@ def export_for_ai(data):
     
     # Save full export
     with open(filename, 'w') as f:
-        json.dump(data, f, indent=2, default=str)
+        json.dump(data, f, separators=(',', ':'), default=str)
     
     logging.info(f"✓ Saved comprehensive export to: {filename}")
     
@@ -367,6 +259,11 @@ def export_for_ai(data):
 
 
 if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    
     # Load configuration
     config = load_config()
     
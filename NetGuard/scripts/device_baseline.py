@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+NetGuard Pro - Streaming Device Baselines
+Constant-memory per-device behavior profiles (Welford mean/variance,
+hour-of-week histograms, top-K destination sketches) checkpointed to device_profiles,
+with O(1) anomaly lookups against them
+"""
+
+import json
+import math
+import sqlite3
+import logging
+import time
+from datetime import datetime
+
+CHECKPOINT_INTERVAL = 300  # seconds between device_profiles checkpoints
+TOP_K_DESTINATIONS = 20
+TOP_K_PROTOCOLS = 10
+MAX_GAP_DAYS = 30  # idle days back-filled as zero-byte days
+MAX_GAP_HOURS = 168  # idle hours back-filled as zero-connection hours
+CONFIDENT_DAYS = 7  # days of history for full profile confidence
+UNUSUAL_HOUR_SHARE = 0.001  # hour-of-week slots below this share of activity are unusual
+
+
+class OnlineStats:
+    """Welford running mean/variance"""
+
+    def __init__(self, n=0, mean=0.0, m2=0.0):
+        self.n = n
+        self.mean = mean
+        self.m2 = m2
+
+    def update(self, value):
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+    def zscore(self, value):
+        std = self.std
+        return (value - self.mean) / std if std > 0 else 0.0
+
+    def to_dict(self):
+        return {'n': self.n, 'mean': self.mean, 'm2': self.m2}
+
+
+class TopK:
+    """Space-Saving heavy hitters sketch with at most k counters"""
+
+    def __init__(self, k, counts=None):
+        self.k = k
+        self.counts = counts or {}
+
+    def add(self, key, weight=1):
+        if key in self.counts:
+            self.counts[key] += weight
+        elif len(self.counts) < self.k:
+            self.counts[key] = weight
+        else:
+            # Replace the smallest counter, inheriting its count as error bound
+            victim = min(self.counts, key=self.counts.get)
+            self.counts[key] = self.counts.pop(victim) + weight
+
+    def top(self, n=None):
+        return sorted(self.counts, key=self.counts.get, reverse=True)[:n]
+
+
+class DeviceBaseline:
+    """Streaming behavior profile for one device"""
+
+    def __init__(self, state=None):
+        state = state or {}
+        self.daily_bytes = OnlineStats(**state.get('daily_bytes', {}))
+        self.hourly_connections = OnlineStats(**state.get('hourly_connections', {}))
+        self.hour_of_week = state.get('hour_of_week', [0] * 168)
+        self.destinations = TopK(TOP_K_DESTINATIONS, state.get('destinations'))
+        self.protocols = TopK(TOP_K_PROTOCOLS, state.get('protocols'))
+        self.first_seen = state.get('first_seen')
+        self.current_day = state.get('current_day')
+        self.day_bytes = state.get('day_bytes', 0)
+        self.current_hour = state.get('current_hour')
+        self.hour_connections = state.get('hour_connections', 0)
+
+    def _roll_day(self, day):
+        if self.current_day and day != self.current_day:
+            self.daily_bytes.update(self.day_bytes)
+            gap = (datetime.fromisoformat(day) - datetime.fromisoformat(self.current_day)).days - 1
+            for _ in range(max(0, min(gap, MAX_GAP_DAYS))):
+                self.daily_bytes.update(0)
+            self.day_bytes = 0
+        self.current_day = day
+
+    def _roll_hour(self, hour):
+        if self.current_hour and hour != self.current_hour:
+            self.hourly_connections.update(self.hour_connections)
+            gap = int((datetime.fromisoformat(hour) - datetime.fromisoformat(self.current_hour))
+                      .total_seconds() // 3600) - 1
+            for _ in range(max(0, min(gap, MAX_GAP_HOURS))):
+                self.hourly_connections.update(0)
+            self.hour_connections = 0
+        self.current_hour = hour
+
+    def observe(self, seen_at, size=0, destination=None, protocol=None, new_connection=False):
+        """Fold one packet/flow observation into the profile"""
+        if not self.first_seen:
+            self.first_seen = seen_at.isoformat()
+
+        self._roll_day(seen_at.strftime('%Y-%m-%d'))
+        self._roll_hour(seen_at.strftime('%Y-%m-%dT%H:00:00'))
+
+        self.day_bytes += size
+        if new_connection:
+            self.hour_connections += 1
+        self.hour_of_week[seen_at.weekday() * 24 + seen_at.hour] += 1
+        if destination:
+            self.destinations.add(destination)
+        if protocol:
+            self.protocols.add(protocol)
+
+    # O(1) anomaly lookups against the learned profile
+
+    def daily_bytes_zscore(self, day_bytes):
+        return self.daily_bytes.zscore(day_bytes)
+
+    def hourly_connections_zscore(self, connections):
+        return self.hourly_connections.zscore(connections)
+
+    def is_unusual_hour(self, seen_at, min_share=UNUSUAL_HOUR_SHARE):
+        """True when the device has rarely been active in this hour-of-week slot"""
+        if self.daily_bytes.n < CONFIDENT_DAYS:
+            return False
+        total = sum(self.hour_of_week)
+        slot = self.hour_of_week[seen_at.weekday() * 24 + seen_at.hour]
+        return total > 0 and slot / total < min_share
+
+    def is_new_destination(self, destination):
+        return destination not in self.destinations.counts
+
+    def deviations(self, at):
+        """Today's bytes and this hour's connections so far against the profile, at time at"""
+        same_day = self.current_day == at.strftime('%Y-%m-%d')
+        same_hour = self.current_hour == at.strftime('%Y-%m-%dT%H:00:00')
+        return {
+            'days_observed': self.daily_bytes.n,
+            'daily_bytes_zscore': round(self.daily_bytes_zscore(self.day_bytes if same_day else 0), 2),
+            'hourly_connections_zscore': round(
+                self.hourly_connections_zscore(self.hour_connections if same_hour else 0), 2),
+            'unusual_hour': self.is_unusual_hour(at),
+        }
+
+    def typical_hours(self):
+        """Hours of day (0-23) carrying above-average activity"""
+        by_hour = [sum(self.hour_of_week[day * 24 + hour] for day in range(7)) for hour in range(24)]
+        total = sum(by_hour)
+        if not total:
+            return []
+        return [hour for hour, count in enumerate(by_hour) if count >= total / 24]
+
+    def to_state(self):
+        return {
+            'daily_bytes': self.daily_bytes.to_dict(),
+            'hourly_connections': self.hourly_connections.to_dict(),
+            'hour_of_week': self.hour_of_week,
+            'destinations': self.destinations.counts,
+            'protocols': self.protocols.counts,
+            'first_seen': self.first_seen,
+            'current_day': self.current_day,
+            'day_bytes': self.day_bytes,
+            'current_hour': self.current_hour,
+            'hour_connections': self.hour_connections,
+        }
+
+
+def load_baselines(db_path, device_ips=None):
+    """Checkpointed profiles from device_profiles as {device_ip: DeviceBaseline}"""
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute("""
+            SELECT device_ip, baseline_json FROM device_profiles
+            WHERE baseline_json IS NOT NULL
+        """).fetchall()
+    finally:
+        conn.close()
+    wanted = set(device_ips) if device_ips is not None else None
+    profiles = {}
+    for device_ip, baseline_json in rows:
+        if wanted is not None and device_ip not in wanted:
+            continue
+        try:
+            profiles[device_ip] = DeviceBaseline(json.loads(baseline_json))
+        except (ValueError, TypeError):
+            continue
+    return profiles
+
+
+class BaselineEngine:
+    """Maintains DeviceBaseline objects and checkpoints them to device_profiles"""
+
+    def __init__(self, db_path, checkpoint_interval=CHECKPOINT_INTERVAL):
+        self.db_path = db_path
+        self.checkpoint_interval = checkpoint_interval
+        self.profiles = {}
+        self.dirty = set()
+        self.last_checkpoint = time.time()
+        self.init_table()
+        self.load()
+
+    def init_table(self):
+        """Create device_profiles if init_ai_database.py hasn't run yet"""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS device_profiles (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    device_ip TEXT UNIQUE NOT NULL,
+                    mac_address TEXT,
+                    device_name TEXT,
+                    device_type TEXT,
+                    first_seen TEXT,
+                    last_updated TEXT,
+                    avg_daily_bytes INTEGER,
+                    std_daily_bytes INTEGER,
+                    avg_hourly_connections INTEGER,
+                    typical_protocols TEXT,
+                    common_destinations TEXT,
+                    typical_hours TEXT,
+                    baseline_json TEXT,
+                    profile_confidence REAL DEFAULT 0.0,
+                    days_observed INTEGER DEFAULT 0,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logging.error(f"Error initializing device_profiles: {e}")
+
+    def load(self):
+        """Resume profiles from their last checkpoint"""
+        try:
+            self.profiles.update(load_baselines(self.db_path))
+            if self.profiles:
+                logging.info(f"✓ Loaded {len(self.profiles)} device baselines")
+        except Exception as e:
+            logging.error(f"Error loading device baselines: {e}")
+
+    def observe(self, device_ip, size=0, destination=None, protocol=None,
+                new_connection=False, seen_at=None):
+        """Fold one observation for a device into its baseline"""
+        if not device_ip:
+            return
+        profile = self.profiles.get(device_ip)
+        if profile is None:
+            profile = self.profiles[device_ip] = DeviceBaseline()
+        profile.observe(seen_at or datetime.now(), size, destination, protocol, new_connection)
+        self.dirty.add(device_ip)
+
+        if time.time() - self.last_checkpoint >= self.checkpoint_interval:
+            self.checkpoint()
+
+    # O(1) anomaly lookups; devices without a profile are never anomalous
+
+    def daily_bytes_zscore(self, device_ip, day_bytes):
+        profile = self.profiles.get(device_ip)
+        return profile.daily_bytes_zscore(day_bytes) if profile else 0.0
+
+    def hourly_connections_zscore(self, device_ip, connections):
+        profile = self.profiles.get(device_ip)
+        return profile.hourly_connections_zscore(connections) if profile else 0.0
+
+    def is_unusual_hour(self, device_ip, seen_at, min_share=UNUSUAL_HOUR_SHARE):
+        profile = self.profiles.get(device_ip)
+        return bool(profile) and profile.is_unusual_hour(seen_at, min_share)
+
+    def is_new_destination(self, device_ip, destination):
+        profile = self.profiles.get(device_ip)
+        return bool(profile) and profile.is_new_destination(destination)
+
+    def checkpoint(self):
+        """Write changed profiles to device_profiles in one transaction"""
+        self.last_checkpoint = time.time()
+        if not self.dirty:
+            return 0
+
+        now = datetime.now().isoformat()
+        rows = []
+        for device_ip in self.dirty:
+            profile = self.profiles[device_ip]
+            days = profile.daily_bytes.n
+            rows.append((
+                device_ip, profile.first_seen, now,
+                int(profile.daily_bytes.mean), int(profile.daily_bytes.std),
+                int(round(profile.hourly_connections.mean)),
+                json.dumps(profile.protocols.top()),
+                json.dumps(profile.destinations.top()),
+                json.dumps(profile.typical_hours()),
+                json.dumps(profile.to_state()),
+                min(1.0, days / CONFIDENT_DAYS), days
+            ))
+
+        try:
+            conn = sqlite3.connect(self.db_path)
+            conn.executemany("""
+                INSERT INTO device_profiles
+                (device_ip, first_seen, last_updated, avg_daily_bytes, std_daily_bytes,
+                 avg_hourly_connections, typical_protocols, common_destinations,
+                 typical_hours, baseline_json, profile_confidence, days_observed)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(device_ip) DO UPDATE SET
+                    last_updated = excluded.last_updated,
+                    avg_daily_bytes = excluded.avg_daily_bytes,
+                    std_daily_bytes = excluded.std_daily_bytes,
+                    avg_hourly_connections = excluded.avg_hourly_connections,
+                    typical_protocols = excluded.typical_protocols,
+                    common_destinations = excluded.common_destinations,
+                    typical_hours = excluded.typical_hours,
+                    baseline_json = excluded.baseline_json,
+                    profile_confidence = excluded.profile_confidence,
+                    days_observed = excluded.days_observed
+            """, rows)
+            conn.commit()
+            conn.close()
+            self.dirty.clear()
+            logging.info(f"✓ Checkpointed {len(rows)} device baselines")
+            return len(rows)
+        except Exception as e:
+            logging.error(f"Error checkpointing device baselines: {e}")
+            return 0
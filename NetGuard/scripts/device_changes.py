@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+NetGuard Pro - Device Change Tracking
+Shared dirty-set used by the device tracker and IoT scanner
+to tell the device scorer which devices actually need rescoring
+"""
+
+import time
+
+# Reasons a device can be marked dirty
+REASON_NEW_DEVICE = 'new_device'
+REASON_IDENTITY_CHANGED = 'identity_changed'
+REASON_NEW_TRAFFIC = 'new_traffic'
+REASON_REACTIVATED = 'reactivated'
+REASON_INACTIVE = 'inactive'
+REASON_NEW_VULNERABILITY = 'new_vulnerability'
+
+
+def init_change_tables(cursor):
+    """Create dirty-set and score history tables if missing"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS device_dirty (
+            device_ip TEXT PRIMARY KEY,
+            reasons TEXT NOT NULL,
+            marked_at REAL NOT NULL
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS device_score_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            device_ip TEXT NOT NULL,
+            score INTEGER NOT NULL,
+            previous_score INTEGER,
+            reasons TEXT,
+            triggers TEXT,
+            computed_at TEXT NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_score_history_ip ON device_score_history(device_ip, computed_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_score_history_time ON device_score_history(computed_at)")
+
+
+def mark_device_dirty(cursor, device_ip, reason):
+    """Flag a device for rescoring (caller commits)"""
+    if not device_ip:
+        return
+
+    # Re-marking refreshes marked_at so a concurrent scorer run won't clear it
+    cursor.execute("""
+        INSERT INTO device_dirty (device_ip, reasons, marked_at)
+        VALUES (?, ?, ?)
+        ON CONFLICT(device_ip) DO UPDATE SET
+            reasons = CASE
+                WHEN instr(',' || reasons || ',', ',' || excluded.reasons || ',') > 0 THEN reasons
+                ELSE reasons || ',' || excluded.reasons
+            END,
+            marked_at = excluded.marked_at
+    """, (device_ip, reason, time.time()))
+
+
+def mark_devices_dirty(cursor, device_ips, reason):
+    """Flag several devices for rescoring (caller commits)"""
+    for device_ip in device_ips:
+        mark_device_dirty(cursor, device_ip, reason)
+
+
+def get_dirty_devices(cursor):
+    """Return {device_ip: (reasons, marked_at)} for all dirty devices"""
+    cursor.execute("SELECT device_ip, reasons, marked_at FROM device_dirty")
+    return {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+
+
+def clear_dirty_devices(cursor, dirty):
+    """Clear devices returned by get_dirty_devices unless re-marked since"""
+    cursor.executemany("""
+        DELETE FROM device_dirty
+        WHERE device_ip = ? AND marked_at <= ?
+    """, [(ip, marked_at) for ip, (_, marked_at) in dirty.items()])
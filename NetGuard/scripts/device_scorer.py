@@ -1,13 +1,17 @@
 #!/usr/bin/env python3
 """
 NetGuard Pro - Device Security Scorer
-Calculates security scores (0-100) for all tracked devices
+Calculates security scores (0-100) for tracked devices
+Only devices flagged in the device_dirty set are rescored unless --full is given
 """
 
 import sqlite3
 import logging
 import sys
+import json
 from datetime import datetime, timedelta
+from device_changes import (init_change_tables, get_dirty_devices, clear_dirty_devices,
+                            REASON_INACTIVE)
 
 DB_PATH = "/home/jarvis/NetGuard/network.db"
 LOG_FILE = "/home/jarvis/NetGuard/logs/system/device-scorer.log"
@@ -28,6 +32,20 @@ class DeviceScorer:
         self.conn = sqlite3.connect(DB_PATH)
         self.conn.row_factory = sqlite3.Row
         self.cursor = self.conn.cursor()
+        init_change_tables(self.cursor)
+        self.conn.commit()
+        self.traffic_table = None
+    
+    def find_latest_traffic_table(self):
+        """Find the newest tshark/tcpdump table (looked up once per run)"""
+        self.cursor.execute("""
+            SELECT name FROM sqlite_master 
+            WHERE type='table' AND (name LIKE 'tshark_%' OR name LIKE 'tcpdump_%')
+            AND name NOT LIKE '%_template'
+            ORDER BY name DESC LIMIT 1
+        """)
+        table_result = self.cursor.fetchone()
+        return table_result['name'] if table_result else None
     
     def calculate_device_score(self, device):
         """Calculate security score for a single device (0-100)"""
@@ -82,16 +100,8 @@ class DeviceScorer:
         # Factor 3: Network Activity (check for suspicious connections)
         # Check recent traffic for unencrypted HTTP
         try:
-            self.cursor.execute("""
-                SELECT name FROM sqlite_master 
-                WHERE type='table' AND (name LIKE 'tshark_%' OR name LIKE 'tcpdump_%')
-                AND name NOT LIKE '%_template'
-                ORDER BY name DESC LIMIT 1
-            """)
-            table_result = self.cursor.fetchone()
-            
-            if table_result:
-                table_name = table_result['name']
+            if self.traffic_table:
+                table_name = self.traffic_table
                 
                 # Check HTTP vs HTTPS ratio
                 self.cursor.execute(f"""
@@ -158,6 +168,57 @@ class DeviceScorer:
         self.cursor.execute("SELECT * FROM devices")
         devices = self.cursor.fetchall()
         
+        dirty = get_dirty_devices(self.cursor)
+        result = self.score_devices(devices, {d['ip_address']: 'full_rescore' for d in devices})
+        clear_dirty_devices(self.cursor, dirty)
+        self.conn.commit()
+        
+        return result
+    
+    def update_dirty_scores(self):
+        """Update security scores only for devices whose inputs changed"""
+        self.cursor.execute("SELECT MAX(computed_at) as last_run FROM device_score_history")
+        last_run = self.cursor.fetchone()['last_run']
+        
+        if not last_run:
+            logging.info("No score history yet, running full rescore")
+            return self.update_all_scores()
+        
+        dirty = get_dirty_devices(self.cursor)
+        triggers = {ip: reasons for ip, (reasons, _) in dirty.items()}
+        
+        # Devices whose last_seen crossed the 24h inactivity threshold since the last run
+        now = datetime.now()
+        self.cursor.execute("""
+            SELECT ip_address FROM devices
+            WHERE last_seen >= ? AND last_seen < ?
+        """, ((datetime.fromisoformat(last_run) - timedelta(hours=24)).isoformat(),
+              (now - timedelta(hours=24)).isoformat()))
+        for row in self.cursor.fetchall():
+            ip = row['ip_address']
+            triggers[ip] = f"{triggers[ip]},{REASON_INACTIVE}" if ip in triggers else REASON_INACTIVE
+        
+        if not triggers:
+            logging.info("No device changes since last run, nothing to rescore")
+            return 0, {'A': 0, 'B': 0, 'C': 0, 'D': 0, 'F': 0}
+        
+        logging.info(f"Rescoring {len(triggers)} changed device(s)...")
+        
+        placeholders = ','.join('?' for _ in triggers)
+        self.cursor.execute(f"SELECT * FROM devices WHERE ip_address IN ({placeholders})", list(triggers))
+        devices = self.cursor.fetchall()
+        
+        result = self.score_devices(devices, triggers, now)
+        clear_dirty_devices(self.cursor, dirty)
+        self.conn.commit()
+        
+        return result
+    
+    def score_devices(self, devices, triggers, now=None):
+        """Score the given devices, update devices.security_score and record history"""
+        computed_at = (now or datetime.now()).isoformat()
+        self.traffic_table = self.find_latest_traffic_table()
+        
         updated_count = 0
         score_distribution = {'A': 0, 'B': 0, 'C': 0, 'D': 0, 'F': 0}
         
@@ -172,6 +233,13 @@ class DeviceScorer:
                 WHERE ip_address = ?
             """, (score, device_dict['ip_address']))
             
+            self.cursor.execute("""
+                INSERT INTO device_score_history
+                (device_ip, score, previous_score, reasons, triggers, computed_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (device_dict['ip_address'], score, device_dict['security_score'],
+                  json.dumps(reasons), triggers.get(device_dict['ip_address']), computed_at))
+            
             updated_count += 1
             
             # Track score distribution
@@ -196,13 +264,23 @@ class DeviceScorer:
                 for reason in reasons[:3]:  # Show top 3 reasons
                     logging.info(f"    - {reason}")
         
-        self.conn.commit()
-        
         logging.info(f"\n✓ Updated {updated_count} device security scores")
         logging.info(f"Score Distribution: A={score_distribution['A']}, B={score_distribution['B']}, C={score_distribution['C']}, D={score_distribution['D']}, F={score_distribution['F']}")
         
         return updated_count, score_distribution
     
+    def get_score_history(self, device_ip, limit=50):
+        """Get recent score changes for a device"""
+        self.cursor.execute("""
+            SELECT score, previous_score, reasons, triggers, computed_at
+            FROM device_score_history
+            WHERE device_ip = ?
+            ORDER BY computed_at DESC
+            LIMIT ?
+        """, (device_ip, limit))
+        
+        return [dict(row) for row in self.cursor.fetchall()]
+    
     def get_at_risk_devices(self, threshold=60):
         """Get devices with security score below threshold"""
         self.cursor.execute("""
@@ -227,7 +305,10 @@ def main():
     
     try:
         scorer = DeviceScorer()
-        updated, distribution = scorer.update_all_scores()
+        if '--full' in sys.argv:
+            updated, distribution = scorer.update_all_scores()
+        else:
+            updated, distribution = scorer.update_dirty_scores()
         
         # Show at-risk devices
         at_risk = scorer.get_at_risk_devices(threshold=70)
@@ -12,14 +12,18 @@ import logging
 import subprocess
 import re
 import socket
-from datetime import datetime
+from datetime import datetime, timedelta
 from collections import defaultdict
+from neighbor_watcher import NeighborWatcher, EVENT_NEW, EVENT_MAC_CHANGED, EVENT_GONE
+from device_changes import (init_change_tables, mark_device_dirty, REASON_NEW_DEVICE,
+                            REASON_IDENTITY_CHANGED, REASON_NEW_TRAFFIC, REASON_REACTIVATED)
 
 # Configuration
 DB_PATH = "/home/jarvis/NetGuard/network.db"
 DEVICE_DB_PATH = "/home/jarvis/NetGuard/config/known_devices.json"
 MAC_OUI_DB = "/home/jarvis/NetGuard/config/mac_oui.json"
 LOG_FILE = "/home/jarvis/NetGuard/logs/system/device-tracker.log"
+NEIGHBOR_POLL_INTERVAL = 10  # seconds between neighbor table polls
 
 # Setup logging
 logging.basicConfig(
@@ -37,6 +41,7 @@ class DeviceTracker:
         self.mac_oui_db = self.load_mac_oui_database()
         self.load_known_devices()
         self.init_device_table()
+        self.neighbor_watcher = NeighborWatcher(DB_PATH)
     
     def init_device_table(self):
         """Initialize device tracking table in database"""
@@ -69,6 +74,9 @@ class DeviceTracker:
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_ip ON devices(ip_address)")
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_last_seen ON devices(last_seen)")
             
+            # Dirty-set consumed by device_scorer.py
+            init_change_tables(cursor)
+            
             conn.commit()
             conn.close()
             logging.info("✓ Device tracking table initialized")
@@ -163,22 +171,8 @@ class DeviceTracker:
             logging.error(f"Error saving known devices: {e}")
     
     def get_arp_table(self):
-        """Get ARP table from system"""
-        arp_entries = {}
-        try:
-            with open('/proc/net/arp', 'r') as f:
-                lines = f.readlines()[1:]  # Skip header
-                for line in lines:
-                    parts = line.split()
-                    if len(parts) >= 4:
-                        ip = parts[0]
-                        mac = parts[3]
-                        if mac != '00:00:00:00:00:00' and mac != '<incomplete>':
-                            arp_entries[ip] = mac.upper()
-        except Exception as e:
-            logging.error(f"Error reading ARP table: {e}")
-        
-        return arp_entries
+        """Get cached IPv4 ARP + IPv6 neighbor table (re-read at most every poll interval)"""
+        return dict(self.neighbor_watcher.get_neighbors())
     
     def get_hostname(self, ip_address):
         """Resolve hostname for IP address"""
@@ -271,10 +265,11 @@ class DeviceTracker:
         
         return "Unknown", "Unknown"
     
-    def update_device(self, ip_address, mac_address=None, hostname=None, traffic_bytes=0):
+    def update_device(self, ip_address, mac_address=None, hostname=None, traffic_bytes=0, new_traffic=False):
         """Update or create device entry"""
         try:
             conn = sqlite3.connect(DB_PATH)
+            conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             
             now = datetime.now().isoformat()
@@ -313,6 +308,21 @@ class DeviceTracker:
                     WHERE ip_address = ?
                 """, (mac_address, hostname, vendor, device_type, device_category, 
                       now, traffic_bytes, ip_address))
+                
+                # Only flag the device for rescoring when a scoring input changed
+                if (mac_address and mac_address != existing['mac_address']) or \
+                   (hostname and hostname != existing['hostname']) or \
+                   vendor != existing['vendor'] or \
+                   device_type != existing['device_type'] or \
+                   device_category != existing['device_category']:
+                    mark_device_dirty(cursor, ip_address, REASON_IDENTITY_CHANGED)
+                
+                if existing['last_seen'] and \
+                   existing['last_seen'] < (datetime.now() - timedelta(hours=24)).isoformat():
+                    mark_device_dirty(cursor, ip_address, REASON_REACTIVATED)
+                
+                if new_traffic or traffic_bytes > 0:
+                    mark_device_dirty(cursor, ip_address, REASON_NEW_TRAFFIC)
             else:
                 # Insert new device (with or without MAC)
                 cursor.execute("""
@@ -323,6 +333,7 @@ class DeviceTracker:
                     ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1, ?)
                 """, (mac_address, ip_address, hostname, vendor, 
                       device_type, device_category, now, now, traffic_bytes))
+                mark_device_dirty(cursor, ip_address, REASON_NEW_DEVICE)
                 
                 logging.info(f"✓ New device discovered: {ip_address} {f'({vendor})' if vendor != 'Unknown' else ''} - {device_category}")
             
@@ -333,19 +344,43 @@ class DeviceTracker:
             logging.error(f"Error updating device: {e}")
     
     def scan_network(self):
-        """Scan network and update device registry"""
-        logging.info("Scanning network for devices...")
+        """Poll neighbor tables and push only changes into the device registry"""
+        events = self.neighbor_watcher.poll()
+        neighbors = self.neighbor_watcher.snapshot
         
-        # Get ARP table
-        arp_table = self.get_arp_table()
+        for event in events:
+            if event['type'] == EVENT_NEW:
+                self.update_device(event['ip'], event['mac'])
+            elif event['type'] == EVENT_MAC_CHANGED:
+                logging.warning(f"⚠ MAC change for {event['ip']}: {event['old_mac']} -> {event['mac']}")
+                self.update_device(event['ip'], event['mac'])
+            elif event['type'] == EVENT_GONE:
+                logging.info(f"Device left neighbor table: {event['ip']} ({event['mac']})")
         
-        # Update each device
-        for ip, mac in arp_table.items():
-            self.update_device(ip, mac)
+        # Unchanged neighbors only need their last_seen refreshed, unless their
+        # device row is gone (e.g. after the dashboard's flush cleared devices
+        # but not the neighbor history): those are registered again in full
+        changed = {event['ip'] for event in events}
+        present = [ip for ip in neighbors if ip not in changed]
+        missing = []
+        if present:
+            try:
+                conn = sqlite3.connect(DB_PATH)
+                known = {row[0] for row in conn.execute("SELECT ip_address FROM devices")}
+                conn.executemany("UPDATE devices SET last_seen = ? WHERE ip_address = ?",
+                                 [(datetime.now().isoformat(), ip) for ip in present if ip in known])
+                conn.commit()
+                conn.close()
+                missing = [ip for ip in present if ip not in known]
+            except Exception as e:
+                logging.error(f"Error refreshing last_seen: {e}")
+        for ip in missing:
+            self.update_device(ip, neighbors[ip])
         
-        logging.info(f"✓ Network scan complete. Found {len(arp_table)} devices")
+        if events:
+            logging.info(f"✓ Neighbor changes: {len(events)} event(s), {len(neighbors)} neighbors present")
         
-        return len(arp_table)
+        return len(neighbors)
     
     def get_all_devices(self):
         """Get all tracked devices"""
@@ -424,21 +459,23 @@ def main():
     for device in devices:
         logging.info(f"  {device['ip_address']:15} | {device['mac_address']:17} | {device['vendor']:20} | {device['device_category']}")
     
-    logging.info("\n✓ Starting continuous monitoring (scan every 60 seconds)...")
+    logging.info(f"\n✓ Starting continuous monitoring (neighbor poll every {NEIGHBOR_POLL_INTERVAL} seconds)...")
     
     # Continuous monitoring loop
-    scan_interval = 60  # Scan every 60 seconds
+    cycle = 0
     while True:
         try:
-            time.sleep(scan_interval)
+            time.sleep(NEIGHBOR_POLL_INTERVAL)
+            cycle += 1
             
-            # Scan network for new/updated devices
+            # Poll neighbor tables; only changes reach the device registry
             device_count = tracker.scan_network()
             
-            # Log summary
-            devices = tracker.get_all_devices()
-            active_count = len([d for d in devices if d['last_seen']])
-            logging.info(f"✓ Scan complete: {device_count} devices in ARP table, {active_count} total tracked devices")
+            # Log summary about once a minute
+            if cycle % max(1, 60 // NEIGHBOR_POLL_INTERVAL) == 0:
+                devices = tracker.get_all_devices()
+                active_count = len([d for d in devices if d['last_seen']])
+                logging.info(f"✓ Scan complete: {device_count} devices in neighbor table, {active_count} total tracked devices")
             
         except KeyboardInterrupt:
             logging.info("\n✓ Device tracker stopped by user")
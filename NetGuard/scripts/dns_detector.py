@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+NetGuard Pro - DNS Tunneling / DGA Detector
+Per-query entropy and label statistics plus per-registered-domain unique
+subdomain rates, kept incrementally in an LRU as DNS events arrive
+"""
+
+import math
+from collections import Counter, OrderedDict
+
+from cardinality import BucketedSketch, WINDOW_BUCKETS
+from domain_index import registered_domain
+
+MAX_DOMAINS = 50000  # registered domains tracked, least recently queried evicted
+DEFAULT_TIMEFRAME = 60  # the DNS tunneling rule passes its own timeframe_seconds
+DEFAULT_MAX_QUERY_LENGTH = 63
+DEFAULT_SUBDOMAIN_THRESHOLD = 50  # unique subdomains per domain per timeframe
+DEFAULT_ENTROPY_THRESHOLD = 3.5  # bits/char of the subdomain part
+LONG_LABEL = 40
+MAX_LABELS = 8
+
+VOWELS = set('aeiou')
+
+
+def shannon_entropy(text):
+    """Shannon entropy of a string in bits per character"""
+    if not text:
+        return 0.0
+    length = len(text)
+    return -sum(count / length * math.log2(count / length) for count in Counter(text).values())
+
+
+def query_features(query):
+    """Entropy and label statistics for one queried name"""
+    query = query.strip().lower().rstrip('.')
+    labels = query.split('.')
+    domain = registered_domain(query)
+    subdomain = query[:-len(domain)].rstrip('.') if domain and query != domain else ''
+    return {
+        'query': query,
+        'domain': domain,
+        'subdomain': subdomain,
+        'length': len(query),
+        'label_count': len(labels),
+        'longest_label': max(len(label) for label in labels),
+        'entropy': shannon_entropy(subdomain.replace('.', '')),
+    }
+
+
+def looks_generated(domain):
+    """Heuristic DGA check on the registrable label of a domain (e.g. xkqjwzvb in xkqjwzvb.com)"""
+    if not domain:
+        return False
+    label = domain.split('.')[0]
+    if len(label) < 8 or shannon_entropy(label) < 3.0:
+        return False
+    letters = [c for c in label if c.isalpha()]
+    digits = sum(c.isdigit() for c in label)
+    vowel_ratio = sum(c in VOWELS for c in letters) / len(letters) if letters else 0.0
+    consonant_run = longest = 0
+    for c in label:
+        consonant_run = consonant_run + 1 if c.isalpha() and c not in VOWELS else 0
+        longest = max(longest, consonant_run)
+    return vowel_ratio < 0.25 or longest >= 5 or 0.15 < digits / len(label) < 0.85
+
+
+class DomainStats:
+    """Incremental state for one registered domain
+
+    Entropy sums use the same time buckets as the subdomain sketch, so the
+    mean covers the window the unique count does and old history can't
+    dilute a fresh burst
+    """
+
+    __slots__ = ('subdomains', 'bucket_width', 'entropy_sums', 'entropy_counts', 'stamps')
+
+    def __init__(self, timeframe, buckets=WINDOW_BUCKETS):
+        self.subdomains = BucketedSketch(timeframe, buckets)
+        self.bucket_width = timeframe / buckets
+        self.entropy_sums = [0.0] * buckets
+        self.entropy_counts = [0] * buckets
+        self.stamps = [-1] * buckets
+
+    def add_entropy(self, ts, entropy):
+        bucket = int(ts // self.bucket_width)
+        slot = bucket % len(self.stamps)
+        if self.stamps[slot] != bucket:
+            if self.stamps[slot] > bucket:
+                return  # older than the window
+            self.entropy_sums[slot] = 0.0
+            self.entropy_counts[slot] = 0
+            self.stamps[slot] = bucket
+        self.entropy_sums[slot] += entropy
+        self.entropy_counts[slot] += 1
+
+    def mean_entropy(self, now):
+        newest = int(now // self.bucket_width)
+        oldest = newest - len(self.stamps)
+        total = count = 0
+        for entropy_sum, entropy_count, stamp in zip(self.entropy_sums, self.entropy_counts, self.stamps):
+            if oldest < stamp <= newest:
+                total += entropy_sum
+                count += entropy_count
+        return total / count if count else 0.0
+
+
+class DnsDetector:
+    """Scores DNS questions as they arrive; returns findings, never queries the DB"""
+
+    def __init__(self, max_query_length=DEFAULT_MAX_QUERY_LENGTH,
+                 subdomain_threshold=DEFAULT_SUBDOMAIN_THRESHOLD,
+                 entropy_threshold=DEFAULT_ENTROPY_THRESHOLD,
+                 timeframe=DEFAULT_TIMEFRAME, max_domains=MAX_DOMAINS):
+        self.max_query_length = max_query_length
+        self.subdomain_threshold = subdomain_threshold
+        self.entropy_threshold = entropy_threshold
+        self.timeframe = timeframe
+        self.max_domains = max_domains
+        self.domains = OrderedDict()
+
+    def domain_stats(self, domain):
+        stats = self.domains.get(domain)
+        if stats is None:
+            stats = self.domains[domain] = DomainStats(self.timeframe)
+            if len(self.domains) > self.max_domains:
+                self.domains.popitem(last=False)
+        else:
+            self.domains.move_to_end(domain)
+        return stats
+
+    def observe(self, query, ts):
+        """Fold one DNS question in; returns a list of finding dicts"""
+        features = query_features(query)
+        findings = []
+
+        # Long, label-heavy or deeply nested names only matter when they look encoded
+        if features['entropy'] >= self.entropy_threshold and (
+                features['length'] > self.max_query_length or
+                features['longest_label'] > LONG_LABEL or
+                features['label_count'] > MAX_LABELS):
+            findings.append({
+                'metric': 'dns_query_length',
+                'value': features['length'],
+                'threshold': self.max_query_length,
+                'domain': features['domain'],
+                'detail': (f"{features['query'][:80]} (entropy {features['entropy']:.2f}, "
+                           f"{features['label_count']} labels, longest {features['longest_label']})"),
+            })
+
+        if features['domain'] and features['subdomain']:
+            stats = self.domain_stats(features['domain'])
+            if stats.subdomains.add(ts, features['subdomain']):
+                # Mean entropy over unique subdomains only, so repeats don't dilute it
+                stats.add_entropy(ts, features['entropy'])
+                unique = stats.subdomains.total(ts)
+                mean_entropy = stats.mean_entropy(ts)
+                if unique > self.subdomain_threshold and mean_entropy >= self.entropy_threshold:
+                    findings.append({
+                        'metric': 'dns_unique_subdomains',
+                        'value': unique,
+                        'threshold': self.subdomain_threshold,
+                        'domain': features['domain'],
+                        'detail': (f"{int(unique)} unique subdomains of {features['domain']} in "
+                                   f"{self.timeframe:g}s (mean entropy {mean_entropy:.2f})"),
+                    })
+
+        return findings
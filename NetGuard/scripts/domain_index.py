@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+NetGuard Pro - Device Domain Communication Index
+Maintains (device_ip, registered_domain) -> frequency, first_seen, last_seen, bytes
+from DNS/TLS/HTTP fields as collectors ingest them, flushed as batched upserts
+"""
+
+import sqlite3
+import logging
+import time
+from datetime import datetime
+from functools import lru_cache
+
+FLUSH_INTERVAL = 60  # seconds between batched upserts
+
+# Multi-label public suffixes common on home/SMB networks. Anything not listed
+# is treated as a single-label suffix (example.com -> example.com).
+MULTI_LABEL_SUFFIXES = {
+    'co.uk', 'org.uk', 'ac.uk', 'gov.uk', 'ltd.uk', 'plc.uk', 'me.uk', 'net.uk',
+    'com.au', 'net.au', 'org.au', 'edu.au', 'gov.au',
+    'co.nz', 'org.nz', 'net.nz',
+    'co.jp', 'ne.jp', 'or.jp', 'ac.jp', 'go.jp',
+    'co.kr', 'or.kr', 'ne.kr',
+    'com.cn', 'net.cn', 'org.cn', 'gov.cn', 'edu.cn',
+    'com.hk', 'com.tw', 'com.sg', 'com.my',
+    'co.in', 'net.in', 'org.in', 'gov.in', 'ac.in',
+    'com.br', 'net.br', 'org.br', 'gov.br',
+    'com.mx', 'com.ar', 'com.tr', 'com.ua', 'com.pl',
+    'co.za', 'org.za', 'co.il', 'co.id', 'co.th',
+    # Hosting suffixes where each customer gets its own registrable name
+    'cloudfront.net', 'amazonaws.com', 'azurewebsites.net', 'cloudapp.net',
+    'herokuapp.com', 'github.io', 'appspot.com', 'firebaseapp.com',
+    'blogspot.com', 'duckdns.org', 'no-ip.org', 'ddns.net',
+}
+
+
+def _is_ip_literal(hostname):
+    """True for dotted IPv4 or bracketless IPv6 literals"""
+    if ':' in hostname:
+        return True
+    return all(part.isdigit() for part in hostname.split('.'))
+
+
+@lru_cache(maxsize=65536)
+def registered_domain(hostname):
+    """Normalize a hostname to its registered domain (eTLD+1)"""
+    if not hostname:
+        return None
+
+    hostname = hostname.strip().lower().rstrip('.')
+    # Host headers may carry a port
+    if hostname.count(':') == 1:
+        hostname = hostname.split(':')[0]
+
+    if not hostname or _is_ip_literal(hostname) or '.' not in hostname:
+        return None
+
+    labels = hostname.split('.')
+    if len(labels) >= 3 and '.'.join(labels[-2:]) in MULTI_LABEL_SUFFIXES:
+        return '.'.join(labels[-3:])
+    if len(labels) >= 4 and '.'.join(labels[-3:]) in MULTI_LABEL_SUFFIXES:
+        return '.'.join(labels[-4:])
+    return '.'.join(labels[-2:])
+
+
+def is_local_ip(ip_address):
+    """True for private/link-local addresses (the monitored devices)"""
+    if not ip_address:
+        return False
+    if ip_address.startswith(('192.168.', '10.', 'fe80:', 'fd')):
+        return True
+    if ip_address.startswith('172.'):
+        try:
+            return 16 <= int(ip_address.split('.')[1]) <= 31
+        except (IndexError, ValueError):
+            return False
+    return False
+
+
+def init_domain_table(cursor):
+    """Create the domain communication index table if missing"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS domain_communications (
+            device_ip TEXT NOT NULL,
+            domain TEXT NOT NULL,
+            frequency INTEGER DEFAULT 0,
+            bytes INTEGER DEFAULT 0,
+            first_seen TEXT,
+            last_seen TEXT,
+            risk_level INTEGER DEFAULT 0,
+            PRIMARY KEY (device_ip, domain)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_domain_comm_frequency ON domain_communications(frequency)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_domain_comm_last_seen ON domain_communications(last_seen)")
+
+
+class DomainIndex:
+    """In-memory accumulator for device -> domain communications"""
+
+    def __init__(self, db_path, flush_interval=FLUSH_INTERVAL):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.pending = {}
+        self.last_flush = time.time()
+
+        try:
+            conn = sqlite3.connect(self.db_path)
+            init_domain_table(conn.cursor())
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logging.error(f"Error initializing domain index table: {e}")
+
+    def record(self, src_ip, dest_ip, hostname, size=0, seen_at=None):
+        """Record one TLS SNI / HTTP host observation"""
+        domain = registered_domain(hostname)
+        if not domain:
+            return
+
+        # The local side of the conversation is the device
+        if is_local_ip(src_ip):
+            device_ip = src_ip
+        elif is_local_ip(dest_ip):
+            device_ip = dest_ip
+        else:
+            return
+        self._add(device_ip, domain, size, seen_at)
+
+    def record_query(self, src_ip, hostname, seen_at=None):
+        """Record one DNS question, credited to the device that asked
+
+        Callers pass questions only (dest_port 53 / Suricata type 'query'):
+        answers echo the name back and would credit the resolver instead
+        """
+        domain = registered_domain(hostname)
+        if domain and is_local_ip(src_ip):
+            self._add(src_ip, domain, 0, seen_at)
+
+    def _add(self, device_ip, domain, size, seen_at):
+        seen_at = seen_at or datetime.now().isoformat()
+        entry = self.pending.get((device_ip, domain))
+        if entry:
+            entry[0] += 1
+            entry[1] += size or 0
+            entry[2] = min(entry[2], seen_at)
+            entry[3] = max(entry[3], seen_at)
+        else:
+            self.pending[(device_ip, domain)] = [1, size or 0, seen_at, seen_at]
+
+        if time.time() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Upsert pending counts in one transaction"""
+        self.last_flush = time.time()
+        if not self.pending:
+            return 0
+
+        batch = self.pending
+        self.pending = {}
+
+        try:
+            conn = sqlite3.connect(self.db_path)
+            conn.executemany("""
+                INSERT INTO domain_communications
+                (device_ip, domain, frequency, bytes, first_seen, last_seen)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(device_ip, domain) DO UPDATE SET
+                    frequency = frequency + excluded.frequency,
+                    bytes = bytes + excluded.bytes,
+                    first_seen = MIN(first_seen, excluded.first_seen),
+                    last_seen = MAX(last_seen, excluded.last_seen)
+            """, [(device_ip, domain, count, size, first_seen, last_seen)
+                  for (device_ip, domain), (count, size, first_seen, last_seen) in batch.items()])
+            conn.commit()
+            conn.close()
+            logging.info(f"✓ Domain index: flushed {len(batch)} device/domain pairs")
+            return len(batch)
+        except Exception as e:
+            # Keep the counts for the next flush rather than dropping them
+            for key, (count, size, first_seen, last_seen) in batch.items():
+                entry = self.pending.setdefault(key, [0, 0, first_seen, last_seen])
+                entry[0] += count
+                entry[1] += size
+                entry[2] = min(entry[2], first_seen)
+                entry[3] = max(entry[3], last_seen)
+            logging.error(f"Error flushing domain index: {e}")
+            return 0
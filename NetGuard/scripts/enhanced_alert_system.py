@@ -9,14 +9,22 @@ import sqlite3
 import logging
 import json
 import time
-import subprocess
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
+from alert_manager import AlertManager, DEDUP_FLOW
+from device_changes import init_change_tables
+from storm_control import init_suppression_table
+from notifier import init_notification_table, load_notification_config, NotificationDispatcher
+from remediation import init_remediation_table, queue_remediation, RemediationWorker
+from event_bus import EventSubscriber
+from rule_engine import RuleEngine
+from domain_index import is_local_ip
 
 # Configuration
 DB_PATH = "/home/jarvis/NetGuard/network.db"
 LOG_DIR = "/home/jarvis/NetGuard/logs/system"
 ALERT_CONFIG_FILE = "/home/jarvis/NetGuard/config/alert_rules.json"
+SCAN_INTERVAL = 300  # seconds between periodic (non-streaming) threat scans
 
 os.makedirs(LOG_DIR, exist_ok=True)
 
@@ -38,11 +46,77 @@ SEVERITY_LEVELS = {
     'INFO': {'score': 10, 'color': '#2196f3', 'priority': 5}
 }
 
+# Alert type, title and remediation steps per streaming rule metric
+RULE_ALERTS = {
+    'connection_attempts': ('port_scan', 'Port Scan Detected from {key}', [
+        'Investigate the device behavior',
+        'Check if device is compromised',
+        'Consider network isolation',
+        'Block scanning IP if unauthorized'
+    ]),
+    'distinct_dest_ports': ('port_scan', 'Port Scan Detected from {key}', [
+        'Investigate the device behavior',
+        'Check if device is compromised',
+        'Consider network isolation',
+        'Block scanning IP if unauthorized'
+    ]),
+    'distinct_dest_ips': ('network_sweep', 'Network Sweep Detected from {key}', [
+        'Identify the process probing the network',
+        'Check if device is compromised',
+        'Consider network isolation'
+    ]),
+    'distinct_domains': ('domain_fanout', 'Unusual Domain Fan-out from {key}', [
+        'Review the resolved domains for generated (DGA) names',
+        'Check the device for malware',
+        'Monitor continued behavior'
+    ]),
+    'failed_login_attempts': ('brute_force', 'Brute Force Login Attempts from {key}', [
+        'Verify whether the login attempts are legitimate',
+        'Lock or rotate credentials on the targeted service',
+        'Block the source IP if unauthorized'
+    ]),
+    'outbound_bytes': ('unusual_traffic', 'Unusual Outbound Traffic from {key}', [
+        'Review device applications',
+        'Check for malware or compromised services',
+        'Verify connections are legitimate',
+        'Monitor continued behavior'
+    ]),
+    'dns_query_rate': ('dns_tunneling', 'Possible DNS Tunneling from {key}', [
+        'Review the queried domains',
+        'Check the device for data exfiltration tools',
+        'Consider blocking the destination domain'
+    ]),
+    'dns_query_length': ('dns_tunneling', 'Possible DNS Tunneling from {key}', [
+        'Review the queried domains',
+        'Check the device for data exfiltration tools',
+        'Consider blocking the destination domain'
+    ]),
+    'dns_unique_subdomains': ('dns_tunneling', 'Possible DNS Tunneling from {key}', [
+        'Review the queried domains',
+        'Check the device for data exfiltration tools',
+        'Consider blocking the destination domain'
+    ]),
+    'dga_domains': ('dga_domain', 'Generated Domain Lookups from {key}', [
+        'Check the device for malware using domain generation',
+        'Review the resolved domains',
+        'Consider network isolation'
+    ]),
+    'known_c2_ip_contacted': ('malware_c2', 'Known C2 Indicator Contacted by {key}', [
+        'Isolate the device from the network',
+        'Check the device for malware',
+        'Block the listed indicator at the firewall',
+        'Review other devices for the same indicator'
+    ]),
+}
+
 class EnhancedAlertSystem:
     def __init__(self):
         self.db_path = DB_PATH
         self.init_database()
         self.load_alert_rules()
+        self.notifications = load_notification_config()
+        self.alerts = AlertManager(self.db_path, storm_control=self.rule_config.get('storm_control'),
+                                   notify_sinks=self.notifications['sinks'] if self.notifications else None)
     
     def init_database(self):
         """Initialize the alerts database table"""
@@ -105,6 +179,12 @@ class EnhancedAlertSystem:
             )
         """)
         
+        # Dirty-set consumed by device_scorer.py
+        init_change_tables(cursor)
+        init_suppression_table(cursor)
+        init_notification_table(cursor)
+        init_remediation_table(cursor)
+        
         conn.commit()
         conn.close()
         logging.info("✓ Alert system database initialized")
@@ -116,12 +196,30 @@ class EnhancedAlertSystem:
                 {
                     "name": "Port_Scan_Detection",
                     "type": "behavioral",
-                    "condition": "connection_attempts > threshold in timeframe",
+                    "condition": "distinct_dest_ports > threshold in timeframe",
                     "threshold": 20,
                     "timeframe_seconds": 60,
                     "severity": "HIGH",
                     "auto_remediation": True
                 },
+                {
+                    "name": "Network_Sweep_Detection",
+                    "type": "behavioral",
+                    "condition": "distinct_dest_ips > threshold in timeframe",
+                    "threshold": 50,
+                    "timeframe_seconds": 60,
+                    "severity": "HIGH",
+                    "auto_remediation": False
+                },
+                {
+                    "name": "Domain_Fanout_Detection",
+                    "type": "behavioral",
+                    "condition": "distinct_domains > threshold in timeframe",
+                    "threshold": 200,
+                    "timeframe_seconds": 300,
+                    "severity": "MEDIUM",
+                    "auto_remediation": False
+                },
                 {
                     "name": "Brute_Force_Attack",
                     "type": "authentication",
@@ -152,6 +250,8 @@ class EnhancedAlertSystem:
                     "type": "malware",
                     "condition": "known_c2_ip_contacted",
                     "severity": "CRITICAL",
+                    "timeframe_seconds": 3600,
+                    "feeds_dir": "/home/jarvis/NetGuard/config/threat_intel",
                     "auto_remediation": True
                 },
                 {
@@ -159,10 +259,39 @@ class EnhancedAlertSystem:
                     "type": "exfiltration",
                     "condition": "dns_query_length > threshold or dns_query_rate > threshold",
                     "threshold": 63,
+                    "rate_threshold": 100,
+                    "timeframe_seconds": 60,
+                    "subdomain_threshold": 50,
+                    "entropy_threshold": 3.5,
+                    "severity": "HIGH",
+                    "auto_remediation": False
+                },
+                {
+                    "name": "DGA_Domain_Detection",
+                    "type": "malware",
+                    "condition": "dga_domains > threshold in timeframe",
+                    "threshold": 10,
+                    "timeframe_seconds": 300,
                     "severity": "HIGH",
                     "auto_remediation": False
                 }
-            ]
+            ],
+            "event_sources": {
+                "packets": ["tcpdump"],
+                "dns": ["tcpdump", "tshark", "suricata"],
+                "auth": ["suricata"],
+                "intel": ["tcpdump", "tshark", "suricata"]
+            },
+            "storm_control": {
+                "rule_rate_per_minute": 30,
+                "rule_burst": 20,
+                "source_rate_per_minute": 6,
+                "source_burst": 5
+            },
+            "remediation": {
+                "backend": "iptables",
+                "batch_size": 256
+            }
         }
         
         # Create default config if not exists
@@ -173,77 +302,33 @@ class EnhancedAlertSystem:
             logging.info(f"✓ Created default alert rules: {ALERT_CONFIG_FILE}")
         
         with open(ALERT_CONFIG_FILE, 'r') as f:
-            self.rules = json.load(f)['rules']
+            self.rule_config = json.load(f)
+        self.rules = self.rule_config['rules']
     
     def create_alert(self, severity: str, alert_type: str, title: str, 
                      description: str, source_ip: Optional[str] = None,
                      dest_ip: Optional[str] = None, affected_devices: Optional[List[str]] = None,
                      threat_indicators: Optional[List[str]] = None,
                      remediation_steps: Optional[List[str]] = None,
-                     auto_remediation_cmd: Optional[str] = None) -> str:
-        """Create a new security alert"""
-        
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        # Generate unique alert ID
-        alert_id = f"ALERT-{datetime.now().strftime('%Y%m%d%H%M%S')}-{alert_type[:4].upper()}"
-        
-        # Check if similar alert exists (deduplication)
-        cursor.execute("""
-            SELECT id, alert_id, recurrence_count FROM security_alerts
-            WHERE alert_type = ? AND source_ip = ? AND status = 'active'
-            AND created_at > datetime('now', '-1 hour')
-        """, (alert_type, source_ip))
-        
-        existing = cursor.fetchone()
-        
-        if existing:
-            # Update recurrence count
-            cursor.execute("""
-                UPDATE security_alerts
-                SET recurrence_count = recurrence_count + 1,
-                    last_seen = CURRENT_TIMESTAMP,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE id = ?
-            """, (existing['id'],))
-            alert_id = existing['alert_id']
-            logging.info(f"Updated existing alert {alert_id} (recurrence: {existing['recurrence_count'] + 1})")
-        else:
-            # Create new alert
-            cursor.execute("""
-                INSERT INTO security_alerts (
-                    alert_id, severity, alert_type, title, description,
-                    source_ip, dest_ip, affected_devices, threat_indicators,
-                    remediation_steps, auto_remediation_available,
-                    auto_remediation_command
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                alert_id, severity, alert_type, title, description,
-                source_ip, dest_ip,
-                json.dumps(affected_devices) if affected_devices else None,
-                json.dumps(threat_indicators) if threat_indicators else None,
-                json.dumps(remediation_steps) if remediation_steps else None,
-                1 if auto_remediation_cmd else 0,
-                auto_remediation_cmd
-            ))
-            
-            # Log to alert history
-            cursor.execute("""
-                INSERT INTO alert_history (alert_id, action, action_by, notes)
-                VALUES (?, 'created', 'system', ?)
-            """, (alert_id, f"Alert created: {title}"))
-            
+                     auto_remediation_cmd: Optional[str] = None,
+                     dedup_scope: str = DEDUP_FLOW) -> str:
+        """Create a new security alert, or count a recurrence of an active one"""
+        alert_id, is_new = self.alerts.submit(
+            severity, alert_type, title, description, source_ip, dest_ip,
+            affected_devices, threat_indicators, remediation_steps, auto_remediation_cmd,
+            dedup_scope)
+        
+        if alert_id is None:
+            logging.debug(f"Suppressed {alert_type} alert from {source_ip} (storm control)")
+        elif is_new:
             logging.warning(f"🚨 NEW ALERT [{severity}]: {title} ({alert_id})")
         
-        conn.commit()
-        conn.close()
-        
         return alert_id
     
     def resolve_alert(self, alert_id: str, resolved_by: str = 'user', notes: Optional[str] = None):
         """Mark an alert as resolved"""
+        self.alerts.flush()
+        self.alerts.forget(alert_id)
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
@@ -265,14 +350,18 @@ class EnhancedAlertSystem:
         conn.close()
         logging.info(f"✓ Alert {alert_id} resolved by {resolved_by}")
     
-    def execute_auto_remediation(self, alert_id: str) -> bool:
-        """Execute automatic remediation for an alert"""
+    def execute_auto_remediation(self, alert_id: str, requested_by: str = 'system') -> Optional[str]:
+        """Queue automatic remediation for an alert; returns the job ID
+        
+        The remediation worker runs the job and resolves the alert on success
+        """
+        self.alerts.flush()
         conn = sqlite3.connect(self.db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
         cursor.execute("""
-            SELECT alert_id, title, auto_remediation_command, source_ip
+            SELECT alert_id, auto_remediation_command
             FROM security_alerts
             WHERE alert_id = ? AND auto_remediation_available = 1
         """, (alert_id,))
@@ -281,55 +370,19 @@ class EnhancedAlertSystem:
         
         if not alert or not alert['auto_remediation_command']:
             logging.error(f"No auto-remediation available for {alert_id}")
-            return False
-        
-        try:
-            # Execute remediation command
-            cmd = alert['auto_remediation_command']
-            logging.info(f"Executing auto-remediation for {alert_id}: {cmd}")
-            
-            result = subprocess.run(
-                cmd, shell=True, capture_output=True, text=True, timeout=30
-            )
-            
-            success = result.returncode == 0
-            
-            # Log action
-            cursor.execute("""
-                INSERT INTO alert_history (alert_id, action, action_by, notes)
-                VALUES (?, 'auto_remediation', 'system', ?)
-            """, (alert_id, f"Command executed: {cmd}\nResult: {result.stdout or result.stderr}"))
-            
-            if success:
-                # Mark as resolved
-                cursor.execute("""
-                    UPDATE security_alerts
-                    SET status = 'resolved',
-                        resolved_at = CURRENT_TIMESTAMP,
-                        resolved_by = 'auto_remediation',
-                        updated_at = CURRENT_TIMESTAMP
-                    WHERE alert_id = ?
-                """, (alert_id,))
-                logging.info(f"✓ Auto-remediation successful for {alert_id}")
-            else:
-                logging.error(f"✗ Auto-remediation failed for {alert_id}: {result.stderr}")
-            
-            conn.commit()
-            return success
-            
-        except Exception as e:
-            logging.error(f"Error executing auto-remediation for {alert_id}: {e}")
-            cursor.execute("""
-                INSERT INTO alert_history (alert_id, action, action_by, notes)
-                VALUES (?, 'auto_remediation_failed', 'system', ?)
-            """, (alert_id, str(e)))
-            conn.commit()
-            return False
-        finally:
             conn.close()
+            return None
+        
+        job_id = queue_remediation(cursor, alert_id, alert['auto_remediation_command'], requested_by)
+        conn.commit()
+        conn.close()
+        logging.info(f"Queued auto-remediation for {alert_id}: job {job_id}")
+        return job_id
     
     def mark_false_positive(self, alert_id: str, marked_by: str = 'user'):
         """Mark an alert as a false positive"""
+        self.alerts.flush()
+        self.alerts.forget(alert_id)
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
@@ -443,6 +496,38 @@ class EnhancedAlertSystem:
             'auto_remediation': remediation_stats
         }
     
+    def handle_rule_match(self, match: Dict):
+        """Turn a streaming rule engine match into an alert"""
+        alert_type, title, steps = RULE_ALERTS.get(
+            match['metric'], ('rule_match', '{rule} triggered by {key}', []))
+        key = match['key']
+        if 'remote_ip' in match:
+            # Intel match: key is the local device that made contact, so only the
+            # listed remote address may be blocked. DNS-question hits have none
+            # (the packet went to the resolver) and get no automatic command
+            remote = match['remote_ip']
+            block_ip = remote if remote and not is_local_ip(remote) else None
+        else:
+            block_ip = key
+        
+        self.create_alert(
+            severity=match['severity'],
+            alert_type=alert_type,
+            title=title.format(rule=match['rule'], key=key),
+            description=match.get('description') or (f"{match['metric']} = {int(match['value'])} "
+                                                     f"(threshold {match['threshold']} in {match['timeframe']:g}s)"),
+            source_ip=key,
+            # Aggregate rules (windows, distinct counts) span many destinations; the
+            # packet that crossed the threshold says nothing about the alert
+            dest_ip=match.get('remote_ip'),
+            threat_indicators=[f"{match['metric']}: {int(match['value'])}", f"rule: {match['rule']}"]
+                              + [match[field] for field in ('domain', 'detail') if match.get(field)],
+            remediation_steps=steps,
+            auto_remediation_cmd=(f'sudo iptables -A INPUT -s {block_ip} -j DROP'
+                                  if match['auto_remediation'] and block_ip else None),
+            dedup_scope=match['dedup_scope']
+        )
+    
     def scan_for_threats(self):
         """Scan recent data for threats and generate alerts"""
         logging.info("Scanning for security threats...")
@@ -451,40 +536,10 @@ class EnhancedAlertSystem:
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
-        # 1. Check for port scanning
-        cursor.execute("""
-            SELECT src_ip, COUNT(DISTINCT dest_port) as port_count
-            FROM (
-                SELECT name FROM sqlite_master 
-                WHERE type='table' AND name LIKE 'tcpdump_%'
-                AND name NOT LIKE '%_template'
-                ORDER BY name DESC LIMIT 1
-            ) AS latest_table,
-            (SELECT * FROM tcpdump ORDER BY timestamp DESC LIMIT 1000)
-            WHERE timestamp > datetime('now', '-5 minutes')
-            AND src_ip LIKE '192.168.%'
-            GROUP BY src_ip
-            HAVING port_count > 20
-        """)
-        
-        for row in cursor.fetchall():
-            self.create_alert(
-                severity='HIGH',
-                alert_type='port_scan',
-                title=f'Port Scan Detected from {row["src_ip"]}',
-                description=f'Device scanned {row["port_count"]} ports in the last 5 minutes',
-                source_ip=row['src_ip'],
-                threat_indicators=[f'{row["port_count"]} ports scanned'],
-                remediation_steps=[
-                    'Investigate the device behavior',
-                    'Check if device is compromised',
-                    'Consider network isolation',
-                    'Block scanning IP if unauthorized'
-                ],
-                auto_remediation_cmd=f'sudo iptables -A INPUT -s {row["src_ip"]} -j DROP'
-            )
+        # Port scans, brute force, outbound volume and DNS tunneling are
+        # evaluated as events arrive by the rule engine (see handle_rule_match)
         
-        # 2. Check for IoT vulnerabilities
+        # Check for IoT vulnerabilities
         cursor.execute("""
             SELECT device_ip, device_mac, COUNT(*) as vuln_count,
                    GROUP_CONCAT(vulnerability_type) as vulns
@@ -511,42 +566,6 @@ class EnhancedAlertSystem:
                 ]
             )
         
-        # 3. Check for suspicious outbound connections
-        cursor.execute("""
-            SELECT src_ip, COUNT(*) as conn_count, 
-                   GROUP_CONCAT(DISTINCT dest_ip) as destinations
-            FROM (
-                SELECT name FROM sqlite_master 
-                WHERE type='table' AND name LIKE 'tcpdump_%'
-                AND name NOT LIKE '%_template'
-                ORDER BY name DESC LIMIT 1
-            ) AS latest_table,
-            (SELECT * FROM tcpdump ORDER BY timestamp DESC LIMIT 5000)
-            WHERE timestamp > datetime('now', '-5 minutes')
-            AND src_ip LIKE '192.168.%'
-            AND dest_ip NOT LIKE '192.168.%'
-            AND dest_ip NOT LIKE '10.%'
-            AND dest_ip NOT LIKE '172.%'
-            GROUP BY src_ip
-            HAVING conn_count > 50
-        """)
-        
-        for row in cursor.fetchall():
-            self.create_alert(
-                severity='MEDIUM',
-                alert_type='unusual_traffic',
-                title=f'Unusual Outbound Traffic from {row["src_ip"]}',
-                description=f'Device made {row["conn_count"]} external connections in 5 minutes',
-                source_ip=row['src_ip'],
-                threat_indicators=[f'{row["conn_count"]} connections to external IPs'],
-                remediation_steps=[
-                    'Review device applications',
-                    'Check for malware or compromised services',
-                    'Verify connections are legitimate',
-                    'Monitor continued behavior'
-                ]
-            )
-        
         conn.close()
         logging.info("✓ Threat scan completed")
 
@@ -559,8 +578,36 @@ def main():
     logging.info("============================================================")
     logging.info("Monitoring for security threats...")
     
+    engine = RuleEngine(alert_system.rule_config, alert_system.handle_rule_match)
+    try:
+        subscriber = EventSubscriber()
+    except OSError as e:
+        logging.error(f"Event bus unavailable, streaming rules disabled: {e}")
+        subscriber = None
+    
+    # Delivery runs on its own event loop so detection never waits on a sink
+    if alert_system.notifications:
+        NotificationDispatcher(alert_system.db_path, alert_system.notifications).start()
+    
+    # Firewall changes queued by the dashboard and rules, applied in batches
+    RemediationWorker(alert_system.db_path, alert_system.rule_config.get('remediation')).start()
+    
     cycle = 0
+    last_scan = 0
     while True:
+        # Streaming rules: evaluate collector events as they arrive
+        if subscriber:
+            try:
+                engine.process(subscriber.receive(timeout=1.0))
+            except Exception as e:
+                logging.error(f"Error processing events: {e}")
+        else:
+            time.sleep(1)
+        alert_system.alerts.flush_if_due()
+        
+        if time.time() - last_scan < SCAN_INTERVAL:
+            continue
+        last_scan = time.time()
         cycle += 1
         logging.info(f"\n--- Alert Scan Cycle {cycle} ---")
         
@@ -572,12 +619,10 @@ def main():
             stats = alert_system.get_alert_statistics()
             logging.info(f"Active alerts: {stats['severity_counts']}")
             logging.info(f"Recent 24h: {stats['recent_24h']} alerts")
+            logging.info(f"Rule engine: {engine.events_processed} events, {engine.matches} matches")
             
         except Exception as e:
             logging.error(f"Error in alert cycle: {e}")
-        
-        # Wait 5 minutes
-        time.sleep(300)
 
 if __name__ == "__main__":
     main()
@@ -11,11 +11,35 @@ import sqlite3
 import logging
 import time
 from datetime import datetime, timedelta
+from time_window import TimeWindow
+from device_changes import init_change_tables, mark_device_dirty, REASON_NEW_VULNERABILITY
 
 # Configuration
 DB_PATH = "/home/jarvis/NetGuard/network.db"
 LOG_FILE = "/home/jarvis/NetGuard/logs/system/enhanced-iot-scanner.log"
 SCAN_INTERVAL = 300  # 5 minutes
+TRAFFIC_WINDOW_MINUTES = 60  # Traffic window evaluated by each scan
+
+# Vulnerability rules evaluated in memory against per-device traffic counts
+# (severity: 1=critical ... 4=low)
+VULNERABILITY_RULES = [
+    {
+        'type': 'unencrypted_http',
+        'metric': 'http_count',
+        'threshold': 0,
+        'severity': 3,
+        'description': 'Device using unencrypted HTTP traffic ({value} packets)',
+        'recommendation': 'Enable HTTPS encryption for all communications'
+    },
+    {
+        'type': 'excessive_external_connections',
+        'metric': 'external_count',
+        'threshold': 50,
+        'severity': 2,
+        'description': 'Device making many external connections ({value})',
+        'recommendation': 'Review device behavior and block unnecessary external access'
+    }
+]
 
 # Setup logging
 os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
@@ -114,6 +138,9 @@ class EnhancedIoTSecurityScanner:
                 )
             """)
             
+            # Dirty-set consumed by device_scorer.py
+            init_change_tables(cursor)
+            
             conn.commit()
             conn.close()
             logging.info("✓ IoT security database tables initialized")
@@ -150,153 +177,79 @@ class EnhancedIoTSecurityScanner:
             logging.error(f"Error getting IoT devices: {e}")
             return []
     
-    def scan_device_vulnerabilities(self, device):
-        """Scan device for basic vulnerabilities"""
-        vulnerabilities = []
-        device_ip = device['ip_address']
+    def get_traffic_counts(self, cursor, device_ips, window):
+        """Per-IP HTTP and external connection counts for all devices in one grouped query
+
+        Reads tcpdump only: tshark captures the same packets, so adding its
+        tables would count every packet twice
+        """
+        counts = {ip: {'http_count': 0, 'external_count': 0} for ip in device_ips}
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS iot_scan_targets (ip TEXT PRIMARY KEY)")
+        cursor.execute("DELETE FROM iot_scan_targets")
+        cursor.executemany("INSERT OR IGNORE INTO iot_scan_targets (ip) VALUES (?)",
+                           [(ip,) for ip in device_ips])
         
-        try:
-            # Check for common IoT vulnerabilities
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            
-            # Check for unencrypted HTTP traffic
-            cursor.execute("""
-                SELECT COUNT(*) as http_count
-                FROM (
-                    SELECT name FROM sqlite_master 
-                    WHERE type='table' AND name LIKE 'tcpdump_%'
-                    ORDER BY name DESC LIMIT 1
-                ) AS latest_table,
-                (SELECT * FROM tcpdump 
-                 WHERE (src_ip = ? OR dest_ip = ?)
-                 AND dest_port = 80
-                 AND timestamp > datetime('now', '-1 hour')
-                 LIMIT 100)
-            """, (device_ip, device_ip))
-            
-            http_count = cursor.fetchone()[0] if cursor.fetchone() else 0
-            
-            if http_count > 0:
-                vulnerabilities.append({
-                    'type': 'unencrypted_http',
-                    'severity': 3,
-                    'description': f'Device using unencrypted HTTP traffic ({http_count} packets)',
-                    'recommendation': 'Enable HTTPS encryption for all communications'
-                })
-            
-            # Check for suspicious outbound connections
-            cursor.execute("""
-                SELECT COUNT(*) as external_count
-                FROM (
-                    SELECT name FROM sqlite_master 
-                    WHERE type='table' AND name LIKE 'tcpdump_%'
-                    ORDER BY name DESC LIMIT 1
-                ) AS latest_table,
-                (SELECT * FROM tcpdump 
-                 WHERE src_ip = ?
-                 AND dest_ip NOT LIKE '192.168.%'
-                 AND dest_ip NOT LIKE '10.%'
-                 AND dest_ip NOT LIKE '172.%'
-                 AND timestamp > datetime('now', '-1 hour')
-                 LIMIT 100)
-            """, (device_ip,))
-            
-            external_count = cursor.fetchone()[0] if cursor.fetchone() else 0
-            
-            if external_count > 50:
+        source = window.source(cursor.connection, 'tcpdump', ['src_ip', 'dest_ip', 'dest_port'])
+        if not source or not device_ips:
+            return counts
+        
+        cursor.execute(f"""
+            WITH packets AS {source}
+            SELECT ip, SUM(is_http) AS http_count, SUM(is_external) AS external_count
+            FROM (
+                SELECT src_ip AS ip,
+                       dest_port = 80 AS is_http,
+                       (dest_ip NOT LIKE '192.168.%' AND dest_ip NOT LIKE '10.%'
+                        AND dest_ip NOT LIKE '172.%') AS is_external
+                FROM packets
+                WHERE src_ip IN (SELECT ip FROM iot_scan_targets)
+                UNION ALL
+                SELECT dest_ip AS ip, dest_port = 80 AS is_http, 0 AS is_external
+                FROM packets
+                WHERE dest_ip IN (SELECT ip FROM iot_scan_targets)
+                AND src_ip IS NOT dest_ip
+            )
+            GROUP BY ip
+        """, window.params)
+        
+        for ip, http_count, external_count in cursor.fetchall():
+            counts[ip] = {'http_count': http_count or 0, 'external_count': external_count or 0}
+        
+        return counts
+    
+    def evaluate_rules(self, traffic):
+        """Evaluate every vulnerability rule against a device's traffic counts"""
+        vulnerabilities = []
+        for rule in VULNERABILITY_RULES:
+            value = traffic.get(rule['metric'], 0)
+            if value > rule['threshold']:
                 vulnerabilities.append({
-                    'type': 'excessive_external_connections',
-                    'severity': 2,
-                    'description': f'Device making many external connections ({external_count})',
-                    'recommendation': 'Review device behavior and block unnecessary external access'
+                    'type': rule['type'],
+                    'severity': rule['severity'],
+                    'description': rule['description'].format(value=value),
+                    'recommendation': rule['recommendation']
                 })
-            
-            conn.close()
-            
-        except Exception as e:
-            logging.error(f"Error scanning device {device_ip}: {e}")
-        
         return vulnerabilities
     
-    def generate_security_score(self, device_ip):
-        """Generate security score for device"""
-        try:
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            
-            # Count vulnerabilities
-            cursor.execute("""
-                SELECT COUNT(*) as vuln_count, MAX(severity) as max_severity
-                FROM iot_vulnerabilities
-                WHERE device_ip = ? AND resolved = 0
-            """, (device_ip,))
-            
-            result = cursor.fetchone()
-            vuln_count = result[0] if result else 0
-            max_severity = result[1] if result and result[1] else 0
-            
-            # Calculate base score
-            base_score = 100
-            
-            # Deduct for vulnerabilities
-            if max_severity == 1:  # Critical
-                base_score -= 50
-            elif max_severity == 2:  # High
-                base_score -= 30
-            elif max_severity == 3:  # Medium
-                base_score -= 15
-            elif max_severity == 4:  # Low
-                base_score -= 5
-            
-            # Deduct for multiple vulnerabilities
-            base_score -= min(20, vuln_count * 5)
-            
-            final_score = max(0, base_score)
-            
-            # Store score
-            cursor.execute("""
-                INSERT OR REPLACE INTO iot_security_scores
-                (device_ip, overall_score, vulnerability_score, communication_score, behavioral_score)
-                VALUES (?, ?, ?, ?, ?)
-            """, (device_ip, final_score, final_score, 80, 85))
-            
-            conn.commit()
-            conn.close()
-            
-            return final_score
-            
-        except Exception as e:
-            logging.error(f"Error generating security score for {device_ip}: {e}")
-            return 50
-    
-    def simulate_domain_communications(self, device_ip):
-        """Simulate domain communication patterns"""
-        try:
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            
-            # Common IoT domains
-            domains = [
-                ('amazon.com', 0),
-                ('google.com', 0),
-                ('microsoft.com', 0),
-                ('cloudflare.com', 0),
-                ('akamai.net', 1)
-            ]
-            
-            for domain, risk_level in domains:
-                cursor.execute("""
-                    INSERT OR REPLACE INTO iot_domain_patterns
-                    (device_ip, domain, frequency, last_seen, risk_level)
-                    VALUES (?, ?, COALESCE((SELECT frequency + 1 FROM iot_domain_patterns WHERE device_ip = ? AND domain = ?), 1), CURRENT_TIMESTAMP, ?)
-                """, (device_ip, domain, device_ip, domain, risk_level))
-            
-            conn.commit()
-            conn.close()
-            
-        except Exception as e:
-            logging.error(f"Error simulating domain communications for {device_ip}: {e}")
+    def calculate_security_score(self, vuln_count, max_severity):
+        """Calculate security score from unresolved vulnerability stats"""
+        # Calculate base score
+        base_score = 100
+        
+        # Deduct for vulnerabilities
+        if max_severity == 1:  # Critical
+            base_score -= 50
+        elif max_severity == 2:  # High
+            base_score -= 30
+        elif max_severity == 3:  # Medium
+            base_score -= 15
+        elif max_severity == 4:  # Low
+            base_score -= 5
+        
+        # Deduct for multiple vulnerabilities
+        base_score -= min(20, vuln_count * 5)
+        
+        return max(0, base_score)
     
     def run_security_scan(self):
         """Run comprehensive security scan"""
@@ -304,22 +257,37 @@ class EnhancedIoTSecurityScanner:
         
         devices = self.get_iot_devices()
         logging.info(f"Found {len(devices)} IoT devices to scan")
+        if not devices:
+            logging.info("Enhanced IoT security scan completed")
+            return
+        
+        device_ips = [device['ip_address'] for device in devices]
+        window = TimeWindow(TRAFFIC_WINDOW_MINUTES)
         
-        for device in devices:
-            device_ip = device['ip_address']
-            logging.info(f"Scanning device: {device_ip}")
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+        
+        try:
+            # One grouped pass over the traffic window for every device
+            traffic = self.get_traffic_counts(cursor, device_ips, window)
             
-            # Scan for vulnerabilities
-            vulnerabilities = self.scan_device_vulnerabilities(device)
+            # Unresolved findings already on record, so rescans don't duplicate them
+            cursor.execute("""
+                SELECT device_ip, vulnerability_type FROM iot_vulnerabilities
+                WHERE resolved = 0 AND device_ip IN (SELECT ip FROM iot_scan_targets)
+            """)
+            known = set(cursor.fetchall())
             
-            # Store vulnerabilities
-            if vulnerabilities:
-                conn = sqlite3.connect(DB_PATH)
-                cursor = conn.cursor()
+            new_findings = 0
+            for device in devices:
+                device_ip = device['ip_address']
+                vulnerabilities = self.evaluate_rules(traffic[device_ip])
                 
                 for vuln in vulnerabilities:
+                    if (device_ip, vuln['type']) in known:
+                        continue
                     cursor.execute("""
-                        INSERT OR IGNORE INTO iot_vulnerabilities
+                        INSERT INTO iot_vulnerabilities
                         (device_ip, device_mac, device_type, vulnerability_type, severity, description, recommendation)
                         VALUES (?, ?, ?, ?, ?, ?, ?)
                     """, (
@@ -331,17 +299,40 @@ class EnhancedIoTSecurityScanner:
                         vuln['description'],
                         vuln['recommendation']
                     ))
+                    known.add((device_ip, vuln['type']))
+                    mark_device_dirty(cursor, device_ip, REASON_NEW_VULNERABILITY)
+                    new_findings += 1
                 
-                conn.commit()
-                conn.close()
-                logging.info(f"Found {len(vulnerabilities)} vulnerabilities on {device_ip}")
+                if vulnerabilities:
+                    logging.info(f"Found {len(vulnerabilities)} vulnerabilities on {device_ip}")
             
-            # Generate security score
-            score = self.generate_security_score(device_ip)
-            logging.info(f"Security score for {device_ip}: {score}")
+            # Scores for every device from one grouped query
+            cursor.execute("""
+                SELECT device_ip, COUNT(*) as vuln_count, MAX(severity) as max_severity
+                FROM iot_vulnerabilities
+                WHERE resolved = 0 AND device_ip IN (SELECT ip FROM iot_scan_targets)
+                GROUP BY device_ip
+            """)
+            vuln_stats = {row[0]: (row[1], row[2] or 0) for row in cursor.fetchall()}
+            
+            for device_ip in device_ips:
+                vuln_count, max_severity = vuln_stats.get(device_ip, (0, 0))
+                score = self.calculate_security_score(vuln_count, max_severity)
+                cursor.execute("""
+                    INSERT OR REPLACE INTO iot_security_scores
+                    (device_ip, overall_score, vulnerability_score, communication_score, behavioral_score)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (device_ip, score, score, 80, 85))
+                logging.info(f"Security score for {device_ip}: {score}")
             
-            # Simulate domain communications
-            self.simulate_domain_communications(device_ip)
+            conn.commit()
+            logging.info(f"Persisted {new_findings} new findings and {len(device_ips)} scores")
+            
+        except Exception as e:
+            conn.rollback()
+            logging.error(f"Error during security scan: {e}")
+        finally:
+            conn.close()
         
         logging.info("Enhanced IoT security scan completed")
     
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+NetGuard Pro - Collector Event Bus
+Normalized packet/DNS/HTTP/TLS/flow events published by the collectors over a
+local Unix datagram socket; a full subscriber queue makes the publisher wait
+(up to SEND_TIMEOUT per batch) rather than drop events
+"""
+
+import os
+import json
+import socket
+import logging
+from datetime import datetime
+
+EVENT_SOCKET = "/home/jarvis/NetGuard/run/events.sock"
+MAX_BATCH_EVENTS = 200  # events per datagram (~50KB)
+SEND_TIMEOUT = 2.0  # seconds a batch may wait for room in the subscriber's queue
+
+# Normalized event kinds
+KIND_PACKET = 'packet'
+KIND_DNS = 'dns'
+KIND_HTTP = 'http'
+KIND_TLS = 'tls'
+KIND_FLOW = 'flow'
+KIND_FTP = 'ftp'
+
+
+def to_epoch(value):
+    """Best-effort conversion of collector timestamps to epoch seconds"""
+    if value is None or value == '':
+        return datetime.now().timestamp()
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        # Suricata: 2025-10-12T05:00:24.123456-0400
+        return datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%f%z').timestamp()
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        return datetime.now().timestamp()
+
+
+def packet_event(source, packet, ts=None):
+    """Normalize a decoded packet row (tcpdump/tshark column names)"""
+    event = {
+        'kind': KIND_PACKET,
+        'source': source,
+        'ts': to_epoch(ts),
+        'src_ip': packet.get('src_ip'),
+        'dest_ip': packet.get('dest_ip'),
+        'src_port': packet.get('src_port'),
+        'dest_port': packet.get('dest_port'),
+        'protocol': packet.get('protocol'),
+        'bytes': packet.get('frame_length') or packet.get('length') or 0,
+        'syn': 1 if packet.get('tcp_syn') else 0,
+        'ack': 1 if packet.get('tcp_ack') else 0,
+        'rst': 1 if packet.get('tcp_rst') else 0,
+    }
+    # Application-layer fields only when present, to keep datagrams small
+    for key in ('dns_query', 'http_host', 'tls_server_name'):
+        if packet.get(key):
+            event[key] = packet[key]
+    status = packet.get('http_status_code') or packet.get('http_response_code')
+    if status:
+        event['http_status'] = status
+    return event
+
+
+def suricata_event(eve):
+    """Normalize a Suricata EVE record; None for types the bus doesn't carry"""
+    event_type = eve.get('event_type')
+    event = {
+        'source': 'suricata',
+        'ts': to_epoch(eve.get('timestamp')),
+        'src_ip': eve.get('src_ip'),
+        'dest_ip': eve.get('dest_ip'),
+        'src_port': eve.get('src_port'),
+        'dest_port': eve.get('dest_port'),
+        'protocol': eve.get('proto'),
+    }
+
+    if event_type == 'dns':
+        event['kind'] = KIND_DNS
+        event['dns_query'] = eve.get('dns', {}).get('rrname')
+        event['dns_type'] = eve.get('dns', {}).get('type')
+    elif event_type == 'http':
+        http = eve.get('http', {})
+        event['kind'] = KIND_HTTP
+        event['http_host'] = http.get('hostname')
+        event['http_status'] = http.get('status')
+        event['bytes'] = http.get('length') or 0
+    elif event_type == 'tls':
+        tls = eve.get('tls', {})
+        event['kind'] = KIND_TLS
+        event['tls_server_name'] = tls.get('sni')
+        event['ja3'] = tls.get('ja3', {}).get('hash')
+    elif event_type == 'flow':
+        flow = eve.get('flow', {})
+        event['kind'] = KIND_FLOW
+        event['bytes'] = (flow.get('bytes_toserver') or 0) + (flow.get('bytes_toclient') or 0)
+        event['bytes_out'] = flow.get('bytes_toserver') or 0
+    elif event_type == 'ftp':
+        event['kind'] = KIND_FTP
+        event['ftp_completion_code'] = eve.get('ftp', {}).get('completion_code', [])
+    else:
+        return None
+    return event
+
+
+class EventPublisher:
+    """Buffers events and sends them in batches
+
+    Sends block while the subscriber's queue is full, so a busy rule engine
+    slows ingest down instead of losing its input. Events are dropped only
+    when nobody is bound to the socket or a batch waits past SEND_TIMEOUT;
+    either is logged with the running sent/dropped totals
+    """
+
+    def __init__(self, source, socket_path=EVENT_SOCKET, send_timeout=SEND_TIMEOUT):
+        self.source = source
+        self.socket_path = socket_path
+        self.buffer = []
+        self.sent = 0
+        self.dropped = 0
+        self.subscribed = True  # whether the last send found a subscriber
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.settimeout(send_timeout)
+
+    def publish(self, event):
+        if event:
+            self.buffer.append(event)
+            if len(self.buffer) >= MAX_BATCH_EVENTS:
+                self.flush()
+
+    def flush(self):
+        """Send buffered events; returns number sent"""
+        sent = 0
+        reason = None
+        while self.buffer:
+            batch = self.buffer[:MAX_BATCH_EVENTS]
+            payload = '\n'.join(json.dumps(e, separators=(',', ':'), default=str) for e in batch)
+            try:
+                self.sock.sendto(payload.encode(), self.socket_path)
+            except (FileNotFoundError, ConnectionRefusedError):
+                reason = 'no subscriber'
+                break
+            except socket.timeout:
+                reason = f"subscriber queue full for {self.sock.gettimeout()}s"
+                break
+            except OSError as e:
+                reason = str(e)
+                break
+            del self.buffer[:len(batch)]
+            sent += len(batch)
+
+        # Whatever couldn't be sent now is dropped: the next flush must not
+        # start behind a backlog of stale events
+        dropped = len(self.buffer)
+        self.buffer = []
+        self.sent += sent
+        self.dropped += dropped
+        if dropped and (reason != 'no subscriber' or self.subscribed):
+            logging.warning(f"Event bus ({self.source}): sent {sent}, dropped {dropped} ({reason}); "
+                            f"totals sent {self.sent}, dropped {self.dropped}")
+        else:
+            logging.debug(f"Event bus ({self.source}): sent {sent}, dropped {dropped}; "
+                          f"totals sent {self.sent}, dropped {self.dropped}")
+        if sent and not self.subscribed:
+            logging.info(f"Event bus ({self.source}): subscriber connected")
+        self.subscribed = reason != 'no subscriber'
+        return sent
+
+    def stats(self):
+        return {'source': self.source, 'sent': self.sent, 'dropped': self.dropped, 'subscribed': self.subscribed}
+
+    def close(self):
+        self.flush()
+        self.sock.close()
+
+
+class EventSubscriber:
+    """Receives event batches published by the collectors"""
+
+    def __init__(self, socket_path=EVENT_SOCKET):
+        self.socket_path = socket_path
+        os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        self.sock.bind(socket_path)
+        os.chmod(socket_path, 0o666)
+
+    def receive(self, timeout=1.0):
+        """Return all events available within timeout (may be empty)"""
+        events = []
+        self.sock.settimeout(timeout)
+        try:
+            while True:
+                data = self.sock.recv(1024 * 1024)
+                for line in data.decode(errors='replace').splitlines():
+                    try:
+                        events.append(json.loads(line))
+                    except ValueError:
+                        continue
+                # Drain whatever else is queued without waiting again
+                self.sock.settimeout(0)
+        except (socket.timeout, BlockingIOError):
+            pass
+        return events
+
+    def close(self):
+        self.sock.close()
+        try:
+            os.unlink(self.socket_path)
+        except OSError:
+            pass
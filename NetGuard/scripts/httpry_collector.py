@@ -11,6 +11,7 @@ import logging
 import time
 import re
 from datetime import datetime
+from time_window import window_index
 
 # Configuration
 INTERFACE = "wlo1"  # WiFi for external HTTP traffic (local traffic goes through loopback)
@@ -69,6 +70,7 @@ def create_table(conn, table_name):
     );
     """
     cursor.execute(sql)
+    window_index(cursor, table_name)
     conn.commit()
 
 def start_httpry():
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+NetGuard Pro - Streaming JSON Extraction
+Finds the first complete top-level JSON object with the expected fields in
+model output as it arrives, skipping reasoning preambles, markdown fences
+and trailing prose, so the caller can stop reading once it has the analysis
+"""
+
+import re
+import json
+import logging
+
+# Top-level fields each consumer needs; objects without them (schema
+# examples echoed in a preamble, fragments) are skipped
+AGGREGATOR_ANALYSIS_FIELDS = ('threat_level', 'network_health_score')
+CONNECTOR_ANALYSIS_FIELDS = ('overall_threat_level', 'network_health_score')
+
+MAX_RECOVERY_ATTEMPTS = 100  # '{' positions tried by finish() when the scan found nothing
+
+# The only characters that move the scanner, and the markers that end a
+# reasoning block or open/close a code fence: whatever was open before one is
+# not the answer (an unbalanced brace in a preamble would otherwise hide it)
+_TOKENS = re.compile(r'</think>|```|[{}"\\]')
+_PARTIAL_MARKER = re.compile(r'(?:<(?:/(?:t(?:h(?:i(?:n(?:k)?)?)?)?)?)?|(?<!`)`{1,2})\Z')
+
+
+class JsonObjectScanner:
+    """Incremental scanner over text fed in pieces
+
+    Braces are counted outside JSON strings, so each top-level object is
+    parsed once, when its closing brace arrives; the first one that holds
+    the required fields is the result and later text is never needed
+    """
+
+    def __init__(self, required=()):
+        self.required = tuple(required)
+        self.parts = []
+        self.length = 0
+        self.pending = ''  # end of the text that may be the start of a marker, scanned with the next piece
+        self.depth = 0
+        self.start = None  # offset of the open top-level object
+        self.in_string = False
+        self.skip = None  # offset of a character escaped by a backslash
+        self.result = None
+        self.fallback = None  # first well-formed object missing required fields
+
+    def valid(self, obj):
+        return isinstance(obj, dict) and all(field in obj for field in self.required)
+
+    def feed(self, chunk):
+        """Scan the next piece of text; returns the object once found, else None"""
+        if self.result is not None or not chunk:
+            return self.result
+        self.parts.append(chunk)
+        self.length += len(chunk)
+        text = self.pending + chunk
+        offset = self.length - len(text)
+        held = _PARTIAL_MARKER.search(text)
+        end = held.start() if held else len(text)
+        self.pending = text[end:]
+        for match in _TOKENS.finditer(text, 0, end):
+            pos = offset + match.start()
+            char = match.group()
+            if len(char) > 1:
+                self.depth, self.in_string, self.start = 0, False, None
+                continue
+            if self.depth == 0:
+                if char == '{':  # quotes and braces in prose outside objects don't count
+                    self.start, self.depth = pos, 1
+                continue
+            if self.in_string:
+                if pos == self.skip:
+                    continue
+                if char == '\\':
+                    self.skip = pos + 1
+                elif char == '"':
+                    self.in_string = False
+                continue
+            if char == '"':
+                self.in_string = True
+            elif char == '{':
+                self.depth += 1
+            elif char == '}':
+                self.depth -= 1
+                if self.depth == 0 and self._candidate(self.start, pos + 1):
+                    return self.result
+        return None
+
+    def text(self):
+        if len(self.parts) > 1:
+            self.parts = [''.join(self.parts)]
+        return self.parts[0] if self.parts else ''
+
+    def _candidate(self, start, end):
+        try:
+            obj = json.loads(self.text()[start:end])
+        except ValueError:
+            return False
+        if self.valid(obj):
+            self.result = obj
+            return True
+        if self.fallback is None and isinstance(obj, dict):
+            self.fallback = obj
+        return False
+
+    def finish(self):
+        """The object for the complete text, or None
+
+        When the scan found no valid object (an unbalanced brace with no
+        fence or </think> after it hides everything that follows), each '{' is tried as the start
+        of a JSON document; a well-formed object missing required fields is
+        returned only when nothing better exists
+        """
+        if self.result is not None:
+            return self.result
+        text = self.text()
+        decoder = json.JSONDecoder()
+        for attempt, match in enumerate(re.finditer(r'\{', text)):
+            if attempt >= MAX_RECOVERY_ATTEMPTS:
+                break
+            try:
+                obj, _ = decoder.raw_decode(text, match.start())
+            except ValueError:
+                continue
+            if self.valid(obj):
+                self.result = obj
+                return obj
+            if self.fallback is None and isinstance(obj, dict):
+                self.fallback = obj
+        if self.fallback is not None:
+            missing = [field for field in self.required if field not in self.fallback]
+            logging.warning(f"JSON object is missing {', '.join(missing)}; using it anyway")
+        return self.fallback
+
+
+def extract_json(text, required=()):
+    """First JSON object with the required fields in a complete response, or None"""
+    scanner = JsonObjectScanner(required)
+    scanner.feed(text or '')
+    return scanner.finish()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+NetGuard Pro - Mock LLM Provider Server
+Local stand-in for the Groq/OpenRouter chat-completions and Gemini
+generateContent APIs (plain or streamed as server-sent events) with
+configurable latency, errors, 429s and malformed responses, for testing and
+benchmarking the AI pipeline offline
+"""
+
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PROVIDERS = ('gemini', 'groq', 'openrouter')
+
+DEFAULT_PROFILE = {
+    # Time to the complete response; streams spread it over their events
+    # fixed: median_seconds | uniform: min_seconds..max_seconds | lognormal: median_seconds, sigma
+    'latency': {'distribution': 'lognormal', 'median_seconds': 1.0, 'sigma': 0.4},
+    'error_rate': 0.0,  # HTTP 500
+    'rate_limit_rate': 0.0,  # HTTP 429 with Retry-After
+    'retry_after_seconds': 1,
+    'malformed_rate': 0.0,  # HTTP 200 with a truncated JSON body, or a stream cut off midway
+    'unparseable_rate': 0.0,  # valid envelope, but the text holds no analysis JSON
+    'preamble_chars': 0,  # reasoning text before the JSON, as R1-style models send
+    'trailing_chars': 0,  # explanation after the JSON
+    'stream_chunk_chars': 40,  # text per streamed event
+    'unknown_models': [],  # answered with 404
+}
+
+OUTCOMES = ('ok', 'error', 'rate_limited', 'malformed', 'unparseable', 'not_found')
+# Streams the client closed before the last event (it had what it needed)
+STATS = OUTCOMES + ('closed_early',)
+
+SAMPLE_ANALYSIS = {
+    "threat_level": "LOW",
+    "overall_threat_level": "LOW",
+    "network_health_score": 92,
+    "summary": "Mock analysis: normal traffic, no active threats.",
+    "threats_detected": [],
+    "alerts": [],
+    "network_insights": {"most_active_protocols": ["TCP", "UDP"], "suspicious_connections": 0,
+                         "unusual_patterns": [], "bandwidth_anomalies": []},
+    "device_analysis": {"suspicious_devices": [], "device_breakdown": []},
+    "recommendations": ["Keep monitoring"],
+}
+
+
+def sample_latency(latency, rng):
+    kind = latency.get('distribution', 'fixed')
+    if kind == 'uniform':
+        return rng.uniform(latency.get('min_seconds', 0), latency.get('max_seconds', 1))
+    if kind == 'lognormal':
+        return latency.get('median_seconds', 1) * math.exp(rng.gauss(0, latency.get('sigma', 0.5)))
+    return latency.get('median_seconds', 0)
+
+
+def filler(sentence, chars):
+    return (sentence * (chars // len(sentence) + 1))[:chars]
+
+
+def analysis_text(profile):
+    preamble = trailer = ''
+    if profile['preamble_chars']:
+        preamble = f"<think>{filler('Let me think about the traffic. ', profile['preamble_chars'])}</think>\n"
+    if profile['trailing_chars']:
+        trailer = "\n" + filler('The traffic looks normal overall. ', profile['trailing_chars'])
+    return preamble + "```json\n" + json.dumps(SAMPLE_ANALYSIS, indent=2) + "\n```" + trailer
+
+
+def envelope(provider, model, text):
+    if provider == 'gemini':
+        return {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP"}],
+                "modelVersion": model}
+    return {"id": f"mock-{int(time.time() * 1000)}", "object": "chat.completion", "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}]}
+
+
+def stream_events(provider, model, text, chunk_chars):
+    """SSE data payloads streaming text, in the provider's chunk format"""
+    pieces = [text[i:i + chunk_chars] for i in range(0, len(text), chunk_chars)] or ['']
+    for piece in pieces:
+        if provider == 'gemini':
+            yield json.dumps({"candidates": [{"content": {"parts": [{"text": piece}], "role": "model"}}],
+                              "modelVersion": model})
+        else:
+            yield json.dumps({"object": "chat.completion.chunk", "model": model,
+                              "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]})
+    if provider != 'gemini':
+        yield '[DONE]'
+
+
+class MockProviderServer:
+    """Threaded HTTP server answering /<provider>/... with per-provider behaviour profiles"""
+
+    def __init__(self, profiles=None, host='127.0.0.1', port=0, seed=None):
+        profiles = profiles or {}
+        self.profiles = {}
+        for provider in PROVIDERS:
+            profile = dict(DEFAULT_PROFILE, **profiles.get('default', {}))
+            profile.update(profiles.get(provider, {}))
+            self.profiles[provider] = profile
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {provider: dict.fromkeys(STATS, 0) for provider in PROVIDERS}
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def base_urls(self):
+        """ai_client.base_urls pointing every provider at this server"""
+        return {provider: f"{self.url}/{provider}" for provider in PROVIDERS}
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='mock-llm', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def count(self, provider, stat):
+        with self.lock:
+            self.stats[provider][stat] += 1
+
+    def decide(self, provider, model):
+        """(outcome, latency) for one request; one locked RNG keeps seeded runs repeatable"""
+        profile = self.profiles[provider]
+        with self.lock:
+            latency = sample_latency(profile['latency'], self.rng)
+            roll = self.rng.random()
+        if model in profile['unknown_models']:
+            outcome = 'not_found'
+        else:
+            outcome = 'ok'
+            for name, rate in (('error', profile['error_rate']), ('rate_limited', profile['rate_limit_rate']),
+                               ('malformed', profile['malformed_rate']),
+                               ('unparseable', profile['unparseable_rate'])):
+                if roll < rate:
+                    outcome = name
+                    break
+                roll -= rate
+        self.count(provider, outcome)
+        return outcome, latency
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, like the real APIs
+
+            def log_message(self, format, *args):
+                pass
+
+            def handle(self):
+                try:
+                    super().handle()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client dropped a keep-alive connection or a stream it was done with
+
+            def send(self, status, body, headers=()):
+                data = body if isinstance(body, bytes) else json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def send_stream(self, provider, events, latency, cut=False):
+                """Chunked text/event-stream, events spread over latency; cut drops the connection midway"""
+                events = list(events)
+                if cut:
+                    events = events[:len(events) // 2]
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                try:
+                    for event in events:
+                        time.sleep(latency / len(events))
+                        data = f"data: {event}\n\n".encode('utf-8')
+                        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                    if cut:
+                        self.close_connection = True
+                    else:
+                        self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True
+                    server.count(provider, 'closed_early')
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    payload = json.loads(self.rfile.read(length) or b'{}')
+                except ValueError:
+                    return self.send(400, {"error": {"message": "invalid JSON body"}})
+
+                parts = self.path.strip('/').split('/')
+                provider = parts[0] if parts and parts[0] in PROVIDERS else None
+                stream = bool(payload.get('stream')) or ':streamGenerateContent' in self.path
+                if provider == 'gemini' and (':generateContent' in self.path or stream):
+                    model = self.path.split('?')[0].rsplit('/', 1)[-1].split(':')[0]
+                elif provider in ('groq', 'openrouter') and self.path.endswith('/chat/completions'):
+                    model = payload.get('model', '')
+                else:
+                    return self.send(404, {"error": {"message": f"no route for {self.path}"}})
+
+                outcome, latency = server.decide(provider, model)
+                profile = server.profiles[provider]
+                if stream and outcome in ('ok', 'malformed', 'unparseable'):
+                    text = ("I could not produce a structured analysis." if outcome == 'unparseable'
+                            else analysis_text(profile))
+                    return self.send_stream(provider, stream_events(provider, model, text,
+                                                                    profile['stream_chunk_chars']),
+                                            latency, cut=outcome == 'malformed')
+                time.sleep(latency)
+                if outcome == 'not_found':
+                    self.send(404, {"error": {"message": f"model {model} not found"}})
+                elif outcome == 'error':
+                    self.send(500, {"error": {"message": "mock internal error"}})
+                elif outcome == 'rate_limited':
+                    self.send(429, {"error": {"message": "rate limit exceeded"}},
+                              [('Retry-After', str(profile['retry_after_seconds']))])
+                elif outcome == 'malformed':
+                    body = json.dumps(envelope(provider, model, analysis_text(profile)))
+                    self.send(200, body[:len(body) // 2].encode('utf-8'))
+                elif outcome == 'unparseable':
+                    self.send(200, envelope(provider, model, "I could not produce a structured analysis."))
+                else:
+                    self.send(200, envelope(provider, model, analysis_text(profile)))
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock LLM provider server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--profiles', help="JSON file: {\"default\": {...}, \"gemini\": {...}, ...}")
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    profiles = {}
+    if args.profiles:
+        with open(args.profiles) as f:
+            profiles = json.load(f)
+    server = MockProviderServer(profiles, args.host, args.port, args.seed)
+    print(f"Mock LLM server on {server.url}")
+    print("Point the AI scripts at it with this ai_config.json entry:")
+    print(json.dumps({"ai_client": {"base_urls": server.base_urls()}}, indent=2))
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(json.dumps(server.stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+NetGuard Pro - Neighbor Cache Watcher
+Polls the IPv4 ARP table and IPv6 neighbor table, diffs against the previous
+snapshot and publishes only changes; keeps a time-indexed IP/MAC history
+"""
+
+import shutil
+import sqlite3
+import logging
+import subprocess
+import time
+from datetime import datetime
+
+POLL_INTERVAL = 10  # seconds between neighbor table reads
+
+# Event types published to the device pipeline
+EVENT_NEW = 'new'
+EVENT_MAC_CHANGED = 'mac_changed'
+EVENT_GONE = 'gone'
+
+INVALID_MACS = ('00:00:00:00:00:00', '<INCOMPLETE>')
+
+
+def read_arp_table(path='/proc/net/arp'):
+    """Parse /proc/net/arp into {ip: MAC}"""
+    entries = {}
+    try:
+        with open(path, 'r') as f:
+            for line in f.readlines()[1:]:  # Skip header
+                parts = line.split()
+                if len(parts) >= 4:
+                    mac = parts[3].upper()
+                    if mac not in INVALID_MACS:
+                        entries[parts[0]] = mac
+    except Exception as e:
+        logging.error(f"Error reading ARP table: {e}")
+    return entries
+
+
+def read_ipv6_neighbors():
+    """Parse `ip -6 neigh show` into {ip: MAC} (empty if iproute2 is missing)"""
+    entries = {}
+    if not shutil.which('ip'):
+        return entries
+    try:
+        result = subprocess.run(['ip', '-6', 'neigh', 'show'],
+                                capture_output=True, text=True, timeout=5)
+        for line in result.stdout.splitlines():
+            # fe80::1 dev wlo1 lladdr aa:bb:cc:dd:ee:ff router REACHABLE
+            parts = line.split()
+            if 'lladdr' in parts and 'FAILED' not in parts:
+                mac = parts[parts.index('lladdr') + 1].upper()
+                if mac not in INVALID_MACS:
+                    entries[parts[0]] = mac
+    except Exception as e:
+        logging.debug(f"Error reading IPv6 neighbors: {e}")
+    return entries
+
+
+def init_history_table(cursor):
+    """Create the IP/MAC history table if missing"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ip_mac_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ip_address TEXT NOT NULL,
+            mac_address TEXT NOT NULL,
+            valid_from TEXT NOT NULL,
+            valid_to TEXT
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ip_mac_history_ip ON ip_mac_history(ip_address, valid_from)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ip_mac_history_mac ON ip_mac_history(mac_address, valid_from)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ip_mac_history_open ON ip_mac_history(valid_to)")
+
+
+def who_had_ip(cursor, ip_address, at):
+    """MAC address that held ip_address at time `at` (ISO string), or None"""
+    cursor.execute("""
+        SELECT mac_address FROM ip_mac_history
+        WHERE ip_address = ? AND valid_from <= ?
+        AND (valid_to IS NULL OR valid_to > ?)
+        ORDER BY valid_from DESC LIMIT 1
+    """, (ip_address, at, at))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+class NeighborWatcher:
+    """Cached view of the neighbor tables that reports only changes"""
+
+    def __init__(self, db_path, poll_interval=POLL_INTERVAL, include_ipv6=True):
+        self.db_path = db_path
+        self.poll_interval = poll_interval
+        self.include_ipv6 = include_ipv6
+        self.snapshot = {}
+        self.last_poll = 0
+
+        # The open history intervals are the previous snapshot, so a fresh
+        # watcher (e.g. one per processing cycle) doesn't re-report everything
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            init_history_table(cursor)
+            conn.commit()
+            cursor.execute("SELECT ip_address, mac_address FROM ip_mac_history WHERE valid_to IS NULL")
+            self.snapshot = dict(cursor.fetchall())
+            conn.close()
+        except Exception as e:
+            logging.error(f"Error initializing neighbor history: {e}")
+
+    def read_neighbors(self):
+        neighbors = read_arp_table()
+        if self.include_ipv6:
+            neighbors.update(read_ipv6_neighbors())
+        return neighbors
+
+    def get_neighbors(self):
+        """Current {ip: MAC} table, re-read at most once per poll interval"""
+        if time.time() - self.last_poll >= self.poll_interval:
+            self.poll()
+        return self.snapshot
+
+    def poll(self):
+        """Read the neighbor tables, record changes and return them as events"""
+        self.last_poll = time.time()
+        current = self.read_neighbors()
+        previous = self.snapshot
+
+        events = []
+        for ip, mac in current.items():
+            old_mac = previous.get(ip)
+            if old_mac is None:
+                events.append({'type': EVENT_NEW, 'ip': ip, 'mac': mac})
+            elif old_mac != mac:
+                events.append({'type': EVENT_MAC_CHANGED, 'ip': ip, 'mac': mac, 'old_mac': old_mac})
+        for ip, mac in previous.items():
+            if ip not in current:
+                events.append({'type': EVENT_GONE, 'ip': ip, 'mac': mac})
+
+        if events:
+            self.record_history(events)
+        self.snapshot = current
+        return events
+
+    def record_history(self, events):
+        """Close and open history intervals for the given events"""
+        now = datetime.now().isoformat()
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            for event in events:
+                # Also closes an interval another watcher may have just opened
+                cursor.execute("""
+                    UPDATE ip_mac_history SET valid_to = ?
+                    WHERE ip_address = ? AND valid_to IS NULL
+                """, (now, event['ip']))
+                if event['type'] in (EVENT_NEW, EVENT_MAC_CHANGED):
+                    cursor.execute("""
+                        INSERT INTO ip_mac_history (ip_address, mac_address, valid_from)
+                        VALUES (?, ?, ?)
+                    """, (event['ip'], event['mac'], now))
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logging.error(f"Error recording neighbor history: {e}")
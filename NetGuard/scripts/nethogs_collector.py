@@ -11,6 +11,7 @@ import logging
 import time
 import re
 from datetime import datetime
+from time_window import window_index
 
 # Configuration
 INTERFACE = "wlo1"  # WiFi for better process monitoring
@@ -46,6 +47,7 @@ def create_table(conn, table_name):
     );
     """
     cursor.execute(sql)
+    window_index(cursor, table_name)
     conn.commit()
 
 def parse_nethogs_line(line):
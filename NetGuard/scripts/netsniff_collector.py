@@ -12,6 +12,7 @@ import time
 import json
 from datetime import datetime
 from pathlib import Path
+from time_window import window_index
 
 # Configuration
 INTERFACE = "wlo1"
@@ -63,6 +64,7 @@ def create_table(conn, table_name):
     );
     """
     cursor.execute(sql)
+    window_index(cursor, table_name)
     conn.commit()
 
 def start_netsniff():
@@ -11,6 +11,7 @@ import logging
 import time
 import re
 from datetime import datetime
+from time_window import window_index
 
 # Configuration
 INTERFACE = "eno1"  # Changed to Ethernet for local network traffic
@@ -68,6 +69,7 @@ def create_table(conn, table_name):
     );
     """
     cursor.execute(sql)
+    window_index(cursor, table_name)
     conn.commit()
 
 def start_ngrep():
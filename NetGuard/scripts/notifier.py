@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+NetGuard Pro - Alert Notification Dispatcher
+New alerts are queued in notification_queue by the alert manager's flush; an
+asyncio worker pool delivers them in batches to webhook, SMTP, syslog and file
+sinks with per-sink concurrency limits and exponential-backoff retries
+"""
+
+import os
+import json
+import random
+import asyncio
+import sqlite3
+import logging
+import smtplib
+import syslog
+import threading
+import time
+import urllib.request
+from datetime import datetime
+from email.message import EmailMessage
+
+NOTIFICATION_CONFIG_FILE = "/home/jarvis/NetGuard/config/notifications.json"
+
+DEFAULT_SETTINGS = {
+    'max_attempts': 6,
+    'retry_base_seconds': 5,
+    'retry_max_seconds': 900,
+    'poll_interval_seconds': 2,
+}
+
+SEVERITY_RANK = {'INFO': 0, 'LOW': 1, 'MEDIUM': 2, 'HIGH': 3, 'CRITICAL': 4}
+
+
+def init_notification_table(cursor):
+    """Create the notification queue table if missing"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS notification_queue (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            alert_id TEXT NOT NULL,
+            sink TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT DEFAULT 'pending',
+            attempts INTEGER DEFAULT 0,
+            next_attempt REAL NOT NULL,
+            last_error TEXT,
+            created_at TEXT NOT NULL,
+            sent_at TEXT
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_notification_queue_due ON notification_queue(sink, status, next_attempt)")
+
+
+def load_notification_config(path=NOTIFICATION_CONFIG_FILE):
+    """Notification settings with enabled sinks only; None when not configured"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r') as f:
+            config = json.load(f)
+    except (OSError, ValueError) as e:
+        logging.error(f"Error loading notification config: {e}")
+        return None
+    config = dict(DEFAULT_SETTINGS, **config)
+    config['sinks'] = [sink for sink in config.get('sinks', []) if sink.get('enabled')]
+    return config if config['sinks'] else None
+
+
+def enqueue_notifications(cursor, sinks, alerts):
+    """Queue alert payloads for every sink whose min_severity they meet (caller commits)"""
+    now = time.time()
+    created = datetime.now().isoformat()
+    rows = []
+    for alert in alerts:
+        rank = SEVERITY_RANK.get(alert['severity'], 0)
+        payload = json.dumps(alert)
+        for sink in sinks:
+            if rank >= SEVERITY_RANK.get(sink.get('min_severity', 'INFO'), 0):
+                rows.append((alert['alert_id'], sink['name'], payload, now, created))
+    cursor.executemany("""
+        INSERT INTO notification_queue (alert_id, sink, payload, next_attempt, created_at)
+        VALUES (?, ?, ?, ?, ?)
+    """, rows)
+    return len(rows)
+
+
+# Sinks: deliver(batch) raises on failure; blocking I/O runs in worker threads
+
+class FileSink:
+    """Appends JSON lines to a local file (testing / log shipping)"""
+
+    def __init__(self, config):
+        self.path = config['path']
+
+    def _write(self, batch):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'a') as f:
+            for alert in batch:
+                f.write(json.dumps(alert) + '\n')
+
+    async def deliver(self, batch):
+        await asyncio.to_thread(self._write, batch)
+
+
+class WebhookSink:
+    """POSTs {"alerts": [...]} as JSON"""
+
+    def __init__(self, config):
+        self.url = config['url']
+        self.headers = dict({'Content-Type': 'application/json'}, **config.get('headers', {}))
+        self.timeout = config.get('timeout_seconds', 10)
+
+    def _post(self, batch):
+        body = json.dumps({'source': 'netguard', 'alerts': batch}).encode()
+        req = urllib.request.Request(self.url, data=body, headers=self.headers, method='POST')
+        with urllib.request.urlopen(req, timeout=self.timeout) as response:
+            if response.status >= 300:
+                raise RuntimeError(f"HTTP {response.status}")
+
+    async def deliver(self, batch):
+        await asyncio.to_thread(self._post, batch)
+
+
+class SmtpSink:
+    """One email per batch"""
+
+    def __init__(self, config):
+        self.config = config
+
+    def _send(self, batch):
+        config = self.config
+        top = max(batch, key=lambda alert: SEVERITY_RANK.get(alert['severity'], 0))
+        message = EmailMessage()
+        message['Subject'] = f"[NetGuard] {len(batch)} alert(s), highest {top['severity']}: {top['title']}"
+        message['From'] = config['from']
+        message['To'] = ', '.join(config['to'])
+        message.set_content('\n\n'.join(
+            f"[{alert['severity']}] {alert['title']} ({alert['alert_id']})\n{alert['description']}"
+            for alert in batch))
+
+        with smtplib.SMTP(config['host'], config.get('port', 587), timeout=config.get('timeout_seconds', 30)) as smtp:
+            if config.get('starttls', True):
+                smtp.starttls()
+            if config.get('username'):
+                smtp.login(config['username'], config['password'])
+            smtp.send_message(message)
+
+    async def deliver(self, batch):
+        await asyncio.to_thread(self._send, batch)
+
+
+class SyslogSink:
+    """One syslog record per alert"""
+
+    PRIORITIES = {'CRITICAL': syslog.LOG_CRIT, 'HIGH': syslog.LOG_ERR,
+                  'MEDIUM': syslog.LOG_WARNING, 'LOW': syslog.LOG_NOTICE, 'INFO': syslog.LOG_INFO}
+
+    def __init__(self, config):
+        self.facility = getattr(syslog, f"LOG_{config.get('facility', 'local0').upper()}", syslog.LOG_LOCAL0)
+
+    def _log(self, batch):
+        syslog.openlog('netguard', syslog.LOG_PID, self.facility)
+        for alert in batch:
+            syslog.syslog(self.PRIORITIES.get(alert['severity'], syslog.LOG_INFO),
+                          f"[{alert['severity']}] {alert['title']} ({alert['alert_id']})")
+
+    async def deliver(self, batch):
+        await asyncio.to_thread(self._log, batch)
+
+
+SINK_TYPES = {
+    'file': FileSink,
+    'webhook': WebhookSink,
+    'smtp': SmtpSink,
+    'syslog': SyslogSink,
+}
+
+
+class NotificationDispatcher:
+    """Drains notification_queue on its own asyncio loop in a daemon thread"""
+
+    def __init__(self, db_path, config):
+        self.db_path = db_path
+        self.config = config
+        self.sinks = {}
+        for sink in config['sinks']:
+            sink_type = SINK_TYPES.get(sink.get('type'))
+            if not sink_type:
+                logging.error(f"Unknown notification sink type: {sink.get('type')}")
+                continue
+            self.sinks[sink['name']] = (sink_type(sink), sink)
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=lambda: asyncio.run(self.run()),
+                                       name='notification-dispatcher', daemon=True)
+        self.thread.start()
+        logging.info(f"✓ Notification dispatcher started ({', '.join(self.sinks)})")
+
+    def _db(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _claim(self, name, limit):
+        """Mark due rows for a sink as in flight and return them"""
+        conn = self._db()
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT id, payload, attempts FROM notification_queue
+            WHERE sink = ? AND status = 'pending' AND next_attempt <= ?
+            ORDER BY id LIMIT ?
+        """, (name, time.time(), limit))
+        rows = cursor.fetchall()
+        cursor.executemany("UPDATE notification_queue SET status = 'sending' WHERE id = ?",
+                           [(row[0],) for row in rows])
+        conn.commit()
+        conn.close()
+        return rows
+
+    def _finish(self, rows, error=None):
+        conn = self._db()
+        if error is None:
+            conn.executemany("""
+                UPDATE notification_queue SET status = 'sent', attempts = attempts + 1, sent_at = ?
+                WHERE id = ?
+            """, [(datetime.now().isoformat(), row[0]) for row in rows])
+        else:
+            updates = []
+            for row_id, _, attempts in rows:
+                attempts += 1
+                delay = min(self.config['retry_max_seconds'],
+                            self.config['retry_base_seconds'] * 2 ** (attempts - 1))
+                status = 'failed' if attempts >= self.config['max_attempts'] else 'pending'
+                updates.append((status, attempts, time.time() + delay * random.uniform(0.8, 1.2),
+                                str(error)[:500], row_id))
+            conn.executemany("""
+                UPDATE notification_queue
+                SET status = ?, attempts = ?, next_attempt = ?, last_error = ?
+                WHERE id = ?
+            """, updates)
+        conn.commit()
+        conn.close()
+
+    async def _deliver(self, name, sink, rows):
+        try:
+            await sink.deliver([json.loads(row[1]) for row in rows])
+            await asyncio.to_thread(self._finish, rows)
+        except Exception as e:
+            logging.warning(f"Notification delivery to {name} failed ({len(rows)} alerts): {e}")
+            await asyncio.to_thread(self._finish, rows, e)
+
+    async def run(self):
+        # Rows left in flight by a previous process are retried
+        conn = self._db()
+        init_notification_table(conn.cursor())
+        conn.execute("UPDATE notification_queue SET status = 'pending' WHERE status = 'sending'")
+        conn.commit()
+        conn.close()
+
+        # Delivery tasks per sink; rows are only claimed for free slots, so
+        # nothing sits in 'sending' waiting behind a slow sink
+        in_flight = {name: set() for name in self.sinks}
+
+        while True:
+            try:
+                for name, (sink, config) in self.sinks.items():
+                    batch_size = config.get('batch_size', 20)
+                    free = config.get('concurrency', 1) - len(in_flight[name])
+                    if free <= 0:
+                        continue
+                    # SQLite calls run in a worker thread so they don't stall deliveries
+                    rows = await asyncio.to_thread(self._claim, name, batch_size * free)
+                    for i in range(0, len(rows), batch_size):
+                        task = asyncio.create_task(self._deliver(name, sink, rows[i:i + batch_size]))
+                        in_flight[name].add(task)
+                        task.add_done_callback(in_flight[name].discard)
+            except Exception as e:
+                logging.error(f"Error polling notification queue: {e}")
+            await asyncio.sleep(self.config['poll_interval_seconds'])
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+NetGuard Pro - Batch Packet Threat Scoring
+Applies the collectors' per-packet threat heuristics to a whole decoded batch,
+as NumPy column masks when NumPy is installed and as the original per-row
+checks otherwise, with rule weights from config/threat_scoring.json
+"""
+
+import os
+import copy
+import json
+import logging
+import operator
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SCORING_CONFIG_FILE = "/home/jarvis/NetGuard/config/threat_scoring.json"
+
+# Weights per collector profile. A packet is suspicious when its score is
+# above suspicious_above (null disables) or any suspicious_rules rule matched.
+DEFAULT_SCORING = {
+    'local_ip': '192.168.1.244',
+    'tcpdump': {
+        'weights': {'high_port_syn': 3, 'syn_rst': 2, 'low_ttl': 1},
+        'suspicious_above': 3,
+        'suspicious_rules': [],
+    },
+    'tshark': {
+        'weights': {'inbound_high_port': 5, 'external_syn': 3, 'external_rst': 2,
+                    'spoofed_ttl': 4, 'small_window': 2},
+        'suspicious_above': None,
+        'suspicious_rules': ['inbound_high_port', 'external_syn', 'spoofed_ttl'],
+    },
+}
+
+SCORED_FIELDS = ('src_ip', 'dest_ip', 'dest_port', 'ip_ttl', 'tcp_window_size',
+                 'tcp_syn', 'tcp_ack', 'tcp_rst')
+
+# Address properties, one bit each, computed once per distinct address
+EXTERNAL = 0  # present and not 192.168.x
+NOT_THIS_HOST = 1  # present and not local_ip
+EXTERNAL_UNICAST = 2  # present and not 192.168.x / 224.x / 239.x
+MAX_CACHED_ADDRESSES = 100000
+INT64_MAX = 2 ** 63 - 1
+
+
+class AddressFlags(dict):
+    """ip -> property bits"""
+
+    def __init__(self, local_ip):
+        super().__init__()
+        self.local_ip = local_ip
+
+    def __missing__(self, ip):
+        flags = 0
+        if ip:
+            if not ip.startswith('192.168.'):
+                flags |= 1 << EXTERNAL
+            if ip != self.local_ip:
+                flags |= 1 << NOT_THIS_HOST
+            if not ip.startswith(('192.168.', '224.', '239.')):
+                flags |= 1 << EXTERNAL_UNICAST
+        if len(self) < MAX_CACHED_ADDRESSES:
+            self[ip] = flags
+        return flags
+
+
+def zero_missing(values):
+    """Missing fields (None / '') as 0; other values pass through"""
+    if isinstance(values, array):
+        return values
+    return [v or 0 for v in values]
+
+
+def int_column(values):
+    """Signed 64-bit column; anything that isn't an int (missing/unparsed field) counts as 0"""
+    if isinstance(values, array):
+        return values
+    values = zero_missing(values)
+    try:
+        return array('q', values)
+    except (TypeError, OverflowError):
+        return array('q', [v if v.__class__ is int and -INT64_MAX <= v <= INT64_MAX else 0 for v in values])
+
+
+class NumpyColumns:
+    """Masks are bool arrays"""
+
+    def __init__(self, n):
+        self.n = n
+
+    def numeric(self, values):
+        if isinstance(values, np.ndarray):
+            return values
+        return np.frombuffer(int_column(values), dtype=np.int64)
+
+    def flags(self, values):
+        return np.frombuffer(bytes(values), dtype=np.uint8)
+
+    def bit(self, flags, bit):
+        return (flags & (1 << bit)) != 0
+
+    def between(self, column, low, high):
+        """low < value < high"""
+        return (column > low) & (column < high)
+
+    def nonzero(self, column):
+        return column != 0
+
+    def both(self, *masks):
+        result = masks[0]
+        for mask in masks[1:]:
+            result = result & mask
+        return result
+
+    def negate(self, mask):
+        return ~mask
+
+    def pattern(self, masks):
+        """Per-row byte with bit i set when the mask for bit i matched; masks is [(i, mask)]"""
+        pattern = np.zeros(self.n, dtype=np.uint8)
+        for i, mask in masks:
+            pattern |= mask.astype(np.uint8) << i
+        return pattern
+
+    def lookup(self, pattern, table):
+        return np.asarray(table, dtype=np.int64)[pattern].tolist()
+
+
+def rule_masks(profile, c, col):
+    """Mask builder per heuristic for a profile; `col(name)` fetches a column lazily"""
+    if profile == 'tcpdump':
+        return {
+            'high_port_syn': lambda: c.both(c.between(col('dest_port'), 50000, INT64_MAX),
+                                            c.nonzero(col('tcp_syn'))),
+            'syn_rst': lambda: c.both(c.nonzero(col('tcp_rst')), c.nonzero(col('tcp_syn'))),
+            'low_ttl': lambda: c.between(col('ip_ttl'), 0, 30),
+        }
+    return {
+        # External host connecting to a high port here; outbound ephemeral ports are fine
+        'inbound_high_port': lambda: c.both(c.between(col('dest_port'), 50000, INT64_MAX),
+                                            c.bit(col('src_flags'), NOT_THIS_HOST)),
+        # SYN without ACK toward external addresses
+        'external_syn': lambda: c.both(c.nonzero(col('tcp_syn')), c.negate(c.nonzero(col('tcp_ack'))),
+                                       c.bit(col('dest_flags'), EXTERNAL)),
+        'external_rst': lambda: c.both(c.nonzero(col('tcp_rst')), c.bit(col('src_flags'), EXTERNAL)),
+        # Low TTL toward external unicast may be spoofed
+        'spoofed_ttl': lambda: c.both(c.between(col('ip_ttl'), 0, 32),
+                                      c.bit(col('dest_flags'), EXTERNAL_UNICAST)),
+        'small_window': lambda: c.both(c.between(col('tcp_window_size'), 0, 1000),
+                                       c.bit(col('src_flags'), EXTERNAL)),
+    }
+
+
+def row_rules(profile, local_ip):
+    """The heuristics as per-row checks, setting bit i for rule i in rule_masks order
+
+    Without NumPy a plain row loop is faster than stdlib column masks
+    """
+    if profile == 'tcpdump':
+        def pattern(src_ip, dest_ip, dest_port, ip_ttl, tcp_window_size, tcp_syn, tcp_ack, tcp_rst):
+            bits = 0
+            if dest_port and dest_port > 50000 and tcp_syn:
+                bits |= 1
+            if tcp_rst and tcp_syn:
+                bits |= 2
+            if ip_ttl and ip_ttl < 30:
+                bits |= 4
+            return bits
+        return pattern
+
+    def pattern(src_ip, dest_ip, dest_port, ip_ttl, tcp_window_size, tcp_syn, tcp_ack, tcp_rst):
+        bits = 0
+        if dest_port and dest_port > 50000 and src_ip and src_ip != local_ip:
+            bits |= 1
+        if tcp_syn and not tcp_ack and dest_ip and not dest_ip.startswith('192.168.'):
+            bits |= 2
+        if tcp_rst and src_ip and not src_ip.startswith('192.168.'):
+            bits |= 4
+        if ip_ttl and ip_ttl < 32 and dest_ip and not dest_ip.startswith(('192.168.', '224.', '239.')):
+            bits |= 8
+        if tcp_window_size and tcp_window_size < 1000 and src_ip and not src_ip.startswith('192.168.'):
+            bits |= 16
+        return bits
+    return pattern
+
+
+def numeric_or_zero(row):
+    """A row whose numeric fields that aren't ints (unparsed values) count as 0, as in the masks"""
+    return row[:2] + tuple(v if v.__class__ is int else 0 for v in row[2:])
+
+
+def load_scoring_config(path=SCORING_CONFIG_FILE):
+    config = copy.deepcopy(DEFAULT_SCORING)
+    if os.path.exists(path):
+        try:
+            with open(path, 'r') as f:
+                overrides = json.load(f)
+            for key, value in overrides.items():
+                if isinstance(value, dict) and isinstance(config.get(key), dict):
+                    config[key].update(value)
+                else:
+                    config[key] = value
+        except (OSError, ValueError) as e:
+            logging.error(f"Error loading threat scoring config, using defaults: {e}")
+    return config
+
+
+class RowColumns(dict):
+    """Columns of decoded packets (dicts, or tuples in SCORED_FIELDS order), transposed on first use"""
+
+    def __init__(self, rows):
+        super().__init__()
+        self.rows = rows
+        self.keys_by_field = dict(zip(SCORED_FIELDS, SCORED_FIELDS if rows and isinstance(rows[0], dict)
+                                      else range(len(SCORED_FIELDS))))
+
+    def __missing__(self, field):
+        column = self[field] = list(map(operator.itemgetter(self.keys_by_field[field]), self.rows))
+        return column
+
+
+class PacketScorer:
+    """Scores a decoded batch
+
+    Each heuristic sets one bit of a per-row pattern (one NumPy mask per
+    heuristic over the batch, or the per-row checks without NumPy), and
+    scores / suspicious flags are read from tables precomputed over every
+    pattern
+    """
+
+    def __init__(self, profile, config=None):
+        config = config or load_scoring_config()
+        weights = config[profile]['weights']
+        suspicious_above = config[profile].get('suspicious_above')
+        suspicious_rules = set(config[profile].get('suspicious_rules', []))
+
+        self.profile = profile
+        self.addresses = AddressFlags(config.get('local_ip'))
+        self.row_pattern = row_rules(profile, config.get('local_ip')) if np is None else None
+        all_rules = list(rule_masks(profile, None, None))
+        # Rules that can't change a score or flag aren't evaluated as masks
+        self.rules = [(i, name) for i, name in enumerate(all_rules)
+                      if weights.get(name) or name in suspicious_rules]
+
+        rule_weights = [int(weights.get(name, 0)) for name in all_rules]
+        flagging = sum(1 << i for i, name in enumerate(all_rules) if name in suspicious_rules)
+        self.score_table = []
+        self.suspicious_table = []
+        for pattern in range(1 << len(all_rules)):
+            score = sum(weight for i, weight in enumerate(rule_weights) if pattern >> i & 1)
+            self.score_table.append(score)
+            self.suspicious_table.append(int(bool(pattern & flagging) or
+                                             (suspicious_above is not None and score > suspicious_above)))
+
+    def score(self, columns):
+        """Return (threat_scores, is_suspicious) lists for a {field: column} batch"""
+        n = len(columns.rows) if isinstance(columns, RowColumns) else len(columns['src_ip'])
+        if not n:
+            return [], []
+        if self.row_pattern:
+            patterns = self.score_rows(columns)
+            return (list(map(self.score_table.__getitem__, patterns)),
+                    list(map(self.suspicious_table.__getitem__, patterns)))
+        c = NumpyColumns(n)
+        cache = {}
+
+        def col(name):
+            if name not in cache:
+                if name in ('src_flags', 'dest_flags'):
+                    ips = columns[name[:-5] + 'ip']
+                    cache[name] = c.flags(map(self.addresses.__getitem__, ips))
+                else:
+                    cache[name] = c.numeric(columns[name])
+            return cache[name]
+
+        builders = rule_masks(self.profile, c, col)
+        pattern = c.pattern([(i, builders[name]()) for i, name in self.rules])
+        return c.lookup(pattern, self.score_table), c.lookup(pattern, self.suspicious_table)
+
+    def score_rows(self, columns):
+        """Per-row bit patterns, from the rows themselves when the batch holds them"""
+        if isinstance(columns, RowColumns):
+            rows = columns.rows
+            if isinstance(rows[0], dict):
+                rows = map(operator.itemgetter(*SCORED_FIELDS), rows)
+        else:
+            rows = zip(*(columns[field] for field in SCORED_FIELDS))
+        pattern = self.row_pattern
+        patterns = []
+        for row in rows:
+            try:
+                patterns.append(pattern(*row))
+            except TypeError:
+                patterns.append(pattern(*numeric_or_zero(tuple(row))))
+        return patterns
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+NetGuard Pro - Token-Budgeted Prompt Builder
+Serializes monitoring data compactly (no indentation, nulls and empty values
+dropped, sample rows as column tables) and fills prompt sections by priority
+until a token budget is reached
+"""
+
+import json
+import math
+
+DEFAULT_TOKEN_BUDGET = 6000
+FIRST_PASS_ROWS = 5  # rows per sample list before any list gets more
+CHARS_PER_TOKEN = 3.5  # conservative for JSON-heavy text; real tokenizers average ~4
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def compact(value):
+    """Drop None / '' / empty containers recursively; anything else non-JSON becomes str"""
+    if isinstance(value, dict):
+        items = ((str(k), compact(v)) for k, v in value.items())
+        return {k: v for k, v in items if v not in (None, '', [], {})}
+    if isinstance(value, (list, tuple)):
+        items = (compact(v) for v in value)
+        return [v for v in items if v not in (None, '', [], {})]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def dumps(value):
+    return json.dumps(compact(value), separators=(',', ':'), ensure_ascii=False)
+
+
+def tabulate(rows):
+    """Rows of dicts as {"cols": [...], "rows": [[...], ...]}; keys are written once
+
+    Columns that are empty in every row are dropped; a missing cell is null
+    """
+    rows = [compact(dict(row)) for row in rows]
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    if len(rows) < 2:
+        return dumps(rows)
+    return json.dumps({'cols': columns, 'rows': [[row.get(column) for column in columns] for row in rows]},
+                      separators=(',', ':'), ensure_ascii=False)
+
+
+def serialize(value):
+    """Lists of dicts as tables, everything else as compact JSON"""
+    if isinstance(value, (list, tuple)) and value and all(isinstance(row, dict) for row in value):
+        return tabulate(value)
+    return dumps(value)
+
+
+class Section:
+    """One heading with always-kept facts and truncatable sample lists"""
+
+    def __init__(self, title, priority, facts, samples):
+        self.title = title
+        self.priority = priority
+        self.facts = facts  # [(label, value)]
+        self.samples = samples  # [(label, rows)]
+        self.kept = [0] * len(samples)  # rows of each sample list included
+        self.included = False
+
+    def render(self):
+        lines = [f"### {self.title}"]
+        lines += [f"- {label}: {value if isinstance(value, (str, int, float)) else dumps(value)}"
+                  for label, value in self.facts]
+        for (label, rows), kept in zip(self.samples, self.kept):
+            if not kept:
+                continue
+            more = f" (+{len(rows) - kept} more)" if kept < len(rows) else ''
+            lines.append(f"- {label}{more}: {serialize(rows[:kept])}")
+        return '\n'.join(lines)
+
+
+class PromptBuilder:
+    """Collects sections, then renders as many as fit a token budget
+
+    Sections are admitted in priority order (lower first) with their facts;
+    each admitted section's sample rows are then added, again by priority,
+    until the budget is used. Output keeps the order sections were added in
+    """
+
+    def __init__(self, budget_tokens=None):
+        self.budget = budget_tokens or DEFAULT_TOKEN_BUDGET
+        self.sections = []
+
+    def section(self, title, priority, facts=(), samples=()):
+        samples = [(label, list(rows or [])) for label, rows in samples]
+        self.sections.append(Section(title, priority, list(facts), [s for s in samples if s[1]]))
+
+    def render(self, header, footer):
+        used = estimate_tokens(header) + estimate_tokens(footer)
+        ordered = sorted(self.sections, key=lambda s: s.priority)
+
+        for section in ordered:
+            cost = estimate_tokens(section.render()) + 1
+            if used + cost <= self.budget:
+                section.included = True
+                used += cost
+
+        # First pass gives every sample list a few rows, so one long device
+        # list can't starve the alerts; the second fills the rest by priority
+        for cap in (FIRST_PASS_ROWS, None):
+            for section in ordered:
+                if section.included:
+                    used = self._fill(section, cap, used)
+
+        body = '\n\n'.join(section.render() for section in self.sections if section.included)
+        omitted = [section.title for section in self.sections if not section.included]
+        if omitted:
+            body += f"\n\n(Omitted for length: {', '.join(omitted)})"
+        self.used_tokens = used
+        return f"{header}\n\n{body}\n\n{footer}"
+
+    def _fill(self, section, cap, used):
+        """Add sample rows (up to cap per list) while the budget allows; returns tokens used"""
+        for i, (_, rows) in enumerate(section.samples):
+            base = estimate_tokens(section.render())
+            # Largest row count that still fits (binary search; device lists can be long)
+            low, high = section.kept[i], min(len(rows), cap or len(rows))
+            while low < high:
+                section.kept[i] = (low + high + 1) // 2
+                if used + estimate_tokens(section.render()) - base <= self.budget:
+                    low = section.kept[i]
+                else:
+                    high = section.kept[i] - 1
+            section.kept[i] = low
+            used += estimate_tokens(section.render()) - base
+        return used
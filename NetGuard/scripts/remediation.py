@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+NetGuard Pro - Auto-Remediation Worker
+Remediation requests are queued in remediation_jobs and return a job ID at
+once; a worker thread coalesces queued IP blocks into one firewall update
+(iptables-restore or ipset) per batch and records each job's outcome
+"""
+
+import re
+import uuid
+import sqlite3
+import logging
+import ipaddress
+import subprocess
+import threading
+import time
+from datetime import datetime
+
+DEFAULT_SETTINGS = {
+    'backend': 'iptables',  # iptables | ipset | dry_run
+    'chain': 'INPUT',
+    'set_name': 'netguard_blocked',
+    'batch_size': 256,
+    'poll_interval_seconds': 1,
+    'command_timeout_seconds': 30,
+}
+
+# The block command alert rules generate; anything else runs as a shell command
+BLOCK_COMMAND = re.compile(r'^(?:sudo\s+)?iptables\s+-A\s+INPUT\s+-s\s+(\S+)\s+-j\s+DROP\s*$')
+
+
+def init_remediation_table(cursor):
+    """Create the remediation job table if missing"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS remediation_jobs (
+            job_id TEXT PRIMARY KEY,
+            alert_id TEXT NOT NULL,
+            action TEXT NOT NULL,
+            target TEXT,
+            command TEXT NOT NULL,
+            status TEXT DEFAULT 'queued',
+            requested_by TEXT DEFAULT 'system',
+            result TEXT,
+            created_at TEXT NOT NULL,
+            started_at TEXT,
+            finished_at TEXT
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_remediation_jobs_status ON remediation_jobs(status, created_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_remediation_jobs_alert ON remediation_jobs(alert_id)")
+
+
+def parse_remediation(command):
+    """('block_ip', address) for firewall blocks, else ('command', None)"""
+    match = BLOCK_COMMAND.match(command or '')
+    if match:
+        try:
+            return 'block_ip', str(ipaddress.ip_address(match.group(1)))
+        except ValueError:
+            pass
+    return 'command', None
+
+
+def queue_remediation(cursor, alert_id, command, requested_by='system'):
+    """Queue a remediation job and return its ID; an unfinished job for the alert is reused (caller commits)"""
+    cursor.execute("""
+        SELECT job_id FROM remediation_jobs
+        WHERE alert_id = ? AND status IN ('queued', 'running')
+    """, (alert_id,))
+    row = cursor.fetchone()
+    if row:
+        return row[0]
+    job_id = f"REM-{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    action, target = parse_remediation(command)
+    cursor.execute("""
+        INSERT INTO remediation_jobs (job_id, alert_id, action, target, command, requested_by, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (job_id, alert_id, action, target, command, requested_by, datetime.now().isoformat()))
+    return job_id
+
+
+# Backends: block(addresses) and run(command) return (success, output)
+
+def _run(args, timeout, stdin=None, shell=False):
+    result = subprocess.run(args, input=stdin, shell=shell, capture_output=True, text=True, timeout=timeout)
+    return result.returncode == 0, (result.stdout or result.stderr).strip()
+
+
+class DryRunBackend:
+    """Logs what would run; for testing without root"""
+
+    def __init__(self, settings):
+        self.settings = settings
+
+    def block(self, addresses):
+        logging.info(f"[dry run] block {len(addresses)} addresses: {', '.join(addresses)}")
+        return True, f"dry run: would block {', '.join(addresses)}"
+
+    def run(self, command):
+        logging.info(f"[dry run] {command}")
+        return True, f"dry run: would execute {command}"
+
+
+class IptablesBackend:
+    """One iptables-restore --noflush per batch and address family"""
+
+    def __init__(self, settings):
+        self.settings = settings
+
+    def _existing(self, save_cmd):
+        """Addresses already dropped in the chain, so repeats don't add duplicate rules"""
+        ok, output = _run(['sudo', save_cmd, '-t', 'filter'], self.settings['command_timeout_seconds'])
+        pattern = re.compile(rf"^-A {re.escape(self.settings['chain'])} -s (\S+?)(?:/32|/128)? -j DROP$")
+        return {m.group(1) for m in map(pattern.match, output.splitlines()) if m} if ok else set()
+
+    def block(self, addresses):
+        outputs = []
+        success = True
+        for version, save_cmd, restore_cmd in ((4, 'iptables-save', 'iptables-restore'),
+                                               (6, 'ip6tables-save', 'ip6tables-restore')):
+            family = [ip for ip in addresses if ipaddress.ip_address(ip).version == version]
+            if not family:
+                continue
+            existing = self._existing(save_cmd)
+            new = [ip for ip in family if ip not in existing]
+            if not new:
+                outputs.append(f"already blocked: {', '.join(family)}")
+                continue
+            rules = ''.join(f"-A {self.settings['chain']} -s {ip} -j DROP\n" for ip in new)
+            ok, output = _run(['sudo', restore_cmd, '--noflush'], self.settings['command_timeout_seconds'],
+                              stdin=f"*filter\n{rules}COMMIT\n")
+            success = success and ok
+            outputs.append(output or f"blocked {len(new)} addresses via {restore_cmd}")
+        return success, '\n'.join(outputs)
+
+    def run(self, command):
+        return _run(command, self.settings['command_timeout_seconds'], shell=True)
+
+
+class IpsetBackend(IptablesBackend):
+    """Blocks are set membership updates behind one DROP rule per address family"""
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.ready = set()
+
+    def _set_name(self, version):
+        return self.settings['set_name'] + ('6' if version == 6 else '')
+
+    def _ensure(self, version):
+        """Create the set and its DROP rule once per process"""
+        if version in self.ready:
+            return True, ''
+        timeout = self.settings['command_timeout_seconds']
+        name = self._set_name(version)
+        iptables = 'iptables' if version == 4 else 'ip6tables'
+        ok, output = _run(['sudo', 'ipset', 'create', name, 'hash:ip',
+                           'family', 'inet' if version == 4 else 'inet6', '-exist'], timeout)
+        if not ok:
+            return ok, output
+        rule = [self.settings['chain'], '-m', 'set', '--match-set', name, 'src', '-j', 'DROP']
+        if not _run(['sudo', iptables, '-C'] + rule, timeout)[0]:
+            ok, output = _run(['sudo', iptables, '-I'] + rule, timeout)
+        if ok:
+            self.ready.add(version)
+        return ok, output
+
+    def block(self, addresses):
+        outputs = []
+        success = True
+        for version in (4, 6):
+            family = [ip for ip in addresses if ipaddress.ip_address(ip).version == version]
+            if not family:
+                continue
+            ok, output = self._ensure(version)
+            if ok:
+                name = self._set_name(version)
+                ok, output = _run(['sudo', 'ipset', 'restore', '-exist'], self.settings['command_timeout_seconds'],
+                                  stdin=''.join(f"add {name} {ip}\n" for ip in family))
+            success = success and ok
+            outputs.append(output or f"added {len(family)} addresses to {self._set_name(version)}")
+        return success, '\n'.join(outputs)
+
+
+BACKENDS = {
+    'iptables': IptablesBackend,
+    'ipset': IpsetBackend,
+    'dry_run': DryRunBackend,
+}
+
+
+class RemediationWorker:
+    """Drains remediation_jobs in a daemon thread"""
+
+    def __init__(self, db_path, settings=None):
+        self.db_path = db_path
+        self.settings = dict(DEFAULT_SETTINGS, **(settings or {}))
+        backend = BACKENDS.get(self.settings['backend'])
+        if not backend:
+            logging.error(f"Unknown remediation backend {self.settings['backend']}, using dry_run")
+            backend = DryRunBackend
+        self.backend = backend(self.settings)
+        self.thread = None
+
+    def start(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        init_remediation_table(conn.cursor())
+        # Jobs interrupted by a restart run again; blocks are idempotent
+        conn.execute("UPDATE remediation_jobs SET status = 'queued' WHERE status = 'running'")
+        conn.commit()
+        conn.close()
+        self.thread = threading.Thread(target=self.run, name='remediation-worker', daemon=True)
+        self.thread.start()
+        logging.info(f"✓ Remediation worker started ({self.settings['backend']} backend)")
+
+    def _claim(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT job_id, alert_id, command, requested_by FROM remediation_jobs
+            WHERE status = 'queued' ORDER BY created_at LIMIT ?
+        """, (self.settings['batch_size'],))
+        # Action and address are re-derived from the command; the dashboard queues jobs too
+        jobs = [(job_id, alert_id) + parse_remediation(command) + (command, requested_by)
+                for job_id, alert_id, command, requested_by in cursor.fetchall()]
+        started = datetime.now().isoformat()
+        cursor.executemany("UPDATE remediation_jobs SET status = 'running', started_at = ? WHERE job_id = ?",
+                           [(started, job[0]) for job in jobs])
+        conn.commit()
+        conn.close()
+        return jobs
+
+    def _finish(self, outcomes):
+        """Record job results, alert history, and resolve remediated alerts in one transaction"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        cursor = conn.cursor()
+        finished = datetime.now().isoformat()
+        for (job_id, alert_id, _, _, command, requested_by), (success, output) in outcomes:
+            cursor.execute("""
+                UPDATE remediation_jobs SET status = ?, result = ?, finished_at = ? WHERE job_id = ?
+            """, ('done' if success else 'failed', output[:2000], finished, job_id))
+            cursor.execute("""
+                INSERT INTO alert_history (alert_id, action, action_by, notes)
+                VALUES (?, ?, ?, ?)
+            """, (alert_id, 'auto_remediation' if success else 'auto_remediation_failed', requested_by,
+                  f"Job {job_id}: {command}\nResult: {output}"))
+            if success:
+                cursor.execute("""
+                    UPDATE security_alerts
+                    SET status = 'resolved',
+                        resolved_at = CURRENT_TIMESTAMP,
+                        resolved_by = 'auto_remediation',
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE alert_id = ?
+                """, (alert_id,))
+        conn.commit()
+        conn.close()
+
+    def process(self):
+        """Run one batch of queued jobs; returns how many were handled"""
+        jobs = self._claim()
+        if not jobs:
+            return 0
+        outcomes = []
+
+        blocks = [job for job in jobs if job[2] == 'block_ip']
+        if blocks:
+            addresses = list(dict.fromkeys(job[3] for job in blocks))
+            try:
+                result = self.backend.block(addresses)
+            except Exception as e:
+                result = (False, str(e))
+            outcomes.extend((job, result) for job in blocks)
+            logging.info(f"{'✓' if result[0] else '✗'} Remediation blocked {len(addresses)} addresses "
+                         f"for {len(blocks)} jobs")
+
+        for job in jobs:
+            if job[2] == 'block_ip':
+                continue
+            try:
+                result = self.backend.run(job[4])
+            except Exception as e:
+                result = (False, str(e))
+            outcomes.append((job, result))
+            if not result[0]:
+                logging.error(f"✗ Remediation job {job[0]} failed: {result[1]}")
+
+        self._finish(outcomes)
+        return len(jobs)
+
+    def run(self):
+        while True:
+            try:
+                if self.process():
+                    continue  # drain backlog before sleeping
+            except Exception as e:
+                logging.error(f"Error processing remediation jobs: {e}")
+            time.sleep(self.settings['poll_interval_seconds'])
@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+NetGuard Pro - Streaming Rule Engine
+Evaluates config/alert_rules.json thresholds over per-key sliding windows as
+collector events arrive, instead of polling packet tables
+"""
+
+import logging
+from collections import OrderedDict
+
+from cardinality import BucketedSketch
+from dns_detector import (DnsDetector, looks_generated,
+                          DEFAULT_SUBDOMAIN_THRESHOLD, DEFAULT_ENTROPY_THRESHOLD)
+from domain_index import is_local_ip, registered_domain
+from event_bus import KIND_PACKET, KIND_DNS, KIND_FTP
+from alert_manager import DEDUP_FLOW, DEDUP_SOURCE
+from threat_intel import ThreatIntel, INTEL_DIR
+
+WINDOW_BUCKETS = 12  # buckets per window (60s window -> 5s resolution)
+MAX_KEYS_PER_RULE = 10000  # tracked sources per rule, least recently seen evicted
+
+# Which collectors feed which signal; tcpdump and tshark see the same packets
+# and Suricata re-reports them, so counted signals take a single source.
+# DNS rules count distinct names and can take every source.
+DEFAULT_EVENT_SOURCES = {
+    'packets': ['tcpdump'],
+    'dns': ['tcpdump', 'tshark', 'suricata'],
+    'auth': ['suricata'],
+    'intel': ['tcpdump', 'tshark', 'suricata'],
+}
+
+AUTH_FAILURE_HTTP_STATUS = (401,)
+AUTH_FAILURE_FTP_CODES = ('530',)
+DEFAULT_DNS_RATE_THRESHOLD = 100  # distinct names per source per timeframe
+DEFAULT_DNS_TIMEFRAME = 60
+DEFAULT_INTEL_COOLDOWN = 3600  # one alert per device and indicator per hour
+
+
+def dns_question(event):
+    """The queried name when the event is a DNS question (not an answer), else None"""
+    query = event.get('dns_query')
+    if not query:
+        return None
+    if event.get('kind') == KIND_DNS and event.get('dns_type') not in (None, 'query'):
+        return None  # Suricata logs answers as separate records
+    if event.get('kind') == KIND_PACKET and event.get('dest_port') not in (53, '53'):
+        return None  # responses echo the question
+    return query
+
+
+class SlidingWindowCounter:
+    """Sum over the last `timeframe` seconds kept in a ring of fixed buckets"""
+
+    __slots__ = ('bucket_width', 'counts', 'stamps', 'fired_at')
+
+    def __init__(self, timeframe, buckets=WINDOW_BUCKETS):
+        self.bucket_width = timeframe / buckets
+        self.counts = [0] * buckets
+        self.stamps = [-1] * buckets  # absolute bucket number held by each slot
+        self.fired_at = None
+
+    def add(self, ts, value=1):
+        """Count value at time ts; returns False if ts is already outside the window"""
+        bucket = int(ts // self.bucket_width)
+        slot = bucket % len(self.counts)
+        if self.stamps[slot] != bucket:
+            if self.stamps[slot] > bucket:
+                return False  # older than the window, slot already reused
+            self.counts[slot] = 0
+            self.stamps[slot] = bucket
+        self.counts[slot] += value
+        return True
+
+    def total(self, now):
+        newest = int(now // self.bucket_width)
+        oldest = newest - len(self.counts)
+        return sum(count for count, stamp in zip(self.counts, self.stamps)
+                   if oldest < stamp <= newest)
+
+
+class WindowRule:
+    """Threshold rule over a per-key sliding window; subclasses pick the signal"""
+
+    signal = 'packets'
+    window_class = SlidingWindowCounter
+    needs_threshold = True
+    dedup_scope = DEDUP_SOURCE  # matches are per-source aggregates over many destinations
+
+    def __init__(self, rule, sources, max_keys=MAX_KEYS_PER_RULE):
+        self.name = rule['name']
+        self.severity = rule.get('severity', 'MEDIUM')
+        self.threshold = rule['threshold']
+        self.timeframe = rule.get('timeframe_seconds', 60)
+        self.auto_remediation = rule.get('auto_remediation', False)
+        self.dedup_scope = rule.get('dedup_scope', self.dedup_scope)
+        self.sources = set(sources)
+        self.max_keys = max_keys
+        self.windows = OrderedDict()
+
+    def extract(self, event):
+        """Return (key, value) for events this rule counts, else None"""
+        raise NotImplementedError
+
+    def window_for(self, key):
+        window = self.windows.get(key)
+        if window is None:
+            window = self.windows[key] = self.window_class(self.timeframe)
+            if len(self.windows) > self.max_keys:
+                self.windows.popitem(last=False)
+        else:
+            self.windows.move_to_end(key)
+        return window
+
+    def fire(self, window, key, value, event, metric, threshold=None):
+        """Build a match unless this key already fired within the timeframe"""
+        ts = event['ts']
+        if window.fired_at is not None and ts - window.fired_at < self.timeframe:
+            return None
+        window.fired_at = ts
+        return {
+            'rule': self.name,
+            'severity': self.severity,
+            'key': key,
+            'metric': metric,
+            'value': value,
+            'threshold': self.threshold if threshold is None else threshold,
+            'timeframe': self.timeframe,
+            'auto_remediation': self.auto_remediation,
+            'dedup_scope': self.dedup_scope,
+            'event': event,
+        }
+
+    def process(self, event):
+        if event.get('source') not in self.sources:
+            return None
+        extracted = self.extract(event)
+        if not extracted:
+            return None
+        key, value = extracted
+        window = self.window_for(key)
+        # A distinct-count window that didn't change can't have crossed the threshold
+        if not window.add(event['ts'], value):
+            return None
+        total = window.total(event['ts'])
+        if total > self.threshold:
+            return self.fire(window, key, total, event, self.metric)
+        return None
+
+
+class ConnectionAttemptRule(WindowRule):
+    """TCP SYNs without ACK per source"""
+
+    metric = 'connection_attempts'
+
+    def extract(self, event):
+        if event.get('kind') == KIND_PACKET and event.get('syn') and not event.get('ack'):
+            return event.get('src_ip'), 1
+        return None
+
+
+class FailedLoginRule(WindowRule):
+    """HTTP 401 responses and FTP 530 replies per client"""
+
+    signal = 'auth'
+    metric = 'failed_login_attempts'
+
+    def extract(self, event):
+        kind = event.get('kind')
+        try:
+            status = int(event.get('http_status') or 0)
+        except (TypeError, ValueError):
+            status = 0
+        if status in AUTH_FAILURE_HTTP_STATUS:
+            # Suricata reports the flow direction; a raw response packet is server -> client
+            client = event.get('dest_ip') if kind == KIND_PACKET else event.get('src_ip')
+            return client, 1
+        if kind == KIND_FTP and any(str(code) in AUTH_FAILURE_FTP_CODES
+                                    for code in event.get('ftp_completion_code') or []):
+            return event.get('src_ip'), 1
+        return None
+
+
+class OutboundBytesRule(WindowRule):
+    """Bytes sent from a local device to external addresses"""
+
+    metric = 'outbound_bytes'
+
+    def extract(self, event):
+        if event.get('kind') != KIND_PACKET:
+            return None
+        src_ip = event.get('src_ip')
+        if is_local_ip(src_ip) and event.get('dest_ip') and not is_local_ip(event['dest_ip']):
+            return src_ip, int(event.get('bytes') or 0)
+        return None
+
+
+class DistinctCountRule(WindowRule):
+    """Distinct values per source over a window of HyperLogLog buckets"""
+
+    window_class = BucketedSketch
+
+
+class DistinctPortsRule(DistinctCountRule):
+    """Port scan: distinct destination ports probed by a source"""
+
+    metric = 'distinct_dest_ports'
+
+    def extract(self, event):
+        if event.get('kind') == KIND_PACKET and event.get('syn') and not event.get('ack') \
+                and event.get('dest_port'):
+            return event.get('src_ip'), event['dest_port']
+        return None
+
+
+class DistinctDestinationsRule(DistinctCountRule):
+    """Network sweep: distinct hosts probed (TCP SYN or ICMP) by a source"""
+
+    metric = 'distinct_dest_ips'
+
+    def extract(self, event):
+        if event.get('kind') != KIND_PACKET or not event.get('dest_ip'):
+            return None
+        if (event.get('syn') and not event.get('ack')) or event.get('protocol') in ('ICMP', 'ICMPv6'):
+            return event.get('src_ip'), event['dest_ip']
+        return None
+
+
+class DistinctDomainsRule(DistinctCountRule):
+    """Domain fan-out: distinct registered domains a source resolves"""
+
+    signal = 'dns'
+    metric = 'distinct_domains'
+
+    def extract(self, event):
+        domain = registered_domain(dns_question(event))
+        return (event.get('src_ip'), domain) if domain else None
+
+
+class DnsTunnelingRule(WindowRule):
+    """Per-source rate of distinct query names plus the DNS detector's
+    per-query entropy/label checks and per-domain unique subdomain rate
+
+    Counting distinct names makes the rate immune to the same question being
+    reported by several collectors
+    """
+
+    signal = 'dns'
+    metric = 'dns_query_rate'
+    window_class = BucketedSketch
+
+    def __init__(self, rule, sources, max_keys=MAX_KEYS_PER_RULE):
+        rule = dict(rule)
+        self.detector = DnsDetector(
+            max_query_length=rule['threshold'],
+            subdomain_threshold=rule.get('subdomain_threshold', DEFAULT_SUBDOMAIN_THRESHOLD),
+            entropy_threshold=rule.get('entropy_threshold', DEFAULT_ENTROPY_THRESHOLD),
+            timeframe=rule.get('timeframe_seconds', DEFAULT_DNS_TIMEFRAME))
+        rule['threshold'] = rule.get('rate_threshold', DEFAULT_DNS_RATE_THRESHOLD)
+        rule.setdefault('timeframe_seconds', DEFAULT_DNS_TIMEFRAME)
+        super().__init__(rule, sources, max_keys)
+
+    def extract(self, event):
+        query = dns_question(event)
+        return (event.get('src_ip'), query.lower()) if query else None
+
+    def process(self, event):
+        match = super().process(event)
+        if match or event.get('source') not in self.sources:
+            return match
+        query = dns_question(event)
+        if not query:
+            return None
+        key = event.get('src_ip')
+        for finding in self.detector.observe(query, event['ts']):
+            match = self.fire(self.window_for(key), key, finding['value'], event,
+                              finding['metric'], finding['threshold'])
+            if match:
+                match['domain'] = finding['domain']
+                match['detail'] = finding['detail']
+                return match
+        return None
+
+
+class GeneratedDomainsRule(DistinctCountRule):
+    """DGA: distinct algorithmically generated-looking domains a source resolves"""
+
+    signal = 'dns'
+    metric = 'dga_domains'
+
+    def extract(self, event):
+        domain = registered_domain(dns_question(event))
+        return (event.get('src_ip'), domain) if looks_generated(domain) else None
+
+
+class IntelRule(WindowRule):
+    """Contact with a threat-intel indicator: listed IP/network on either side of
+    a flow, a listed domain in a DNS question, HTTP host or TLS SNI, or a
+    listed JA3 fingerprint
+
+    Every event is checked; the intel index answers most of them from its
+    Bloom filter. The window only carries the per-(device, indicator) cooldown.
+    """
+
+    signal = 'intel'
+    metric = 'known_c2_ip_contacted'
+    needs_threshold = False
+    dedup_scope = DEDUP_FLOW  # one alert per contacted remote
+
+    def __init__(self, rule, sources, max_keys=MAX_KEYS_PER_RULE):
+        rule = dict(rule)
+        rule.setdefault('threshold', 0)
+        rule.setdefault('timeframe_seconds', DEFAULT_INTEL_COOLDOWN)
+        super().__init__(rule, sources, max_keys)
+        self.intel = ThreatIntel(rule.get('feeds_dir', INTEL_DIR))
+
+    def lookup(self, event):
+        """(local device, indicator, kind, feed, remote ip) for the first hit, else None"""
+        index = self.intel.index
+        src_ip, dest_ip = event.get('src_ip'), event.get('dest_ip')
+        for remote, local in ((dest_ip, src_ip), (src_ip, dest_ip)):
+            if remote and not is_local_ip(remote):
+                hit = index.match_ip(remote)
+                if hit:
+                    return local, hit[0], 'ip', hit[1], remote
+        hit = index.match_domain(dns_question(event))
+        if hit:
+            return src_ip, hit[0], 'domain', hit[1], None  # dest_ip is the resolver
+        for name in (event.get('http_host'), event.get('tls_server_name')):
+            hit = index.match_domain(name)
+            if hit:
+                return src_ip, hit[0], 'domain', hit[1], dest_ip
+        hit = index.match_ja3(event.get('ja3'))
+        if hit:
+            return src_ip, hit[0], 'ja3', hit[1], dest_ip
+        return None
+
+    def process(self, event):
+        if event.get('source') not in self.sources:
+            return None
+        self.intel.maybe_reload()
+        hit = self.lookup(event)
+        if not hit:
+            return None
+        local, indicator, kind, feed, remote = hit
+        if not local:
+            return None
+        match = self.fire(self.window_for((local, indicator)), local, 1, event, self.metric)
+        if match:
+            match['remote_ip'] = remote
+            if kind == 'domain':
+                match['domain'] = indicator
+            match['detail'] = f"{kind} {indicator} listed in feed {feed}"
+            match['description'] = f"{local} contacted {indicator} ({kind} indicator from feed {feed})"
+        return match
+
+
+# Rule evaluators keyed by the metric the rule's condition starts with
+EVALUATORS = {
+    'connection_attempts': ConnectionAttemptRule,
+    'distinct_dest_ports': DistinctPortsRule,
+    'distinct_dest_ips': DistinctDestinationsRule,
+    'distinct_domains': DistinctDomainsRule,
+    'failed_login_attempts': FailedLoginRule,
+    'outbound_bytes': OutboundBytesRule,
+    'dns_query_length': DnsTunnelingRule,
+    'dga_domains': GeneratedDomainsRule,
+    'known_c2_ip_contacted': IntelRule,
+}
+
+
+class RuleEngine:
+    """Routes events through every configured window rule"""
+
+    def __init__(self, config, on_match):
+        self.on_match = on_match
+        self.rules = []
+        self.events_processed = 0
+        self.matches = 0
+
+        sources = dict(DEFAULT_EVENT_SOURCES)
+        sources.update(config.get('event_sources', {}))
+
+        for rule in config.get('rules', []):
+            metric = rule.get('condition', '').split(' ')[0]
+            evaluator = EVALUATORS.get(metric)
+            if not evaluator or (evaluator.needs_threshold and 'threshold' not in rule):
+                logging.info(f"Rule engine: {rule.get('name')} has no streaming evaluator, skipped")
+                continue
+            self.rules.append(evaluator(rule, sources.get(evaluator.signal, [])))
+
+        logging.info(f"✓ Rule engine loaded {len(self.rules)} streaming rules")
+
+    def process(self, events):
+        """Evaluate a batch of events; returns number of rule matches"""
+        matched = 0
+        for event in events:
+            if not event.get('ts') or not event.get('src_ip'):
+                continue
+            for rule in self.rules:
+                match = rule.process(event)
+                if match:
+                    matched += 1
+                    try:
+                        self.on_match(match)
+                    except Exception as e:
+                        logging.error(f"Error handling {match['rule']} match: {e}")
+        self.events_processed += len(events)
+        self.matches += matched
+        return matched
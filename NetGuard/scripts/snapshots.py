@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+NetGuard Pro - Aggregation Snapshots
+Each interval is aggregated once, by the 5-minute aggregator, into a
+versioned snapshot (zlib-compressed compact JSON in the snapshots table,
+plus an in-memory copy) that the AI connectors and the dashboard read
+"""
+
+import json
+import zlib
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+
+from ai_data_exporter import export_to_ai_format
+from comprehensive_data_aggregator import aggregate_all_data
+
+DB_PATH = "/home/jarvis/NetGuard/network.db"
+
+SNAPSHOT_FORMAT = 1  # bump when the payload layout changes
+DEFAULT_SNAPSHOT_SETTINGS = {
+    'keep': 288,  # a day of 5-minute snapshots
+    'max_age_seconds': 600,  # older than this, consumers aggregate for themselves
+}
+
+_latest = None  # (version, created_at, data) last built or read by this process
+_lock = threading.Lock()
+
+
+def init_snapshot_table(cursor):
+    """Create the snapshot table if missing"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS snapshots (
+            version INTEGER PRIMARY KEY AUTOINCREMENT,
+            window_start TEXT NOT NULL,
+            window_end TEXT NOT NULL,
+            window_minutes INTEGER NOT NULL,
+            format INTEGER NOT NULL,
+            payload BLOB NOT NULL,
+            raw_bytes INTEGER,
+            created_at TEXT NOT NULL
+        )
+    """)
+
+
+def encode(data):
+    raw = json.dumps(data, separators=(',', ':'), ensure_ascii=False, default=str).encode('utf-8')
+    return zlib.compress(raw, 6), len(raw)
+
+
+def decode(payload):
+    return json.loads(zlib.decompress(payload).decode('utf-8'))
+
+
+def build_sections(window, config=None):
+    """The exporter and comprehensive views over the same window as the aggregator's own data"""
+    sections = {}
+    for name, build in (('export', lambda: export_to_ai_format(window.minutes, window)),
+                        ('comprehensive', lambda: aggregate_all_data(config or {}, window))):
+        try:
+            sections[name] = build()
+        except Exception as e:
+            logging.error(f"Error building snapshot section {name}: {e}")
+            sections[name] = None
+    return sections
+
+
+def publish_snapshot(window, sections, settings=None, db_path=DB_PATH):
+    """Store one interval's snapshot and keep it in memory; returns its version"""
+    global _latest
+    settings = dict(DEFAULT_SNAPSHOT_SETTINGS, **(settings or {}))
+    created_at = datetime.now().isoformat()
+    data = dict(sections, format=SNAPSHOT_FORMAT,
+                window={'start': window.start.isoformat(), 'end': window.end.isoformat(),
+                        'minutes': window.minutes})
+    payload, raw_bytes = encode(data)
+
+    conn = sqlite3.connect(db_path, timeout=30)
+    cursor = conn.cursor()
+    init_snapshot_table(cursor)
+    cursor.execute("""
+        INSERT INTO snapshots (window_start, window_end, window_minutes, format, payload, raw_bytes, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (data['window']['start'], data['window']['end'], window.minutes, SNAPSHOT_FORMAT,
+          payload, raw_bytes, created_at))
+    version = cursor.lastrowid
+    cursor.execute("DELETE FROM snapshots WHERE version <= ?", (version - settings['keep'],))
+    conn.commit()
+    conn.close()
+
+    with _lock:
+        _latest = (version, created_at, data)
+    logging.info(f"✓ Snapshot v{version} published ({raw_bytes:,} bytes JSON, {len(payload):,} stored)")
+    return version
+
+
+def latest_snapshot(max_age_seconds=None, db_path=DB_PATH):
+    """(version, data) of the newest snapshot, or (None, None) if there is none fresh enough
+
+    Only the version is read from the database when the in-memory copy is current
+    """
+    global _latest
+    max_age = DEFAULT_SNAPSHOT_SETTINGS['max_age_seconds'] if max_age_seconds is None else max_age_seconds
+    try:
+        conn = sqlite3.connect(db_path, timeout=10)
+        row = conn.execute("""
+            SELECT version, created_at, format FROM snapshots ORDER BY version DESC LIMIT 1
+        """).fetchone()
+        if not row or row[2] != SNAPSHOT_FORMAT:
+            conn.close()
+            return None, None
+        version, created_at, _ = row
+        with _lock:
+            cached = _latest
+        if not cached or cached[0] != version:
+            payload = conn.execute("SELECT payload FROM snapshots WHERE version = ?", (version,)).fetchone()[0]
+            cached = (version, created_at, decode(payload))
+            with _lock:
+                _latest = cached
+        conn.close()
+    except (sqlite3.Error, zlib.error, ValueError) as e:
+        logging.warning(f"Could not read snapshot: {e}")
+        return None, None
+
+    age = (datetime.now() - datetime.fromisoformat(cached[1])).total_seconds()
+    if age > max_age:
+        logging.info(f"Latest snapshot v{cached[0]} is {age:.0f}s old (max {max_age}s)")
+        return None, None
+    return cached[0], cached[2]
+
+
+def snapshot_section(name, max_age_seconds=None, db_path=DB_PATH):
+    """One consumer's view from the newest fresh snapshot, or None"""
+    version, data = latest_snapshot(max_age_seconds, db_path)
+    if data is None or data.get(name) is None:
+        return None
+    logging.info(f"✓ Using snapshot v{version} ({data['window']['start']} - {data['window']['end']})")
+    return data[name]
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+NetGuard Pro - Alert Storm Control
+Per-rule and per-source token buckets in front of alert creation; detections
+over budget are counted in memory and rolled up into summary alerts
+"""
+
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+DEFAULT_STORM_CONTROL = {
+    'rule_rate_per_minute': 30,  # new alerts per alert type
+    'rule_burst': 20,
+    'source_rate_per_minute': 6,  # new alerts per source IP
+    'source_burst': 5,
+}
+MAX_SOURCE_BUCKETS = 10000
+
+
+def subnet_scope(ip_address):
+    """Roll-up label for a source's /24 (IPv4) or /64 (IPv6)"""
+    if not ip_address:
+        return 'unknown sources'
+    if ':' in ip_address:
+        return ':'.join(ip_address.split(':')[:4]) + '::/64'
+    return '.'.join(ip_address.split('.')[:3]) + '.x'
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens/second refill, at most `burst` stored"""
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.time()
+
+    def available(self, now=None):
+        """Refill, then True if a token can be taken (without taking it)"""
+        now = now or time.time()
+        # now may predate a bucket created after it was read
+        self.tokens = min(self.burst, self.tokens + max(0.0, now - self.updated) * self.rate)
+        self.updated = max(now, self.updated)
+        return self.tokens >= 1
+
+    def take(self, now=None):
+        if self.available(now):
+            self.tokens -= 1
+            return True
+        return False
+
+
+def init_suppression_table(cursor):
+    """Create the suppressed-alert counter table if missing"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS alert_suppression (
+            alert_type TEXT NOT NULL,
+            source_ip TEXT NOT NULL DEFAULT '',
+            suppressed_count INTEGER DEFAULT 0,
+            first_suppressed TEXT,
+            last_suppressed TEXT,
+            PRIMARY KEY (alert_type, source_ip)
+        )
+    """)
+
+
+class StormControl:
+    """Admits or suppresses new alerts; suppressed counts wait in memory"""
+
+    def __init__(self, config=None):
+        config = dict(DEFAULT_STORM_CONTROL, **(config or {}))
+        self.rule_rate = config['rule_rate_per_minute'] / 60.0
+        self.rule_burst = config['rule_burst']
+        self.source_rate = config['source_rate_per_minute'] / 60.0
+        self.source_burst = config['source_burst']
+        self.rule_buckets = {}
+        self.source_buckets = OrderedDict()
+        # (alert_type, scope, is_subnet) -> [count, severity, first, last]
+        self.suppressed = {}
+
+    def admit(self, alert_type, source_ip, severity):
+        """True if a new alert may be created, else count it as suppressed"""
+        now = time.time()
+        rule_bucket = self.rule_buckets.get(alert_type)
+        if rule_bucket is None:
+            rule_bucket = self.rule_buckets[alert_type] = TokenBucket(self.rule_rate, self.rule_burst)
+
+        source_bucket = self.source_buckets.get(source_ip)
+        if source_bucket is None:
+            source_bucket = self.source_buckets[source_ip] = TokenBucket(self.source_rate, self.source_burst)
+            if len(self.source_buckets) > MAX_SOURCE_BUCKETS:
+                self.source_buckets.popitem(last=False)
+        else:
+            self.source_buckets.move_to_end(source_ip)
+
+        # Both budgets are checked before either is spent: a noisy host doesn't
+        # drain the rule's budget, and a rule-level denial doesn't cost the source
+        source_ok = source_bucket.available(now)
+        if source_ok and rule_bucket.available(now):
+            source_bucket.tokens -= 1
+            rule_bucket.tokens -= 1
+            return True
+
+        # A noisy host rolls up on its own; a rule flooded by many hosts rolls up per subnet
+        key = (alert_type, source_ip, False) if not source_ok else (alert_type, subnet_scope(source_ip), True)
+        seen = datetime.now().isoformat()
+        entry = self.suppressed.get(key)
+        if entry:
+            entry[0] += 1
+            entry[1] = severity
+            entry[3] = seen
+        else:
+            self.suppressed[key] = [1, severity, seen, seen]
+        return False
+
+    def drain(self):
+        """Return and reset the suppressed counts since the last drain"""
+        suppressed, self.suppressed = self.suppressed, {}
+        return suppressed
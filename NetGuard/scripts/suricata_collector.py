@@ -12,6 +12,9 @@ import sqlite3
 import logging
 from datetime import datetime
 from pathlib import Path
+from domain_index import DomainIndex
+from event_bus import EventPublisher, suricata_event
+from time_window import window_index
 
 # Configuration
 SURICATA_LOG_DIR = "/var/log/suricata"  # Default Suricata log directory
@@ -24,6 +27,10 @@ POSITION_FILE = "/home/jarvis/NetGuard/logs/system/suricata_positions.json"
 # EVE log categories
 CATEGORIES = ['alerts', 'http', 'dns', 'tls', 'files', 'flow', 'ssh', 'smtp', 'ftp', 'anomaly', 'stats']
 
+# Device -> domain communication index (created in collect_suricata_data)
+domain_index = None
+event_publisher = None
+
 # Setup logging
 logging.basicConfig(
     level=logging.DEBUG,
@@ -275,6 +282,7 @@ def create_table_if_not_exists(conn, category, table_name):
         return
     
     cursor.execute(sql)
+    window_index(cursor, table_name)
     conn.commit()
 
 def extract_alert_data(event):
@@ -581,6 +589,25 @@ def insert_event(conn, category, table_name, event):
         logging.debug(f"Error inserting {category} event: {e}")
         return False
 
+def record_domain(event, category):
+    """Feed DNS/TLS/HTTP hostnames into the device domain index"""
+    if category == 'dns':
+        # Answers repeat the question's rrname from the resolver's side
+        if event.get('dns', {}).get('type') == 'query':
+            domain_index.record_query(event.get('src_ip'), event['dns'].get('rrname'))
+        return
+    elif category == 'tls':
+        hostname = event.get('tls', {}).get('sni')
+        size = 0
+    elif category == 'http':
+        hostname = event.get('http', {}).get('hostname')
+        size = event.get('http', {}).get('length') or 0
+    else:
+        return
+    
+    if hostname:
+        domain_index.record(event.get('src_ip'), event.get('dest_ip'), hostname, size)
+
 def process_eve_log(category, log_file):
     """Process Suricata EVE log file for a specific category"""
     try:
@@ -757,6 +784,11 @@ def process_all_categories(log_file):
                     # Insert event
                     if insert_event(conn, category, category_data[category]['table_name'], event):
                         category_data[category]['inserted_count'] += 1
+                    
+                    if domain_index:
+                        record_domain(event, category)
+                    if event_publisher:
+                        event_publisher.publish(suricata_event(event))
                         
             except json.JSONDecodeError:
                 continue
@@ -764,6 +796,11 @@ def process_all_categories(log_file):
         conn.commit()
         conn.close()
         
+        if domain_index:
+            domain_index.flush()
+        if event_publisher:
+            event_publisher.flush()
+        
         # Save new position
         save_position(log_file, new_position)
         
@@ -798,6 +835,10 @@ def collect_suricata_data():
     # Main EVE log file (we'll read from this)
     eve_log = os.path.join(SURICATA_LOG_DIR, "eve.json")
     
+    global domain_index, event_publisher
+    domain_index = DomainIndex(DB_PATH)
+    event_publisher = EventPublisher('suricata')
+    
     while True:
         try:
             # Process ALL categories in a single pass through the file
@@ -14,6 +14,11 @@ import logging
 import subprocess
 from datetime import datetime
 from pathlib import Path
+from domain_index import DomainIndex, is_local_ip
+from device_baseline import BaselineEngine
+from event_bus import EventPublisher, packet_event
+from packet_scoring import PacketScorer, RowColumns
+from time_window import window_index
 
 # Configuration
 INTERFACE = "wlo1"  # WiFi for comprehensive traffic capture
@@ -45,6 +50,12 @@ logging.basicConfig(
 # Global process handle
 tcpdump_process = None
 
+# Device -> domain communication index and behavior baselines (created in main)
+domain_index = None
+baseline_engine = None
+event_publisher = None
+packet_scorer = None
+
 
 def save_position(pcap_file, processed=True, file_size=0):
     """Track processed PCAP files with size"""
@@ -204,6 +215,7 @@ def create_table_if_not_exists(conn, table_name):
     cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_dest_ip ON {table_name}(dest_ip)")
     cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_protocol ON {table_name}(protocol)")
     cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_timestamp ON {table_name}(timestamp)")
+    window_index(cursor, table_name)
     
     conn.commit()
     logging.debug(f"Table created: {table_name}")
@@ -223,6 +235,7 @@ def parse_packet_with_tshark(pcap_file):
             '-T', 'json',
             '-e', 'frame.number',
             '-e', 'frame.time',
+            '-e', 'frame.time_epoch',
             '-e', 'frame.len',
             '-e', 'eth.src',
             '-e', 'eth.dst',
@@ -386,23 +399,10 @@ def extract_packet_data(packet_json):
                 except:
                     data[key] = None
         
-        # Threat analysis
+        # Threat analysis runs per batch in insert_packets (packet_scoring)
         data['threat_score'] = 0
         data['is_suspicious'] = 0
         
-        # Analyze for threats
-        if data.get('dest_port') and data['dest_port'] > 50000 and data.get('tcp_syn'):
-            data['threat_score'] += 3
-        
-        if data.get('tcp_rst') and data.get('tcp_syn'):
-            data['threat_score'] += 2
-        
-        if data.get('ip_ttl') and data['ip_ttl'] < 30:
-            data['threat_score'] += 1
-        
-        if data['threat_score'] > 3:
-            data['is_suspicious'] = 1
-        
         return data
         
     except Exception as e:
@@ -410,17 +410,42 @@ def extract_packet_data(packet_json):
         return None
 
 
+def observe_baselines(packet_data, seen_at=None):
+    """Feed a packet into the streaming baselines of its local endpoints, at its capture time"""
+    src_ip = packet_data.get('src_ip')
+    dest_ip = packet_data.get('dest_ip')
+    size = packet_data.get('frame_length') or 0
+    protocol = packet_data.get('protocol')
+    
+    if is_local_ip(src_ip):
+        # Outbound: the peer is one of this device's destinations
+        baseline_engine.observe(src_ip, size, destination=dest_ip, protocol=protocol,
+                                new_connection=bool(packet_data.get('tcp_syn') and not packet_data.get('tcp_ack')),
+                                seen_at=seen_at)
+    if is_local_ip(dest_ip):
+        baseline_engine.observe(dest_ip, size, protocol=protocol, seen_at=seen_at)
+
+
 def insert_packets(conn, table_name, packets):
     """Insert parsed packets into database"""
     cursor = conn.cursor()
     inserted = 0
     
+    decoded = []
     for packet_json in packets:
+        packet_data = extract_packet_data(packet_json)
+        if packet_data:
+            decoded.append((packet_json, packet_data))
+    
+    # Threat heuristics for the whole batch at once
+    if packet_scorer and decoded:
+        scores, suspicious = packet_scorer.score(RowColumns([data for _, data in decoded]))
+        for (_, packet_data), threat_score, is_suspicious in zip(decoded, scores, suspicious):
+            packet_data['threat_score'] = threat_score
+            packet_data['is_suspicious'] = is_suspicious
+    
+    for packet_json, packet_data in decoded:
         try:
-            packet_data = extract_packet_data(packet_json)
-            if not packet_data:
-                continue
-            
             # Insert packet
             columns = ', '.join(packet_data.keys())
             placeholders = ', '.join(['?' for _ in packet_data])
@@ -431,11 +456,30 @@ def insert_packets(conn, table_name, packets):
             )
             inserted += 1
             
+            if domain_index:
+                if packet_data.get('dns_query') and packet_data.get('dest_port') == 53:
+                    domain_index.record_query(packet_data['src_ip'], packet_data['dns_query'])
+                if packet_data.get('http_host'):
+                    domain_index.record(packet_data['src_ip'], packet_data['dest_ip'],
+                                        packet_data['http_host'], packet_data.get('frame_length') or 0)
+            
+            epoch = packet_json.get('_source', {}).get('layers', {}).get('frame.time_epoch')
+            epoch = epoch[0] if epoch else None
+            
+            if baseline_engine:
+                # Packet time, not ingest time: batches are processed minutes after capture
+                observe_baselines(packet_data, datetime.fromtimestamp(float(epoch)) if epoch else None)
+            
+            if event_publisher:
+                event_publisher.publish(packet_event('tcpdump', packet_data, epoch))
+            
         except Exception as e:
             logging.error(f"Error inserting packet: {e}")
             continue
     
     conn.commit()
+    if event_publisher:
+        event_publisher.flush()
     return inserted
 
 
@@ -500,6 +544,9 @@ def collect_and_analyze():
             
             # Mark as processed with current file size
             save_position(pcap_path, processed=True, file_size=current_size)
+        
+        if domain_index:
+            domain_index.flush()
             
         return True
         
@@ -539,6 +586,12 @@ def main():
     logging.info(f"Ring buffer: {RING_BUFFER_SIZE} files x {FILE_SIZE_MB}MB")
     logging.info(f"Database: {DB_PATH}")
     
+    global domain_index, baseline_engine, event_publisher, packet_scorer
+    domain_index = DomainIndex(DB_PATH)
+    baseline_engine = BaselineEngine(DB_PATH)
+    event_publisher = EventPublisher('tcpdump')
+    packet_scorer = PacketScorer('tcpdump')
+    
     # Start tcpdump
     if not start_tcpdump():
         logging.error("Failed to start tcpdump")
@@ -586,6 +639,9 @@ def main():
             except:
                 tcpdump_process.kill()
         
+        if baseline_engine:
+            baseline_engine.checkpoint()  # observe() checkpoints on its interval; keep the tail
+        
         logging.info("✓ tcpdump collector stopped")
     
     return 0
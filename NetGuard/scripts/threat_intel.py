@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+NetGuard Pro - Threat Intelligence Matcher
+Local indicator feeds (IPs, CIDR blocks, domains, JA3 hashes) indexed behind a
+Bloom filter, confirmed against a radix tree of networks and hashed sets, and
+rebuilt in the background when feed files change
+"""
+
+import os
+import re
+import math
+import time
+import hashlib
+import logging
+import ipaddress
+import threading
+from functools import lru_cache
+
+INTEL_DIR = "/home/jarvis/NetGuard/config/threat_intel"
+FEED_EXTENSIONS = ('.txt', '.csv', '.list')
+RELOAD_CHECK_INTERVAL = 30  # seconds between feed mtime checks
+BLOOM_ERROR_RATE = 0.001
+LOOKUP_CACHE_SIZE = 65536  # per index; traffic repeats the same addresses and names
+
+JA3_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+DOMAIN_PATTERN = re.compile(r'^(?:[a-z0-9_-]{1,63}\.)+[a-z0-9-]{2,63}$')
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter with double hashing over one blake2b digest"""
+
+    __slots__ = ('size', 'hashes', 'bits')
+
+    def __init__(self, capacity, error_rate=BLOOM_ERROR_RATE):
+        capacity = max(capacity, 1)
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class RadixTree:
+    """Binary radix tree of networks; lookup returns the longest matching prefix's value"""
+
+    __slots__ = ('root', 'width')
+
+    def __init__(self, width):
+        self.width = width
+        self.root = [None, None, None]  # [zero child, one child, value]
+
+    def insert(self, network, value):
+        node = self.root
+        address = int(network.network_address)
+        for i in range(network.prefixlen):
+            bit = (address >> (self.width - 1 - i)) & 1
+            if node[bit] is None:
+                node[bit] = [None, None, None]
+            node = node[bit]
+        node[2] = value
+
+    def lookup(self, address):
+        node = self.root
+        found = node[2]
+        for i in range(self.width):
+            node = node[(address >> (self.width - 1 - i)) & 1]
+            if node is None:
+                break
+            if node[2] is not None:
+                found = node[2]
+        return found
+
+
+def classify_indicator(token):
+    """('ip' | 'cidr' | 'ja3' | 'domain', normalized value) or None"""
+    token = token.strip().lower().rstrip('.')
+    if not token:
+        return None
+    try:
+        network = ipaddress.ip_network(token, strict=False)
+        if network.num_addresses == 1:
+            return 'ip', str(network.network_address)
+        return 'cidr', network
+    except ValueError:
+        pass
+    if JA3_PATTERN.match(token):
+        return 'ja3', token
+    if token.startswith('*.'):
+        token = token[2:]
+    if DOMAIN_PATTERN.match(token):
+        return 'domain', token
+    return None
+
+
+def feed_files(feed_dir):
+    if not os.path.isdir(feed_dir):
+        return []
+    return sorted(os.path.join(feed_dir, name) for name in os.listdir(feed_dir)
+                  if name.endswith(FEED_EXTENSIONS))
+
+
+def feed_signature(feed_dir):
+    """Changes whenever a feed file is added, removed or rewritten"""
+    signature = []
+    for path in feed_files(feed_dir):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        signature.append((path, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+class IntelIndex:
+    """Immutable once built; readers never see a half-loaded index"""
+
+    def __init__(self):
+        self.ips = {}  # address -> feed
+        self.domains = {}  # domain -> feed (subdomains match too)
+        self.ja3 = {}  # hash -> feed
+        self.trees = {4: RadixTree(32), 6: RadixTree(128)}
+        self.prefix_lengths = {4: set(), 6: set()}
+        self.bloom = BloomFilter(0)
+        self.count = 0
+        self.match_ip = lru_cache(maxsize=LOOKUP_CACHE_SIZE)(self._match_ip)
+        self.match_domain = lru_cache(maxsize=LOOKUP_CACHE_SIZE)(self._match_domain)
+
+    @classmethod
+    def from_feeds(cls, feed_dir):
+        index = cls()
+        networks = []
+        tables = {'ip': index.ips, 'domain': index.domains, 'ja3': index.ja3}
+        for path in feed_files(feed_dir):
+            feed = os.path.splitext(os.path.basename(path))[0]
+            try:
+                with open(path, 'r', errors='replace') as f:
+                    for line in f:
+                        line = line.split('#', 1)[0].strip()
+                        if not line:
+                            continue
+                        indicator = classify_indicator(re.split(r'[\s,;]', line, 1)[0])
+                        if not indicator:
+                            continue
+                        kind, value = indicator
+                        if kind == 'cidr':
+                            networks.append((value, feed))
+                        else:
+                            tables[kind][value] = feed
+            except OSError as e:
+                logging.error(f"Error reading intel feed {path}: {e}")
+
+        index.count = len(index.ips) + len(index.domains) + len(index.ja3) + len(networks)
+        index.bloom = BloomFilter(index.count)
+        for ip in index.ips:
+            index.bloom.add(f"ip:{ip}")
+        for domain in index.domains:
+            index.bloom.add(f"dom:{domain}")
+        for ja3 in index.ja3:
+            index.bloom.add(f"ja3:{ja3}")
+        for network, feed in networks:
+            index.trees[network.version].insert(network, feed)
+            index.prefix_lengths[network.version].add(network.prefixlen)
+            index.bloom.add(f"net:{int(network.network_address)}/{network.prefixlen}")
+        return index
+
+    def _match_ip(self, ip):
+        """(indicator, feed) for a listed address or one inside a listed network"""
+        if not ip:
+            return None
+        bloom = self.bloom
+        if f"ip:{ip}" in bloom and ip in self.ips:
+            return ip, self.ips[ip]
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+        lengths = self.prefix_lengths[address.version]
+        if not lengths:
+            return None
+        width = self.trees[address.version].width
+        value = int(address)
+        # The Bloom filter holds each network at its own prefix length
+        if not any(f"net:{value >> (width - length) << (width - length)}/{length}" in bloom
+                   for length in lengths):
+            return None
+        feed = self.trees[address.version].lookup(value)
+        return (ip, feed) if feed else None
+
+    def _match_domain(self, name):
+        """(indicator, feed) when the name or any parent domain is listed"""
+        if not name:
+            return None
+        labels = name.strip().lower().rstrip('.').split('.')
+        for i in range(len(labels) - 1):
+            candidate = '.'.join(labels[i:])
+            if f"dom:{candidate}" in self.bloom and candidate in self.domains:
+                return candidate, self.domains[candidate]
+        return None
+
+    def match_ja3(self, ja3):
+        if ja3 and f"ja3:{ja3}" in self.bloom and ja3 in self.ja3:
+            return ja3, self.ja3[ja3]
+        return None
+
+
+class ThreatIntel:
+    """Current intel index plus background hot reload
+
+    A changed feed directory is re-indexed in a worker thread and the new
+    index replaces the old one with a single reference assignment, so
+    lookups never wait on a reload
+    """
+
+    def __init__(self, feed_dir=INTEL_DIR, reload_interval=RELOAD_CHECK_INTERVAL):
+        self.feed_dir = feed_dir
+        self.reload_interval = reload_interval
+        self.signature = feed_signature(feed_dir)
+        self.index = IntelIndex.from_feeds(feed_dir)
+        self.checked = time.time()
+        self.reloading = False
+        logging.info(f"✓ Threat intel loaded {self.index.count} indicators from {feed_dir}")
+
+    def maybe_reload(self, now=None):
+        now = now or time.time()
+        if self.reloading or now - self.checked < self.reload_interval:
+            return
+        self.checked = now
+        signature = feed_signature(self.feed_dir)
+        if signature == self.signature:
+            return
+        self.reloading = True
+        threading.Thread(target=self._reload, args=(signature,), name='intel-reload', daemon=True).start()
+
+    def _reload(self, signature):
+        try:
+            index = IntelIndex.from_feeds(self.feed_dir)
+            self.index = index
+            self.signature = signature
+            logging.info(f"✓ Threat intel reloaded: {index.count} indicators")
+        except Exception as e:
+            logging.error(f"Error reloading threat intel: {e}")
+        finally:
+            self.reloading = False
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+NetGuard Pro - Time-Window Queries
+Exact aggregates over [now - N minutes, now) across a collector's timestamped
+tables: tables that can't hold rows in the window are pruned by the creation
+time in their name, and rows are filtered on the indexed created_at column
+"""
+
+from datetime import datetime, timedelta, timezone
+
+DEFAULT_WINDOW_MINUTES = 5
+TABLE_TIME_FORMAT = '%Y%m%d_%H%M%S'  # <prefix>_<local creation time>
+ROW_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'  # created_at is CURRENT_TIMESTAMP (UTC)
+
+# created_at is the one time column every collector writes the same way;
+# `timestamp` holds whatever format each tool prints
+
+
+def window_index(cursor, table):
+    """Index created_at so window filters are range scans (collectors call this on table creation)"""
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_created_at ON {table}(created_at)")
+
+
+def table_time(table, prefix):
+    """Creation time encoded in a collector table name, or None"""
+    try:
+        return datetime.strptime(table[len(prefix) + 1:], TABLE_TIME_FORMAT)
+    except ValueError:
+        return None
+
+
+class TimeWindow:
+    """The interval [end - minutes, end) and the SQL to read a collector's rows in it"""
+
+    def __init__(self, minutes=DEFAULT_WINDOW_MINUTES, end=None):
+        self.minutes = minutes
+        self.end = (end or datetime.now()).replace(microsecond=0)
+        self.start = self.end - timedelta(minutes=minutes)
+        self.params = {
+            'window_start': self.start.astimezone(timezone.utc).strftime(ROW_TIME_FORMAT),
+            'window_end': self.end.astimezone(timezone.utc).strftime(ROW_TIME_FORMAT),
+        }
+
+    def tables(self, conn, prefix):
+        """Tables of a collector that can hold rows in the window, oldest first
+
+        That is every table created inside the window plus the newest one
+        created before it, which was still being written when the window began
+        """
+        names = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB ? ORDER BY name",
+            (f"{prefix}_[0-9]*",))]
+        timed = [(created, name) for name, created in ((n, table_time(n, prefix)) for n in names)
+                 if created and created < self.end]
+        before = [name for created, name in timed if created <= self.start]
+        return before[-1:] + [name for created, name in timed if created > self.start]
+
+    def source(self, conn, prefix, columns, where=None):
+        """Subquery of the window's rows (columns missing from older tables are NULL); None without tables"""
+        parts = []
+        for table in self.tables(conn, prefix):
+            present = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            selected = ', '.join(column if column in present else f"NULL AS {column}" for column in columns)
+            # Only the table open when the window began needs the index; tables
+            # created inside it are (nearly) all in range, where a plain scan
+            # beats an index lookup per row. Unary + keeps the planner off it
+            column = 'created_at' if table_time(table, prefix) <= self.start else '+created_at'
+            parts.append(f"SELECT {selected} FROM {table} "
+                         f"WHERE {column} >= :window_start AND {column} < :window_end"
+                         + (f" AND ({where})" if where else ''))
+        return f"({' UNION ALL '.join(parts)})" if parts else None
+
+    def fetch(self, conn, sql, source):
+        """Rows of sql, with {source} standing for the window subquery, as dicts"""
+        cursor = conn.execute(sql.format(source=source), self.params)
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def count(self, conn, source):
+        return conn.execute(f"SELECT COUNT(*) FROM {source}", self.params).fetchone()[0]
+
+    def recent(self, conn, prefix, limit, where=None):
+        """Newest rows in the window, all columns; tables are read newest first until limit is reached"""
+        rows = []
+        for table in reversed(self.tables(conn, prefix)):
+            if len(rows) >= limit:
+                break
+            rows += self.fetch(conn, f"""
+                SELECT * FROM {table}
+                WHERE created_at >= :window_start AND created_at < :window_end
+                {f'AND ({where})' if where else ''}
+                ORDER BY created_at DESC, rowid DESC
+                LIMIT {limit - len(rows)}
+            """, None)
+        return rows
+
+
+def index_window_tables(conn, prefixes, minutes=DEFAULT_WINDOW_MINUTES):
+    """Add the created_at index to existing tables the current window reads (newer ones get it on creation)"""
+    window = TimeWindow(minutes)
+    for prefix in prefixes:
+        for table in window.tables(conn, prefix):
+            window_index(conn, table)
+    conn.commit()
@@ -12,6 +12,10 @@ import time
 import json
 import re
 from datetime import datetime
+from event_bus import EventPublisher, packet_event
+from packet_scoring import PacketScorer, RowColumns
+from batch_summary import summarize_batch, summarize_missing
+from time_window import window_index
 
 # Configuration
 INTERFACE = "wlo1"
@@ -21,6 +25,11 @@ LOG_FILE = "/home/jarvis/NetGuard/logs/system/tshark-collector.log"
 COLLECT_INTERVAL = 310  # Check every 35 seconds for faster real-time monitoring
 CAPTURE_DURATION = 300  # Capture for 30 seconds for quick data collection
 
+# Created in main. The device -> domain index is fed by tcpdump and Suricata:
+# tshark sees the same packets as tcpdump and would count everything twice
+event_publisher = None
+packet_scorer = None
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -94,6 +103,7 @@ def create_table(conn, table_name):
     );
     """
     cursor.execute(sql)
+    window_index(cursor, table_name)
     conn.commit()
 
 def capture_and_analyze():
@@ -129,6 +139,7 @@ def capture_and_analyze():
             '-T', 'json',
             '-e', 'frame.number',
             '-e', 'frame.time',
+            '-e', 'frame.time_epoch',
             '-e', 'frame.len',
             '-e', 'ip.src',
             '-e', 'ip.dst',
@@ -180,8 +191,10 @@ def capture_and_analyze():
         create_table(conn, table_name)
         cursor = conn.cursor()
         
-        # Insert packets
+        # Decode packets, then score and insert the batch
         inserted = 0
+        rows = []
+        scored = []
         for packet in packets:
             try:
                 layers = packet.get('_source', {}).get('layers', {})
@@ -257,64 +270,65 @@ def capture_and_analyze():
                 else:
                     protocol = protocols.split(':')[-1] if protocols else 'Unknown'
                 
-                # Calculate threat score based on patterns
-                # FIXED: Smarter detection to reduce false positives
-                threat_score = 0
-                is_suspicious = 0
-                
-                # Get your local IP to differentiate inbound vs outbound
-                local_ip = '192.168.1.244'  # Your wlo1 IP
-                
-                # High ports on DESTINATION = suspicious ONLY if it's NOT your outbound connection
-                # Real backdoors: External IP connecting TO your high ports
-                # False positive: You connecting FROM your high ports to external servers
-                if dest_port and dest_port > 50000 and src_ip and src_ip != local_ip:
-                    # External source trying to connect to high dest port = REAL THREAT
-                    threat_score += 5
-                    is_suspicious = 1
-                
-                # SYN without ACK = port scan attempt
-                if tcp_syn and not tcp_ack and dest_ip and not dest_ip.startswith('192.168.'):
-                    # Scanning external IPs = suspicious
-                    threat_score += 3
-                    is_suspicious = 1
-                
-                # RST flags from external sources = potential attack
-                if tcp_rst and src_ip and not src_ip.startswith('192.168.'):
-                    threat_score += 2
+                # Threat heuristics are scored for the whole batch below
+                rows.append((datetime.now().isoformat(), frame_number, frame_time, src_ip, src_port,
+                             dest_ip, dest_port, protocol, frame_len, info[:500] if info else '', tcp_flags, tcp_syn,
+                             tcp_ack, tcp_fin, tcp_rst, ip_ttl, tcp_window_size, http_host, http_uri,
+                             http_method, http_user_agent, http_response_code, dns_query, dns_query_type,
+                             dns_response, tls_handshake_type, tls_server_name, dest_country, dest_city))
+                scored.append((src_ip, dest_ip, dest_port, ip_ttl, tcp_window_size, tcp_syn, tcp_ack, tcp_rst))
                 
-                # Low TTL = potential IP spoofing (but skip local traffic)
-                if ip_ttl and ip_ttl < 32 and dest_ip and not dest_ip.startswith(('192.168.', '224.', '239.')):
-                    threat_score += 4
-                    is_suspicious = 1
-                
-                # Very small TCP window from external = potential attack
-                if tcp_window_size and tcp_window_size < 1000 and src_ip and not src_ip.startswith('192.168.'):
-                    threat_score += 2
-                
-                cursor.execute(f"""
-                    INSERT INTO {table_name}
-                    (timestamp, frame_number, frame_time, src_ip, src_port, dest_ip, dest_port,
-                     protocol, length, info, tcp_flags, tcp_syn, tcp_ack, tcp_fin, tcp_rst,
-                     ip_ttl, tcp_window_size, http_host, http_uri, http_method, http_user_agent,
-                     http_response_code, dns_query, dns_query_type, dns_response, 
-                     tls_handshake_type, tls_server_name, dest_country, dest_city, is_suspicious, threat_score)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (datetime.now().isoformat(), frame_number, frame_time, src_ip, src_port,
-                      dest_ip, dest_port, protocol, frame_len, info[:500] if info else '', tcp_flags, tcp_syn, 
-                      tcp_ack, tcp_fin, tcp_rst, ip_ttl, tcp_window_size, http_host, http_uri,
-                      http_method, http_user_agent, http_response_code, dns_query, dns_query_type,
-                      dns_response, tls_handshake_type, tls_server_name, dest_country, dest_city, 
-                      is_suspicious, threat_score))
-                
-                inserted += 1
+                if event_publisher:
+                    event_publisher.publish(packet_event('tshark', {
+                        'src_ip': src_ip, 'dest_ip': dest_ip, 'src_port': src_port,
+                        'dest_port': dest_port, 'protocol': protocol, 'length': frame_len,
+                        'tcp_syn': tcp_syn, 'tcp_ack': tcp_ack, 'tcp_rst': tcp_rst,
+                        'dns_query': dns_query, 'http_host': http_host,
+                        'tls_server_name': tls_server_name, 'http_response_code': http_response_code
+                    }, layers.get('frame.time_epoch', [None])[0]))
             except Exception as e:
-                logging.debug(f"Error inserting packet: {e}")
+                logging.debug(f"Error decoding packet: {e}")
                 continue
         
+        if rows:
+            scores, suspicious = packet_scorer.score(RowColumns(scored))
+            insert_sql = f"""
+                INSERT INTO {table_name}
+                (timestamp, frame_number, frame_time, src_ip, src_port, dest_ip, dest_port,
+                 protocol, length, info, tcp_flags, tcp_syn, tcp_ack, tcp_fin, tcp_rst,
+                 ip_ttl, tcp_window_size, http_host, http_uri, http_method, http_user_agent,
+                 http_response_code, dns_query, dns_query_type, dns_response, 
+                 tls_handshake_type, tls_server_name, dest_country, dest_city, is_suspicious, threat_score)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """
+            values = [row + (is_suspicious, threat_score)
+                      for row, threat_score, is_suspicious in zip(rows, scores, suspicious)]
+            try:
+                cursor.executemany(insert_sql, values)
+                inserted = len(values)
+            except sqlite3.Error as e:
+                # One bad row fails the whole batch: redo it row by row and skip only the bad ones
+                logging.warning(f"Batch insert into {table_name} failed ({e}), inserting row by row")
+                conn.rollback()
+                for value in values:
+                    try:
+                        cursor.execute(insert_sql, value)
+                        inserted += 1
+                    except sqlite3.Error as e:
+                        logging.debug(f"Error inserting packet: {e}")
+        
         conn.commit()
+        
+        # Counters and detector findings for the analysis page, computed once per batch
+        try:
+            summarize_batch(conn, table_name)
+        except sqlite3.Error as e:
+            logging.error(f"Error summarizing {table_name}: {e}")
         conn.close()
         
+        if event_publisher:
+            event_publisher.flush()
+        
         logging.info(f"✓ Inserted {inserted} packets into '{table_name}'")
         
         # Clean up PCAP file to save space
@@ -340,6 +354,17 @@ def main():
     os.makedirs(CAPTURE_DIR, exist_ok=True)
     os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
     
+    global event_publisher, packet_scorer
+    event_publisher = EventPublisher('tshark')
+    packet_scorer = PacketScorer('tshark')
+    
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        summarize_missing(conn, 'tshark_')
+        conn.close()
+    except sqlite3.Error as e:
+        logging.error(f"Error backfilling batch summaries: {e}")
+    
     while True:
         try:
             capture_and_analyze()
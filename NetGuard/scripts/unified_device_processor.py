@@ -16,6 +16,9 @@ DB_PATH = "/home/jarvis/NetGuard/network.db"
 LOG_FILE = "/home/jarvis/NetGuard/logs/system/unified-device-processor.log"
 PROCESS_INTERVAL = 30  # Process every 30 seconds
 
+# Traffic tables already handed to the tracker (new tables mean new traffic)
+last_traffic_tables = {'tcpdump': None, 'tshark': None}
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
@@ -53,6 +56,10 @@ def process_traffic_data():
         
         # Process tcpdump data (most comprehensive)
         tcpdump_table = get_latest_table(conn, 'tcpdump')
+        tshark_table = get_latest_table(conn, 'tshark')
+        new_traffic = (tcpdump_table != last_traffic_tables['tcpdump'] or
+                       tshark_table != last_traffic_tables['tshark'])
+        
         if tcpdump_table:
             # Get unique local source IPs
             cursor.execute(f"""
@@ -77,7 +84,6 @@ def process_traffic_data():
                     local_ips.add(row['dest_ip'])
         
         # Process tshark data
-        tshark_table = get_latest_table(conn, 'tshark')
         if tshark_table:
             cursor.execute(f"""
                 SELECT DISTINCT src_ip 
@@ -107,9 +113,12 @@ def process_traffic_data():
         # Now process all unique local IPs (will match to ARP-discovered MACs)
         logging.info(f"Found {len(local_ips)} unique local IPs in traffic")
         for ip in local_ips:
-            tracker.update_device(ip_address=ip)
+            tracker.update_device(ip_address=ip, new_traffic=new_traffic)
             devices_updated += 1
         
+        last_traffic_tables['tcpdump'] = tcpdump_table
+        last_traffic_tables['tshark'] = tshark_table
+        
         logging.info(f"✓ Processed traffic data: {devices_updated} local device updates, {arp_devices} from ARP")
         
         return devices_updated + arp_devices
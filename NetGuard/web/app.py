@@ -8,6 +8,7 @@ from flask import Flask, render_template, jsonify, request
 import sqlite3
 import os
 import json
+import logging
 import sys
 from datetime import datetime
 from pathlib import Path
@@ -24,6 +25,11 @@ except ImportError:
     DB_PATH = os.getenv('NETGUARD_DB_PATH', str(BASE_DIR / "network.db"))
     SECRET_KEY = os.getenv('NETGUARD_SECRET_KEY', 'netguard-pro-secure-key-change-in-production')
 
+# Shared helpers from scripts/ (they import each other by bare module name)
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'scripts'))
+from remediation import queue_remediation
+from snapshots import latest_snapshot
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = SECRET_KEY
 
@@ -33,6 +39,10 @@ def get_db_connection():
     conn.row_factory = sqlite3.Row
     return conn
 
+def get_latest_snapshot():
+    """Newest aggregation snapshot (published by ai_5min_aggregator), or None when missing or stale"""
+    return latest_snapshot(db_path=DB_PATH)[1]
+
 def get_all_tables():
     """Get all tables in database"""
     conn = get_db_connection()
@@ -78,13 +88,18 @@ def get_table_data(table_name, limit=1000):
         print(f"Error fetching data from {table_name}: {e}")
         return []
 
-def get_tshark_statistics(tables):
-    """Get comprehensive statistics for tshark data"""
+def get_tshark_statistics():
+    """Get comprehensive statistics for tshark data
+    
+    Reads the per-batch summaries the tshark collector writes as each capture
+    table is ingested (scripts/batch_summary.py) instead of scanning tables.
+    Ranked lists are merged from each batch's own top N, so they are
+    approximate: a key that never makes a single batch's top N is missed
+    """
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        # Combine all tshark tables for analysis
         stats = {
             'total_packets': 0,
             'protocols': {},
@@ -100,153 +115,62 @@ def get_tshark_statistics(tables):
             'tcp_flags_distribution': {'SYN': 0, 'ACK': 0, 'FIN': 0, 'RST': 0}
         }
         
-        for table in tables:
-            try:
-                # Get protocol distribution
-                cursor.execute(f"SELECT protocol, COUNT(*) as cnt FROM {table} WHERE protocol IS NOT NULL AND protocol != '' GROUP BY protocol")
-                for row in cursor.fetchall():
-                    proto = row[0]
-                    count = row[1]
-                    stats['protocols'][proto] = stats['protocols'].get(proto, 0) + count
-                    stats['total_packets'] += count
-                
-                # Get top source IPs
-                cursor.execute(f"SELECT src_ip, COUNT(*) as cnt FROM {table} WHERE src_ip IS NOT NULL AND src_ip != '' GROUP BY src_ip ORDER BY cnt DESC LIMIT 10")
-                for row in cursor.fetchall():
-                    ip = row[0]
-                    count = row[1]
-                    stats['top_sources'][ip] = stats['top_sources'].get(ip, 0) + count
-                
-                # Get top destination IPs
-                cursor.execute(f"SELECT dest_ip, COUNT(*) as cnt FROM {table} WHERE dest_ip IS NOT NULL AND dest_ip != '' GROUP BY dest_ip ORDER BY cnt DESC LIMIT 10")
-                for row in cursor.fetchall():
-                    ip = row[0]
-                    count = row[1]
-                    stats['top_destinations'][ip] = stats['top_destinations'].get(ip, 0) + count
-                
-                # Get port activity
-                cursor.execute(f"SELECT dest_port, COUNT(*) as cnt FROM {table} WHERE dest_port IS NOT NULL GROUP BY dest_port ORDER BY cnt DESC LIMIT 15")
-                for row in cursor.fetchall():
-                    port = row[0]
-                    count = row[1]
-                    stats['port_activity'][port] = stats['port_activity'].get(port, 0) + count
-                
-                # Analyze packet sizes
-                cursor.execute(f"SELECT length FROM {table} WHERE length IS NOT NULL")
-                for row in cursor.fetchall():
-                    size = row[0]
-                    if size <= 100:
-                        stats['packet_sizes']['small'] += 1
-                    elif size <= 500:
-                        stats['packet_sizes']['medium'] += 1
-                    else:
-                        stats['packet_sizes']['large'] += 1
-                
-                # Collect HTTP hosts
-                cursor.execute(f"SELECT http_host, COUNT(*) as cnt FROM {table} WHERE http_host IS NOT NULL AND http_host != '' GROUP BY http_host ORDER BY cnt DESC LIMIT 10")
-                for row in cursor.fetchall():
-                    host = row[0]
-                    count = row[1]
-                    stats['http_hosts'][host] = stats['http_hosts'].get(host, 0) + count
-                
-                # Collect DNS queries
-                cursor.execute(f"SELECT dns_query, COUNT(*) as cnt FROM {table} WHERE dns_query IS NOT NULL AND dns_query != '' GROUP BY dns_query ORDER BY cnt DESC LIMIT 10")
-                for row in cursor.fetchall():
-                    query = row[0]
-                    count = row[1]
-                    stats['dns_queries'][query] = stats['dns_queries'].get(query, 0) + count
-                
-                # Collect TLS server names
-                cursor.execute(f"SELECT tls_server_name, COUNT(*) as cnt FROM {table} WHERE tls_server_name IS NOT NULL AND tls_server_name != '' GROUP BY tls_server_name ORDER BY cnt DESC LIMIT 10")
-                for row in cursor.fetchall():
-                    server = row[0]
-                    count = row[1]
-                    stats['tls_servers'][server] = stats['tls_servers'].get(server, 0) + count
-                
-                # Collect country distribution
-                cursor.execute(f"SELECT dest_country, COUNT(*) as cnt FROM {table} WHERE dest_country IS NOT NULL GROUP BY dest_country ORDER BY cnt DESC")
-                for row in cursor.fetchall():
-                    country = row[0]
-                    count = row[1]
-                    stats['countries'][country] = stats['countries'].get(country, 0) + count
-                
-                # TCP flags distribution
-                cursor.execute(f"SELECT SUM(tcp_syn), SUM(tcp_ack), SUM(tcp_fin), SUM(tcp_rst) FROM {table}")
-                flags = cursor.fetchone()
-                if flags:
-                    stats['tcp_flags_distribution']['SYN'] += flags[0] or 0
-                    stats['tcp_flags_distribution']['ACK'] += flags[1] or 0
-                    stats['tcp_flags_distribution']['FIN'] += flags[2] or 0
-                    stats['tcp_flags_distribution']['RST'] += flags[3] or 0
-                
-                # Step 6: Enhanced anomaly detection patterns
-                
-                # 1. FIXED: High port backdoor detection - only flag INCOMING connections to same high port
-                # Multiple external sources connecting to YOUR high port = backdoor
-                cursor.execute(f"SELECT dest_port, COUNT(DISTINCT src_ip) as unique_sources, COUNT(*) as total FROM {table} WHERE dest_port > 50000 AND src_ip NOT LIKE '192.168.%' GROUP BY dest_port HAVING unique_sources > 3")
-                for row in cursor.fetchall():
-                    stats['suspicious_activity'].append({
-                        'type': 'Potential Backdoor Detected',
-                        'detail': f'Port {row[0]}: {row[1]} different external IPs connecting ({row[2]} total connections)',
-                        'severity': 'high'
-                    })
-                
-                # 2. FIXED: Port scan detection - outbound SYN to many different ports
-                cursor.execute(f"SELECT src_ip, COUNT(DISTINCT dest_port) as unique_ports, COUNT(*) as total FROM {table} WHERE tcp_syn = 1 AND tcp_ack = 0 AND dest_ip NOT LIKE '192.168.%' GROUP BY src_ip HAVING unique_ports > 20")
-                for row in cursor.fetchall():
-                    stats['suspicious_activity'].append({
-                        'type': 'Port Scan Detected',
-                        'detail': f'Source {row[0]} scanning {row[1]} different ports ({row[2]} SYN attempts)',
-                        'severity': 'high'
-                    })
-                
-                # 3. DNS tunneling detection (very long queries)
-                cursor.execute(f"SELECT dns_query, LENGTH(dns_query) as len FROM {table} WHERE dns_query IS NOT NULL AND LENGTH(dns_query) > 100 LIMIT 5")
-                for row in cursor.fetchall():
-                    if row[0]:
-                        stats['suspicious_activity'].append({
-                            'type': 'DNS Tunneling Suspected',
-                            'detail': f'Abnormally long DNS query ({row[1]} chars): {row[0][:50]}...',
-                            'severity': 'high'
-                        })
-                
-                # 4. Connection resets (potential attacks or blocked connections)
-                cursor.execute(f"SELECT COUNT(*) as rst_count FROM {table} WHERE tcp_rst = 1")
-                rst_count = cursor.fetchone()[0]
-                if rst_count > 100:
-                    stats['suspicious_activity'].append({
-                        'type': 'High RST Packet Count',
-                        'detail': f'{rst_count} connection resets detected',
-                        'severity': 'medium'
-                    })
-                
-                # 5. Suspicious countries (customize based on your threat model)
-                cursor.execute(f"SELECT dest_country, COUNT(*) as cnt FROM {table} WHERE dest_country IS NOT NULL AND dest_country NOT IN ('US', 'Local') GROUP BY dest_country HAVING cnt > 20")
+        # dimension -> (stats key, how many to show; None for all)
+        counter_dimensions = {
+            'protocol': ('protocols', 10),
+            'src_ip': ('top_sources', 10),
+            'dest_ip': ('top_destinations', 10),
+            'dest_port': ('port_activity', 15),
+            'http_host': ('http_hosts', 10),
+            'dns_query': ('dns_queries', 10),
+            'tls_server': ('tls_servers', 10),
+            'country': ('countries', None),
+            'packet_size': ('packet_sizes', None),
+            'tcp_flag': ('tcp_flags_distribution', None),
+        }
+        
+        try:
+            cursor.execute("SELECT SUM(count) FROM packet_counter_totals WHERE dimension = 'protocol'")
+            stats['total_packets'] = cursor.fetchone()[0] or 0
+            
+            for dimension, (key, limit) in counter_dimensions.items():
+                cursor.execute("""
+                    SELECT key, count FROM packet_counter_totals
+                    WHERE dimension = ? ORDER BY count DESC LIMIT ?
+                """, (dimension, limit or -1))
                 for row in cursor.fetchall():
-                    stats['suspicious_activity'].append({
-                        'type': 'Foreign Traffic Pattern',
-                        'detail': f'High volume to {row[0]}: {row[1]} connections',
-                        'severity': 'medium'
-                    })
-                
-                # 6. Low TTL values (potential IP spoofing)
-                cursor.execute(f"SELECT COUNT(*) as low_ttl FROM {table} WHERE ip_ttl < 32 AND ip_ttl > 0")
-                low_ttl = cursor.fetchone()[0]
-                if low_ttl > 10:
-                    stats['suspicious_activity'].append({
-                        'type': 'IP Spoofing Suspected',
-                        'detail': f'{low_ttl} packets with abnormally low TTL (<32)',
-                        'severity': 'high'
-                    })
-                
-            except Exception as e:
-                print(f"Error processing table {table}: {e}")
-                continue
+                    stats[key][row[0]] = row[1]
+            
+            cursor.execute("""
+                SELECT finding_type, detail, severity FROM packet_batch_findings
+                ORDER BY interval_start DESC, id DESC LIMIT 50
+            """)
+            for row in cursor.fetchall():
+                stats['suspicious_activity'].append({
+                    'type': row[0],
+                    'detail': row[1],
+                    'severity': row[2]
+                })
+        except sqlite3.OperationalError:
+            pass  # collector hasn't summarized a batch yet
         
-        # Sort and limit
-        stats['protocols'] = dict(sorted(stats['protocols'].items(), key=lambda x: x[1], reverse=True)[:10])
-        stats['top_sources'] = dict(sorted(stats['top_sources'].items(), key=lambda x: x[1], reverse=True)[:10])
-        stats['top_destinations'] = dict(sorted(stats['top_destinations'].items(), key=lambda x: x[1], reverse=True)[:10])
+        # DNS tunneling / DGA: evaluated as queries arrive by the alert
+        # system's DNS detector, reported here from its active alerts
+        try:
+            cursor.execute("""
+                SELECT alert_type, title, threat_indicators FROM security_alerts
+                WHERE alert_type IN ('dns_tunneling', 'dga_domain') AND status = 'active'
+                ORDER BY created_at DESC LIMIT 5
+            """)
+            for row in cursor.fetchall():
+                indicators = json.loads(row[2]) if row[2] else []
+                stats['suspicious_activity'].append({
+                    'type': 'DNS Tunneling Suspected' if row[0] == 'dns_tunneling' else 'DGA Domains Suspected',
+                    'detail': f"{row[1]}: {indicators[-1] if indicators else ''}",
+                    'severity': 'high'
+                })
+        except sqlite3.OperationalError:
+            pass  # alert system hasn't created its tables yet
         
         conn.close()
         return stats
@@ -803,7 +727,7 @@ def analysis_tool(tool_name):
     # Enhanced statistics for tshark
     stats = None
     if tool_name == 'tshark' and tables:
-        stats = get_tshark_statistics(tables)
+        stats = get_tshark_statistics()
     
     return render_template('analysis_tool.html', tool_name=tool_name, 
                          tables=table_info, latest_data=latest_data, stats=stats)
@@ -1056,11 +980,11 @@ def iot_devices():
         domain_patterns = []
         try:
             cursor.execute("""
-                SELECT dp.device_ip, d.hostname, dp.domain, dp.frequency, 
-                       dp.first_seen, dp.last_seen, dp.risk_level
-                FROM iot_domain_patterns dp
-                LEFT JOIN devices d ON dp.device_ip = d.ip_address
-                ORDER BY dp.frequency DESC, dp.risk_level ASC
+                SELECT dc.device_ip, d.hostname, dc.domain, dc.frequency, 
+                       dc.first_seen, dc.last_seen, dc.risk_level
+                FROM domain_communications dc
+                LEFT JOIN devices d ON dc.device_ip = d.ip_address
+                ORDER BY dc.frequency DESC, dc.risk_level ASC
                 LIMIT 20
             """)
             
@@ -1076,7 +1000,7 @@ def iot_devices():
                     'device': device_name,
                     'domain': device_info['domain'],
                     'frequency': device_info['frequency'],
-                    'firstSeen': device_info['first_seen'].split(' ')[0] if device_info['first_seen'] else 'Unknown',
+                    'firstSeen': device_info['first_seen'].split('T')[0] if device_info['first_seen'] else 'Unknown',
                     'lastSeen': device_info['last_seen'],
                     'riskLevel': risk_text
                 })
@@ -1124,27 +1048,28 @@ def domain_communications():
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        # Check if iot_domain_patterns table exists
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='iot_domain_patterns'")
+        # Check if the domain index table exists (created by the collectors)
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='domain_communications'")
         table_exists = cursor.fetchone() is not None
         
         communications = []
         
         if table_exists:
-            # Get real domain communications from iot_domain_patterns table
+            # Precomputed per-device domain index maintained at ingest time
             cursor.execute("""
                 SELECT 
-                    dp.device_ip,
+                    dc.device_ip,
                     d.hostname,
                     d.device_category,
-                    dp.domain,
-                    dp.frequency,
-                    dp.first_seen,
-                    dp.last_seen,
-                    dp.risk_level
-                FROM iot_domain_patterns dp
-                LEFT JOIN devices d ON dp.device_ip = d.ip_address
-                ORDER BY dp.frequency DESC, dp.risk_level ASC
+                    dc.domain,
+                    dc.frequency,
+                    dc.bytes,
+                    dc.first_seen,
+                    dc.last_seen,
+                    dc.risk_level
+                FROM domain_communications dc
+                LEFT JOIN devices d ON dc.device_ip = d.ip_address
+                ORDER BY dc.frequency DESC, dc.risk_level ASC
                 LIMIT 20
             """)
             
@@ -1160,31 +1085,11 @@ def domain_communications():
                     'device': device_name,
                     'domain': device_info['domain'],
                     'frequency': device_info['frequency'],
-                    'firstSeen': device_info['first_seen'].split(' ')[0] if device_info['first_seen'] else 'Unknown',
+                    'bytes': device_info['bytes'],
+                    'firstSeen': device_info['first_seen'].split('T')[0] if device_info['first_seen'] else 'Unknown',
                     'lastSeen': device_info['last_seen'],
                     'riskLevel': risk_text
                 })
-        else:
-            # Fallback to basic device info if table doesn't exist yet
-            cursor.execute("""
-                SELECT ip_address, hostname, device_category
-                FROM devices 
-                WHERE device_type = 'IoT'
-                LIMIT 10
-            """)
-            
-            for row in cursor.fetchall():
-                device_info = dict(row)
-                device_name = f"{device_info['hostname'] or device_info['device_category'] or 'Unknown Device'} ({device_info['ip_address']})"
-                
-                communications.append({
-                    'device': device_name,
-                    'domain': 'example.com',
-                    'frequency': 'Low',
-                    'firstSeen': '2024-01-01',
-                    'lastSeen': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                    'riskLevel': 'Safe'
-                })
         
         conn.close()
         return jsonify(communications)
@@ -1606,11 +1511,8 @@ def resolve_security_alert(alert_id):
 
 @app.route('/alerts/<alert_id>/auto-remediate', methods=['POST'])
 def auto_remediate_alert(alert_id):
-    """Execute auto-remediation for an alert"""
-    import subprocess
-    
+    """Queue auto-remediation for an alert; the alert system's remediation worker runs it"""
     conn = get_db_connection()
-    conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
     
     cursor.execute("""
@@ -1622,49 +1524,45 @@ def auto_remediate_alert(alert_id):
     alert = cursor.fetchone()
     
     if not alert:
+        conn.close()
         return jsonify({'success': False, 'message': 'Alert not found or auto-remediation not available'})
     
     try:
-        # Execute remediation command
-        result = subprocess.run(
-            alert['auto_remediation_command'],
-            shell=True,
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
-        
-        success = result.returncode == 0
-        
-        # Log action
-        cursor.execute("""
-            INSERT INTO alert_history (alert_id, action, action_by, notes)
-            VALUES (?, 'auto_remediation', 'user', ?)
-        """, (alert_id, f"Executed: {alert['auto_remediation_command']}"))
-        
-        if success:
-            # Mark as resolved
-            cursor.execute("""
-                UPDATE security_alerts
-                SET status = 'resolved',
-                    resolved_at = CURRENT_TIMESTAMP,
-                    resolved_by = 'auto_remediation',
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE alert_id = ?
-            """, (alert_id,))
-        
+        # An unfinished job for the same alert is reused
+        job_id = queue_remediation(cursor, alert_id, alert['auto_remediation_command'], requested_by='user')
         conn.commit()
         conn.close()
         
         return jsonify({
-            'success': success,
-            'message': 'Remediation executed successfully' if success else 'Remediation failed',
-            'output': result.stdout or result.stderr
+            'success': True,
+            'job_id': job_id,
+            'status': 'queued',
+            'message': f'Remediation queued as {job_id}'
         })
         
-    except Exception as e:
+    except sqlite3.OperationalError as e:
         conn.close()
-        return jsonify({'success': False, 'message': str(e)})
+        return jsonify({'success': False, 'message': f'Remediation queue unavailable (is the alert system running?): {e}'})
+
+
+@app.route('/remediation/<job_id>')
+def remediation_job_status(job_id):
+    """Status of a queued remediation job"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT job_id, alert_id, action, target, status, result, created_at, started_at, finished_at
+            FROM remediation_jobs WHERE job_id = ?
+        """, (job_id,))
+        job = cursor.fetchone()
+    except sqlite3.OperationalError:
+        job = None
+    conn.close()
+    
+    if not job:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    return jsonify(dict(job, success=True))
 
 
 @app.route('/alerts/<alert_id>/false-positive', methods=['POST'])
@@ -1896,19 +1794,9 @@ def ai_network_devices_api():
         """)
         device_types = {row['device_type']: row['count'] for row in cursor.fetchall()}
         
-        # Get recent activity (last hour)
-        cursor.execute("""
-            SELECT COUNT(*) as recent_activity
-            FROM (
-                SELECT name FROM sqlite_master 
-                WHERE type='table' AND name LIKE 'tcpdump_%'
-                ORDER BY name DESC LIMIT 1
-            ) AS latest_table,
-            (SELECT * FROM tcpdump 
-             WHERE timestamp > datetime('now', '-1 hour')
-             LIMIT 1000)
-        """)
-        recent_activity = cursor.fetchone()['recent_activity'] if cursor.fetchone() else 0
+        # Recent activity: packets in the latest snapshot window
+        snapshot = get_latest_snapshot() or {}
+        recent_activity = ((snapshot.get('export') or {}).get('network_metrics') or {}).get('total_packets', 0)
         
         conn.close()
         
@@ -1969,29 +1857,20 @@ def ai_device_activity_api():
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        # Get device activity from recent traffic
-        cursor.execute("""
-            SELECT 
-                src_ip as device_ip,
-                COUNT(*) as packet_count,
-                COUNT(DISTINCT dest_ip) as unique_connections,
-                MAX(timestamp) as last_activity
-            FROM (
-                SELECT name FROM sqlite_master 
-                WHERE type='table' AND name LIKE 'tcpdump_%'
-                ORDER BY name DESC LIMIT 1
-            ) AS latest_table,
-            (SELECT * FROM tcpdump 
-             WHERE timestamp > datetime('now', '-1 hour')
-             AND src_ip LIKE '192.168.%'
-             LIMIT 1000)
-            GROUP BY src_ip
-            ORDER BY packet_count DESC
-            LIMIT 10
-        """)
-        
-        activity = [dict(row) for row in cursor.fetchall()]
+        # Get device activity from the latest snapshot window
+        snapshot = get_latest_snapshot() or {}
         conn.close()
+        devices = (snapshot.get('export') or {}).get('devices', [])
+        activity = [
+            {
+                'device_ip': device['ip'],
+                'packet_count': device['packets_sent'],
+                'unique_connections': device['unique_destinations'],
+                'last_activity': snapshot['window']['end']
+            }
+            for device in sorted(devices, key=lambda d: d['packets_sent'], reverse=True)[:10]
+            if device['packets_sent']
+        ]
         return jsonify(activity)
         
     except Exception as e:
@@ -2005,23 +1884,11 @@ def ai_protocol_distribution_api():
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        # Get protocol distribution from tshark data
-        cursor.execute("""
-            SELECT protocol, COUNT(*) as count
-            FROM (
-                SELECT name FROM sqlite_master 
-                WHERE type='table' AND name LIKE 'tshark_%'
-                ORDER BY name DESC LIMIT 1
-            ) AS latest_table,
-            (SELECT * FROM tshark 
-             WHERE timestamp > datetime('now', '-1 hour')
-             LIMIT 1000)
-            GROUP BY protocol
-            ORDER BY count DESC
-        """)
-        
-        protocols = {row['protocol']: row['count'] for row in cursor.fetchall()}
+        # Get protocol distribution from tshark data in the latest snapshot window
+        snapshot = get_latest_snapshot() or {}
         conn.close()
+        tshark = ((snapshot.get('aggregate') or {}).get('tools') or {}).get('tshark') or {}
+        protocols = tshark.get('protocol_distribution', {})
         return jsonify(protocols)
         
     except Exception as e:
@@ -2076,7 +1943,9 @@ def flush_all_data():
         ]
         
         # Tables to clear (delete all rows but keep structure)
-        tables_to_clear = ['ai_analysis', 'devices', 'iot_vulnerabilities', 'security_alerts']
+        tables_to_clear = ['ai_analysis', 'devices', 'iot_vulnerabilities', 'security_alerts',
+                           'domain_communications', 'packet_batches', 'packet_batch_findings',
+                           'packet_counter_totals', 'snapshots']
         
         dropped_tables = []
         cleared_tables = []